@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""Incremental annual report: closed weeks are computed once and reused.
+
+Every ISO week of the year is an immutable unit once it has ended before
+the last complete ingest day (yesterday) and every expected sensor holds
+data for at least MIN_COVERAGE of its hours. Expected are the sensors
+that reported on or after the week's Monday (sensor_registry), so a week
+where only some sensors were ingested is rebuilt on the next run; after
+MAX_OPEN_DAYS a remaining gap is taken as an outage and the week closes.
+The late-December days that belong to ISO week 1 of the next year form
+one extra unit, so the whole calendar year is covered.
+For each unit the builder stores, under reports/_cache/annual/<year>/W<nn>/:
+
+    aggregates.json   per-sensor Leq / LAmax / night figures, "closed" flag
+    page.png          the rendered report page for that week
+
+Later runs skip every closed unit that is already cached and only query
+and render the open week. The year summary is computed from the cached
+aggregates (no queries) and the PDF is stitched from the cached pages.
+
+Usage:
+    python annual_report.py 2025 [--rebuild]
+"""
+import os
+import json
+import argparse
+import datetime
+import numpy as np
+import pandas as pd
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+from matplotlib.backends.backend_pdf import PdfPages
+import sensor_registry
+import pipeline_metrics as metrics
+import profiling
+from severity_profiles import TIMEZONE, fetch_hourly_range, hour_limits
+
+# ===== SETTINGS =====
+REPORTS_DIR = "reports"
+CACHE_DIR = os.path.join(REPORTS_DIR, "_cache", "annual")
+NIGHT_HOURS = (23, 7)
+MIN_COVERAGE = 0.9         # share of a week's hours each expected sensor must cover
+MAX_OPEN_DAYS = 28         # weeks ended longer ago close despite gaps (outages)
+LEVELS = ("LAeq", "LAmax", "LAmin")
+
+
+# ===== FUNCTIONS =====
+def week_units(year, today=None):
+    """(label, first, last, ended) for every ISO week of `year` up to today.
+
+    Days of December that fall in ISO week 1 of the next year are appended
+    as a unit of their own, labelled e.g. "2026-W01", ending on 31 December.
+    """
+    today = today or datetime.date.today()
+    last_complete = today - datetime.timedelta(days=1)
+    monday = datetime.date.fromisocalendar(year, 1, 1)
+    units = []
+    while monday <= last_complete and monday.year <= year:
+        iso_year, week, _ = monday.isocalendar()
+        sunday = monday + datetime.timedelta(days=6)
+        if iso_year == year:
+            label = f"W{week:02d}"
+        else:
+            label = f"{iso_year}-W{week:02d}"
+            sunday = datetime.date(year, 12, 31)
+        units.append((label, monday, sunday, sunday <= last_complete))
+        monday += datetime.timedelta(days=7)
+    return units
+
+
+def unit_dir(year, label):
+    return os.path.join(CACHE_DIR, str(year), label)
+
+
+def load_unit(year, label):
+    path = os.path.join(unit_dir(year, label), "aggregates.json")
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def _energetic_mean(levels):
+    levels = levels[~np.isnan(levels)]
+    if levels.size == 0:
+        return None
+    return round(float(10 * np.log10(np.mean(10 ** (levels / 10)))), 1)
+
+
+def compute_aggregates(df, sensor_ids):
+    """Per-sensor week figures from hourly LAeq/LAmax/LAmin means."""
+    result = {}
+    if df.empty:
+        return result
+    df = df.assign(**{c: np.nan for c in LEVELS if c not in df})
+    local = pd.to_datetime(df["timestamp"], utc=True).dt.tz_convert(TIMEZONE)
+    hour = local.dt.hour.to_numpy()
+    night = (hour >= NIGHT_HOURS[0]) | (hour < NIGHT_HOURS[1])
+    severity = (df["LAmax"].to_numpy(dtype=float) + df["LAmin"].to_numpy(dtype=float)) / 2
+    above = severity > hour_limits()[hour]
+    sensor_col = df["sensor_id"].astype(str).to_numpy()
+    laeq = df["LAeq"].to_numpy(dtype=float)
+    lamax = df["LAmax"].to_numpy(dtype=float)
+
+    for sensor_id in sensor_ids:
+        mask = sensor_col == str(sensor_id)
+        if not mask.any():
+            continue
+        result[str(sensor_id)] = {
+            "hours": int(mask.sum()),
+            "leq": _energetic_mean(laeq[mask]),
+            "leq_night": _energetic_mean(laeq[mask & night]),
+            "lamax_mean": round(float(np.nanmean(lamax[mask])), 1),
+            "hours_above_limit": int((above & mask).sum()),
+        }
+    return result
+
+
+def render_page(year, label, monday, sunday, aggregates, path):
+    fig, (ax_bar, ax_table) = plt.subplots(2, 1, figsize=(11.7, 8.3),
+                                           gridspec_kw={"height_ratios": [3, 2]})
+    sensors = sorted(aggregates)
+    leq = [aggregates[s]["leq"] or 0 for s in sensors]
+    night = [aggregates[s]["leq_night"] or 0 for s in sensors]
+    x = np.arange(len(sensors))
+    ax_bar.bar(x - 0.2, leq, width=0.4, label="Leq (24h)")
+    ax_bar.bar(x + 0.2, night, width=0.4, label="Leq night (23–07)")
+    ax_bar.set_xticks(x, sensors, rotation=45)
+    ax_bar.set_ylabel("dB(A)")
+    ax_bar.legend()
+    ax_bar.set_title(f"{year} {label}: {monday} → {sunday}")
+
+    ax_table.axis("off")
+    if sensors:
+        rows = [[aggregates[s]["hours"], aggregates[s]["leq"], aggregates[s]["leq_night"],
+                 aggregates[s]["lamax_mean"], aggregates[s]["hours_above_limit"]] for s in sensors]
+        ax_table.table(cellText=rows, rowLabels=sensors, loc="center",
+                       colLabels=["Hours", "Leq", "Leq night", "Mean LAmax", "Hours > limit"])
+    else:
+        ax_table.text(0.5, 0.5, "No data", ha="center", va="center")
+    fig.tight_layout()
+    fig.savefig(path, dpi=110)
+    plt.close(fig)
+
+
+def week_coverage(df, monday, sunday, sensor_ids):
+    """{sensor: share of the unit's hours with a level} for every sensor in `sensor_ids`."""
+    hours = ((sunday - monday).days + 1) * 24
+    coverage = {str(s): 0.0 for s in sensor_ids}
+    if df.empty:
+        return coverage
+    levels = df[[c for c in LEVELS if c in df]]
+    present = df[levels.notna().any(axis=1)]
+    stamps = pd.to_datetime(present["timestamp"], utc=True).dt.floor("h")
+    counts = stamps.groupby(present["sensor_id"].astype(str)).nunique()
+    for sensor_id in coverage:
+        coverage[sensor_id] = round(min(counts.get(sensor_id, 0) / hours, 1.0), 3)
+    return coverage
+
+
+def expected_sensors(sensor_ids, monday, state=None):
+    """Sensors whose missing hours since `monday` are late rather than an outage.
+
+    Those that reported on or after `monday`, plus live sensors the
+    registry has no data day for yet (no state file: assume they report).
+    """
+    state = state if state is not None else sensor_registry.load_state()
+    expected = []
+    for sensor_id in sensor_ids:
+        entry = state.get(str(sensor_id))
+        if entry is None:
+            expected.append(sensor_id)
+        elif entry["last_data_day"] is None:
+            if sensor_registry.is_live(entry):
+                expected.append(sensor_id)
+        elif entry["last_data_day"] >= str(monday):
+            expected.append(sensor_id)
+    return expected
+
+
+def build_unit(year, label, monday, sunday, ended, sensor_ids, expected=None, today=None):
+    """Query, aggregate and render one week, then persist it.
+
+    The unit is only marked closed once the week has ended and each
+    `expected` sensor (default: all) covers MIN_COVERAGE of the hours, so
+    a week ingested late, or only for some sensors, is redone.
+    """
+    start = f"{monday}T00:00:00Z"
+    stop = f"{sunday + datetime.timedelta(days=1)}T00:00:00Z"
+    df = fetch_hourly_range(start, stop, fields=LEVELS)
+    with metrics.timer("aggregate", week=label):
+        aggregates = compute_aggregates(df, sensor_ids)
+    expected = sensor_ids if expected is None else expected
+    covered = week_coverage(df, monday, sunday, expected)
+    settled = (today or datetime.date.today()) - sunday > datetime.timedelta(days=MAX_OPEN_DAYS)
+    complete = all(c >= MIN_COVERAGE for c in covered.values())
+    closed = bool(ended and aggregates and (complete or settled))
+
+    directory = unit_dir(year, label)
+    os.makedirs(directory, exist_ok=True)
+    with metrics.timer("render", week=label):
+        render_page(year, label, monday, sunday, aggregates, os.path.join(directory, "page.png"))
+    unit = {"label": label, "monday": str(monday), "sunday": str(sunday),
+            "closed": closed, "coverage": covered, "sensors": aggregates}
+    with open(os.path.join(directory, "aggregates.json"), "w") as f:
+        json.dump(unit, f, indent=1)
+    return unit
+
+
+def render_summary(year, units, path):
+    """Year overview from the cached week aggregates only."""
+    sensors = sorted({s for u in units for s in u["sensors"]})
+    grid = np.full((len(sensors), len(units)), np.nan)
+    for j, unit in enumerate(units):
+        for i, s in enumerate(sensors):
+            value = unit["sensors"].get(s, {}).get("leq")
+            if value is not None:
+                grid[i, j] = value
+
+    fig, ax = plt.subplots(figsize=(11.7, 8.3))
+    image = ax.imshow(np.ma.masked_invalid(grid), aspect="auto", cmap="RdYlGn_r", vmin=40, vmax=75)
+    ax.set_yticks(range(len(sensors)), sensors)
+    ax.set_xticks(range(len(units)), [u["label"] for u in units], rotation=90, fontsize=7)
+    fig.colorbar(image, ax=ax, label="Weekly Leq dB(A)")
+    ax.set_title(f"Geluidsmeting Rotterdam centrum {year} — weekly Leq per sensor")
+    fig.tight_layout()
+    fig.savefig(path, dpi=110)
+    plt.close(fig)
+
+
+def stitch_pdf(page_paths, pdf_path):
+    with PdfPages(pdf_path) as pdf:
+        for page in page_paths:
+            fig = plt.figure(figsize=(11.7, 8.3))
+            plt.imshow(plt.imread(page))
+            plt.axis("off")
+            plt.subplots_adjust(0, 0, 1, 1)
+            pdf.savefig(fig)
+            plt.close(fig)
+
+
+def build_report(year, sensor_ids, rebuild=False):
+    units = []
+    computed = 0
+    state = sensor_registry.load_state()
+    for label, monday, sunday, ended in week_units(year):
+        unit = None if rebuild else load_unit(year, label)
+        if unit is None or not unit["closed"]:
+            print(f"🧮 Computing {year} {label} ({monday} → {sunday})", flush=True)
+            unit = build_unit(year, label, monday, sunday, ended, sensor_ids,
+                              expected_sensors(sensor_ids, monday, state))
+            computed += 1
+        units.append(unit)
+    print(f"♻️ Reused {len(units) - computed} cached weeks, computed {computed}", flush=True)
+
+    summary_path = os.path.join(CACHE_DIR, str(year), "summary.png")
+    render_summary(year, units, summary_path)
+    pages = [summary_path] + [os.path.join(unit_dir(year, u["label"]), "page.png") for u in units]
+    pdf_path = os.path.join(REPORTS_DIR, f"annual_report_{year}.pdf")
+    stitch_pdf(pages, pdf_path)
+    return pdf_path
+
+
+# ===== MAIN =====
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Incremental annual noise report")
+    parser.add_argument("year", type=int)
+    parser.add_argument("--rebuild", action="store_true", help="ignore cached closed weeks")
+    profiling.add_argument(parser)
+    args = parser.parse_args()
+    profiling.from_args(args)
+
+    sensor_ids = sensor_registry.SENSOR_IDS
+    pdf_path = build_report(args.year, sensor_ids, args.rebuild)
+    print(f"✅ Annual report saved: {pdf_path}")
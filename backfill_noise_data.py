@@ -1,76 +1,45 @@
-import os
 import requests
 import csv
 import io
 import datetime
 import time
-from influxdb_client import InfluxDBClient, Point, WriteOptions
+import sensor_registry
+from noise_ingest import day_url, ingest_rows, install_hooks
 
-# ✅ Cleaned sensor list (duplicates removed, comma separated)
-SENSOR_IDS = [
-    93868, 94284, 94447, 94448, 94449, 94686, 94687, 94688, 94689,
-    94692, 94693, 94695, 94696, 94701, 94735, 95432, 95482, 95483,
-    95484, 95485, 95486, 95487, 95488, 95489, 95490, 95491, 95492,
-    95493, 95494, 95495, 89747
-]
-
-INFLUX_URL = os.getenv("INFLUX_URL")
-INFLUX_TOKEN = os.getenv("INFLUX_TOKEN")
-INFLUX_ORG = os.getenv("INFLUX_ORG")
-INFLUX_BUCKET = os.getenv("INFLUX_BUCKET")
-
-def fetch_and_push(sensor_id, day):
-    # ✅ Fixed URL format
-    url = f"https://archive.sensor.community/{day}/{day}_laerm_sensor_{sensor_id}.csv"
+def fetch_and_push(sensor_id, day, state=None):
+    url = day_url(sensor_id, day)
     print(f"Fetching {url} ...", flush=True)
 
     try:
         response = requests.get(url, timeout=30)
         if response.status_code != 200 or not response.text.strip():
             print(f"❌ Failed to fetch {url} (status {response.status_code})", flush=True)
+            if state is not None and response.status_code in (200, 404):
+                sensor_registry.record(state, sensor_id, day, 0)
             return False
 
         # Parse CSV from text
         reader = csv.DictReader(io.StringIO(response.text), delimiter=";")
         rows = list(reader)
+        if state is not None:
+            sensor_registry.record(state, sensor_id, day, len(rows))
 
         if not rows:
             print(f"⚠️ No data in {url}", flush=True)
             return False
 
-        with InfluxDBClient(url=INFLUX_URL, token=INFLUX_TOKEN, org=INFLUX_ORG) as client:
-            write_api = client.write_api(write_options=WriteOptions(batch_size=1000, flush_interval=10000))
-            points = []
-            for row in rows:
-                try:
-                    timestamp = datetime.datetime.fromisoformat(row["timestamp"])
-                    fields = {}
-                    for key in ["LAeq", "LAmin", "LAmax"]:
-                        if row.get(key):
-                            fields[key] = float(row[key])
-                    if fields:
-                        point = Point("noise") \
-                            .tag("sensor_id", str(sensor_id)) \
-                            .time(timestamp) \
-                            .field("LAeq", fields.get("LAeq", 0)) \
-                            .field("LAmin", fields.get("LAmin", 0)) \
-                            .field("LAmax", fields.get("LAmax", 0))
-                        points.append(point)
-                except Exception as e:
-                    print(f"⚠️ Skipping row due to error: {e}", flush=True)
-            if points:
-                write_api.write(bucket=INFLUX_BUCKET, record=points)
-        print(f"✅ Wrote {len(points)} points for sensor {sensor_id} on {day}", flush=True)
+        written = ingest_rows(sensor_id, day, rows)
+        print(f"✅ Wrote {written} points for sensor {sensor_id} on {day}", flush=True)
         return True
     except Exception as e:
         print(f"❌ Error processing {url}: {e}", flush=True)
         return False
 
-def backfill_day(day: str):
+def backfill_day(day: str, state):
     print(f"🕓 Processing {day}", flush=True)
     successful_fetches = 0
-    for sensor in SENSOR_IDS:
-        if fetch_and_push(sensor, day):
+    for sensor in sensor_registry.sensors_due(state, day):
+        if fetch_and_push(sensor, day, state):
             successful_fetches += 1
         time.sleep(1)
     print(f"🎉 Finished {day}: {successful_fetches} sensors processed", flush=True)
@@ -82,6 +51,10 @@ if __name__ == "__main__":
     day_str = target_day.strftime("%Y-%m-%d")
 
     print(f"🚀 Starting backfill for {day_str}", flush=True)
-    success = backfill_day(day_str)
+    state = sensor_registry.load_state()
+    install_hooks()
+    success = backfill_day(day_str, state)
     if not success:
         print(f"⚠️ No data fetched for {day_str}", flush=True)
+    sensor_registry.save_state(state)
+    print(f"📡 {sensor_registry.summary(state)}", flush=True)
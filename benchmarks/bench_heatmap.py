@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""Benchmark: seaborn heatmap path vs heatmap_render for week, trimester and year grids.
+
+Times figure build + PNG save and figure build + PDF save for both
+renderers on synthetic LAmax day x hour pivots, and reports PDF size.
+
+Usage:
+    python benchmarks/bench_heatmap.py [--repeat 3] [--json results.json]
+"""
+import os
+import io
+import sys
+import json
+import time
+import argparse
+import numpy as np
+import pandas as pd
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import seaborn as sns
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from heatmap_render import noise_cmap, noise_norm, plot_heatmap  # noqa: E402
+
+GRIDS = {"week": 7, "trimester": 92, "year": 365}
+HOUR_ORDER = list(range(7, 24)) + list(range(0, 7))
+
+
+def synthetic_pivots(days, seed=0):
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range("2025-01-01", periods=days, freq="D").date
+    base = 55 + 10 * np.sin(np.linspace(0, 2 * np.pi, 24))[None, :]
+    pivot = pd.DataFrame(base + rng.normal(0, 4, (days, 24)), index=dates, columns=HOUR_ORDER)
+    pivot.iloc[rng.random(pivot.shape) < 0.02] = np.nan
+    adj = pd.Series(0.0, index=HOUR_ORDER)
+    adj.loc[19:22] = 5
+    adj.loc[[23, 0, 1, 2, 3, 4, 5, 6]] = 10
+    return pivot, pivot.add(adj, axis=1)
+
+
+def seaborn_figure(pivot, adjusted):
+    plt.figure(figsize=(12, 6))
+    ax = sns.heatmap(adjusted.T, annot=pivot.T, fmt=".0f", cmap=noise_cmap(), norm=noise_norm(),
+                     cbar_kws={"label": "Avg LAmax dB(A)"}, linewidths=.5,
+                     xticklabels=[d.strftime("%a %d") for d in pivot.index], yticklabels=HOUR_ORDER)
+    ax.tick_params(axis="x", rotation=45)
+    return plt.gcf()
+
+
+def fast_figure(pivot, adjusted):
+    fig, ax = plot_heatmap(pivot.T, adjusted.T, cbar_label="Avg LAmax dB(A)",
+                           col_labels=[d.strftime("%a %d") for d in pivot.index])
+    ax.tick_params(axis="x", rotation=45)
+    return fig
+
+
+def time_render(build, pivot, adjusted, fmt):
+    started = time.perf_counter()
+    fig = build(pivot, adjusted)
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format=fmt)
+    plt.close(fig)
+    return time.perf_counter() - started, buffer.tell()
+
+
+def run(repeat):
+    results = []
+    for grid, days in GRIDS.items():
+        pivot, adjusted = synthetic_pivots(days)
+        for name, build in (("seaborn", seaborn_figure), ("heatmap_render", fast_figure)):
+            row = {"grid": grid, "cells": days * 24, "renderer": name}
+            for fmt in ("png", "pdf"):
+                runs = [time_render(build, pivot, adjusted, fmt) for _ in range(repeat)]
+                row[f"{fmt}_s"] = round(min(r[0] for r in runs), 3)
+                row[f"{fmt}_bytes"] = runs[0][1]
+            results.append(row)
+            print(f"{grid:<10} {name:<15} png {row['png_s']:6.2f}s  pdf {row['pdf_s']:6.2f}s  "
+                  f"{row['pdf_bytes'] / 1024:8.0f} KB", flush=True)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Heatmap renderer benchmark")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    results = run(args.repeat)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"benchmark": "heatmap", "results": results}, f, indent=1)
+        print(f"✅ Results written to {args.json}")
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""End-to-end pipeline benchmarks against synthetic data and local stand-ins.
+
+  1. generates N sensors x D days of laerm_sensor CSVs ending yesterday,
+  2. starts the stand-in archive + Influx server (benchmarks/standin_server.py),
+  3. runs each scenario in its own process, pointed at the stand-in:
+
+       ingest     fetch_and_push for every sensor-day (archive -> Influx)
+       weekly     weekly_report.run_pipeline for the last 7 days
+       trimester  hourly read of the whole range + third_trimester heatmap
+       graphs     generate_all_7d_graphs.py (JSON series for the viewer)
+
+Every scenario records wall time, rows processed, rows/s and peak RSS.
+Results go to a JSON file that can be compared with a run on another
+commit.
+
+Usage:
+    python benchmarks/run_benchmarks.py [--sensors 12] [--days 14] [--latency 0.01]
+                                        [--scenarios ingest,weekly] [--out results.json]
+    python benchmarks/run_benchmarks.py --compare old.json new.json
+"""
+import os
+import sys
+import json
+import time
+import runpy
+import shutil
+import argparse
+import datetime
+import resource
+import tempfile
+import subprocess
+import contextlib
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+SCENARIOS = ["ingest", "weekly", "trimester", "graphs"]
+
+
+# ===== SCENARIOS (run in a child process) =====
+def _server_stats():
+    import requests
+    return requests.get(os.environ["INFLUX_URL"] + "/health", timeout=10).json()
+
+
+def _bench_days():
+    first = datetime.date.fromisoformat(os.environ["BENCH_START"])
+    return [first + datetime.timedelta(days=i) for i in range(int(os.environ["BENCH_DAYS"]))]
+
+
+def _bench_sensors():
+    return [int(s) for s in os.environ["BENCH_SENSORS"].split(",")]
+
+
+def _counting_router(counter):
+    import data_sources
+    router = data_sources.DataRouter([data_sources.InfluxSource(), data_sources.ArchiveSource()],
+                                     verbose=False)
+    read = router.read
+
+    def counted(*args, **kwargs):
+        df = read(*args, **kwargs)
+        counter[0] += len(df)
+        return df
+    router.read = counted
+    return router
+
+
+def scenario_ingest():
+    import backfill_last_week
+    before = _server_stats()["points"]
+    for day in _bench_days():
+        for sensor_id in _bench_sensors():
+            backfill_last_week.fetch_and_push(sensor_id, day.isoformat())
+    return _server_stats()["points"] - before
+
+
+def scenario_weekly():
+    import weekly_report
+    days = _bench_days()
+    rows = [0]
+    weekly_report.run_pipeline(_bench_sensors(), days[-7], days[-1], _counting_router(rows))
+    return rows[0]
+
+
+def scenario_trimester():
+    import third_trimester_one_sensor as trimester
+    days = _bench_days()
+    rows = [0]
+    sensor_id = _bench_sensors()[0]
+    df = _counting_router(rows).read([sensor_id], days[0], days[-1] + datetime.timedelta(days=1), "1h")
+    start = datetime.datetime.combine(days[0], datetime.time())
+    end = datetime.datetime.combine(days[-1], datetime.time())
+    trimester.build_heatmap(df.copy(), sensor_id, start, end)
+    return rows[0]
+
+
+def scenario_graphs():
+    runpy.run_path(os.path.join(REPO_DIR, "generate_all_7d_graphs.py"), run_name="__main__")
+    with open(os.path.join("graphs", "data", "index.json")) as f:
+        return sum(s["points"] for s in json.load(f)["sensors"])
+
+
+def run_child(name, out_path):
+    """Run one scenario in this process and write its measurements to out_path."""
+    started = time.perf_counter()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        rows = globals()[f"scenario_{name}"]()
+    wall = time.perf_counter() - started
+    result = {
+        "wall_s": round(wall, 3),
+        "rows": int(rows),
+        "rows_per_s": round(rows / wall, 1) if wall else None,
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+    with open(out_path, "w") as f:
+        json.dump(result, f)
+
+
+# ===== DRIVER =====
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_all(args):
+    from synth_archive import generate
+    from standin_server import StandinServer
+
+    workdir = tempfile.mkdtemp(prefix="noise-bench-")
+    archive_dir = os.path.join(workdir, "archive")
+    start = datetime.date.today() - datetime.timedelta(days=args.days)
+    print(f"🧪 Generating {args.sensors} sensors x {args.days} days from {start}", flush=True)
+    sensor_ids, _, total_rows = generate(archive_dir, args.sensors, args.days, start)
+
+    server = StandinServer(archive_dir, latency=args.latency, rate_404=args.rate_404,
+                           rate_429=args.rate_429)
+    url = server.start()
+    env = dict(os.environ,
+               ARCHIVE_URL=url, INFLUX_URL=url, INFLUX_TOKEN="bench", INFLUX_ORG="bench",
+               INFLUX_BUCKET="noise_data", QUERY_CACHE_DIR="off", MPLBACKEND="Agg",
+               SENSOR_STATE_PATH=os.path.join(workdir, "sensor_state.json"),
+               BENCH_START=start.isoformat(), BENCH_DAYS=str(args.days),
+               BENCH_SENSORS=",".join(str(s) for s in sensor_ids),
+               PYTHONPATH=os.pathsep.join(filter(None, [REPO_DIR, os.environ.get("PYTHONPATH")])))
+    for key in ("EXCEEDANCE_SINK", "LOUD_EVENTS_DB", "HOURLY_CUBE_DIR", "DATA_QUALITY_DB"):
+        env.pop(key, None)
+
+    results = {
+        "commit": _git_commit(),
+        "created": datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "params": {"sensors": args.sensors, "days": args.days, "csv_rows": total_rows,
+                   "latency": args.latency, "rate_404": args.rate_404, "rate_429": args.rate_429},
+        "scenarios": {},
+    }
+    try:
+        for name in args.scenarios:
+            out_path = os.path.join(workdir, f"{name}.json")
+            proc = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", name,
+                                   "--child-out", out_path], cwd=workdir,
+                                  env=dict(env, PIPELINE_METRICS_JOB=f"bench_{name}"),
+                                  capture_output=True, text=True)
+            if proc.returncode != 0:
+                print(f"❌ {name} failed:\n{proc.stderr[-2000:]}", flush=True)
+                results["scenarios"][name] = {"error": proc.stderr.strip().splitlines()[-1:]}
+                continue
+            with open(out_path) as f:
+                results["scenarios"][name] = json.load(f)
+            r = results["scenarios"][name]
+            print(f"⏱️ {name:<10} {r['wall_s']:7.2f}s  {r['rows']:>9} rows  "
+                  f"{r['rows_per_s'] or 0:>10.0f} rows/s  {r['peak_rss_mb']:6.0f} MB", flush=True)
+    finally:
+        server.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+    results["server"] = server.stats
+    return results
+
+
+def compare(old_path, new_path):
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f"📊 {old.get('commit')} → {new.get('commit')}")
+    for name, after in new["scenarios"].items():
+        before = old["scenarios"].get(name)
+        if not before or "error" in before or "error" in after:
+            continue
+        deltas = []
+        for key in ("wall_s", "rows_per_s", "peak_rss_mb"):
+            if before.get(key) and after.get(key) is not None:
+                deltas.append(f"{key} {before[key]} → {after[key]} ({(after[key] / before[key] - 1) * 100:+.0f}%)")
+        print(f"  {name:<10} " + ", ".join(deltas))
+
+
+# ===== MAIN =====
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="End-to-end pipeline benchmarks")
+    parser.add_argument("--sensors", type=int, default=12)
+    parser.add_argument("--days", type=int, default=14)
+    parser.add_argument("--latency", type=float, default=0.01, help="archive seconds per request")
+    parser.add_argument("--rate-404", type=float, default=0.0)
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--out", help="results file (default: benchmarks/results/<time>-<commit>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"))
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--child-out", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.child_out)
+    elif args.compare:
+        compare(*args.compare)
+    else:
+        args.scenarios = [s for s in args.scenarios.split(",") if s]
+        unknown = set(args.scenarios) - set(SCENARIOS)
+        if unknown:
+            parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+        if args.days < 7:
+            parser.error("--days must be at least 7 (weekly and graphs scenarios)")
+        results = run_all(args)
+        out = args.out or os.path.join(
+            RESULTS_DIR, f"{datetime.datetime.now():%Y%m%d-%H%M%S}-{results['commit'] or 'nogit'}.json")
+        os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+        with open(out, "w") as f:
+            json.dump(results, f, indent=1)
+        print(f"✅ Results written to {out}")
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""Local stand-in for archive.sensor.community and the InfluxDB v2 HTTP API.
+
+    GET  /<day>/<day>_laerm_sensor_<id>.csv   files from an archive dir
+    POST /api/v2/write                        line protocol, kept in memory
+    POST /api/v2/query                        the Flux shapes this repo uses
+
+Archive responses can be slowed down (--latency) and made to fail with
+404 / 429 at a configurable rate, to exercise retries and backoff.
+
+The query endpoint is not a Flux engine. It understands what the
+scripts send: range(start, stop), a sensor filter (== or contains(set)),
+on sensor_id or chip_id, _field filters, aggregateWindow(every: 1h,
+fn: mean) and pivot(). It answers in annotated CSV, so influxdb-client
+parses the result exactly as it would a real server's.
+
+Usage:
+    python benchmarks/standin_server.py archive_dir [--port 8086] [--latency 0.05]
+"""
+import re
+import os
+import gzip
+import json
+import time
+import random
+import argparse
+import threading
+import pandas as pd
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FIELDS = ["LAeq", "LAmin", "LAmax"]
+PRECISION_NS = {"ns": 1, "us": 10**3, "ms": 10**6, "s": 10**9}
+
+
+class PointStore:
+    """sensor_id -> {timestamp ns: {field: value}}; rewriting a point overwrites it."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.points = {}
+
+    def write_lines(self, text, precision="ns"):
+        scale = PRECISION_NS.get(precision, 1)
+        written = 0
+        with self._lock:
+            for line in text.splitlines():
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                head, field_part, ts = line.rsplit(" ", 2) if line.count(" ") >= 2 else (*line.split(" "), None)
+                tags = dict(t.split("=", 1) for t in head.split(",")[1:])
+                sensor = tags.get("sensor_id") or tags.get("chip_id")
+                fields = {}
+                for pair in field_part.split(","):
+                    key, value = pair.split("=", 1)
+                    fields[key] = float(value.rstrip("i"))
+                stamp = int(ts) * scale if ts else time.time_ns()
+                self.points.setdefault(sensor, {}).setdefault(stamp, {}).update(fields)
+                written += 1
+        return written
+
+    def frame(self, sensors, start_ns, stop_ns):
+        rows = []
+        with self._lock:
+            for sensor in sensors if sensors is not None else list(self.points):
+                for stamp, fields in self.points.get(sensor, {}).items():
+                    if start_ns <= stamp < stop_ns:
+                        rows.append((stamp, sensor, *(fields.get(f) for f in FIELDS)))
+        df = pd.DataFrame(rows, columns=["_time", "sensor", *FIELDS])
+        df["_time"] = pd.to_datetime(df["_time"], unit="ns", utc=True)
+        return df.sort_values(["sensor", "_time"])
+
+
+def _flux_time(value, default):
+    value = value.strip().strip('"')
+    try:
+        ts = pd.Timestamp(value)
+    except ValueError:
+        return default                          # relative range: everything
+    ts = ts.tz_localize("UTC") if ts.tzinfo is None else ts
+    return ts.value
+
+
+def parse_flux(query):
+    """What the stand-in needs from a query: range, sensors, tag, fields, hourly, pivot."""
+    spec = {"start": 0, "stop": 2**63 - 1, "sensors": None,
+            "tag": "chip_id" if "chip_id" in query else "sensor_id",
+            "fields": [f for f in FIELDS if re.search(rf'_field"?\]?\s*==\s*"{f}"', query)] or
+                      [f for f in FIELDS if re.search(r"_field.*=~", query) and f in query] or FIELDS,
+            "hourly": "aggregateWindow" in query, "pivot": "pivot(" in query}
+    rng = re.search(r"range\(\s*start:\s*([^,\)]+)(?:,\s*stop:\s*([^\)]+))?\)", query)
+    if rng:
+        spec["start"] = _flux_time(rng.group(1), 0)
+        if rng.group(2):
+            spec["stop"] = _flux_time(rng.group(2), spec["stop"])
+    members = re.search(r"set:\s*\[([^\]]*)\]", query)
+    if members:
+        spec["sensors"] = re.findall(r'"?(\w+)"?', members.group(1))
+    else:
+        single = re.search(r'(?:sensor_id|chip_id)"?\]?\s*==\s*"?(\w+)"?', query)
+        if single:
+            spec["sensors"] = [single.group(1)]
+    return spec
+
+
+def annotated_csv(df, columns, types, group):
+    """Annotated CSV as influxdb-client expects; one table per sensor."""
+    lines = [
+        "#datatype,string,long," + ",".join(types),
+        "#group,false,false," + ",".join("true" if g else "false" for g in group),
+        "#default,_result,,," + "," * (len(columns) - 2),
+        ",result,table," + ",".join(columns),
+    ]
+    for table, (_, part) in enumerate(df.groupby("_table", sort=False)):
+        for row in part[columns].itertuples(index=False):
+            cells = []
+            for value in row:
+                if isinstance(value, pd.Timestamp):
+                    cells.append(value.strftime("%Y-%m-%dT%H:%M:%SZ"))
+                elif value is None or (isinstance(value, float) and value != value):
+                    cells.append("")
+                else:
+                    cells.append(str(value))
+            lines.append(f",,{table}," + ",".join(cells))
+    return "\r\n".join(lines) + "\r\n\r\n"
+
+
+def run_query(store, query):
+    spec = parse_flux(query)
+    df = store.frame(spec["sensors"], spec["start"], spec["stop"])
+    tag = spec["tag"]
+    if df.empty:
+        return ""
+    if spec["hourly"]:
+        df["_time"] = df["_time"].dt.floor("h")
+        df = df.groupby(["sensor", "_time"], as_index=False)[FIELDS].mean()
+    df = df.rename(columns={"sensor": tag})
+    if spec["pivot"]:
+        fields = spec["fields"]
+        df = df.dropna(subset=fields, how="all")
+        df["_table"] = df[tag]
+        columns = ["_time", tag] + fields
+        return annotated_csv(df, columns, ["dateTime:RFC3339", "string"] + ["double"] * len(fields),
+                             [False, True] + [False] * len(fields))
+    long = df.melt(id_vars=["_time", tag], value_vars=spec["fields"], var_name="_field", value_name="_value")
+    long = long.dropna(subset=["_value"]).sort_values([tag, "_field", "_time"])
+    long["_table"] = long[tag] + long["_field"]
+    columns = ["_time", "_value", "_field", tag]
+    return annotated_csv(long, columns, ["dateTime:RFC3339", "double", "string", "string"],
+                         [False, False, True, True])
+
+
+class StandinServer:
+    def __init__(self, archive_dir, port=0, latency=0.0, rate_404=0.0, rate_429=0.0, seed=0):
+        self.archive_dir = archive_dir
+        self.latency = latency
+        self.rate_404 = rate_404
+        self.rate_429 = rate_429
+        self.store = PointStore()
+        self.stats = {"archive_requests": 0, "archive_404": 0, "archive_429": 0,
+                      "writes": 0, "points": 0, "queries": 0}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def _count(self, key, n=1):
+        with self._lock:
+            self.stats[key] += n
+
+    def _roll(self):
+        with self._lock:
+            return self._random.random()
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body=b"", content_type="text/plain", headers=None):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _body(self):
+                data = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if self.headers.get("Content-Encoding") == "gzip":
+                    data = gzip.decompress(data)
+                return data.decode()
+
+            def do_GET(self):
+                path = urlparse(self.path).path
+                if path == "/health":
+                    return self._send(200, json.dumps(server.stats).encode(), "application/json")
+                server._count("archive_requests")
+                if server.latency:
+                    time.sleep(server.latency)
+                roll = server._roll()
+                if roll < server.rate_429:
+                    server._count("archive_429")
+                    return self._send(429, b"Too Many Requests", headers={"Retry-After": "1"})
+                file_path = os.path.join(server.archive_dir, *path.strip("/").split("/"))
+                if roll < server.rate_429 + server.rate_404 or not os.path.isfile(file_path):
+                    server._count("archive_404")
+                    return self._send(404, b"Not Found")
+                with open(file_path, "rb") as f:
+                    self._send(200, f.read(), "text/csv")
+
+            def do_POST(self):
+                parsed = urlparse(self.path)
+                params = parse_qs(parsed.query)
+                body = self._body()
+                if parsed.path == "/api/v2/write":
+                    n = server.store.write_lines(body, params.get("precision", ["ns"])[0])
+                    server._count("writes")
+                    server._count("points", n)
+                    return self._send(204)
+                if parsed.path == "/api/v2/query":
+                    server._count("queries")
+                    query = json.loads(body)["query"] if body.lstrip().startswith("{") else body
+                    return self._send(200, run_query(server.store, query).encode(), "text/csv; charset=utf-8")
+                self._send(404, b"Not Found")
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self.url
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stand-in archive + InfluxDB server")
+    parser.add_argument("archive_dir")
+    parser.add_argument("--port", type=int, default=8086)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per archive request")
+    parser.add_argument("--rate-404", type=float, default=0.0)
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = StandinServer(args.archive_dir, args.port, args.latency, args.rate_404, args.rate_429)
+    print(f"🚀 Serving {args.archive_dir} and /api/v2 on {server.url}", flush=True)
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
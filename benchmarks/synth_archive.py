@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""Synthetic laerm_sensor day CSVs laid out like archive.sensor.community.
+
+    <out>/<day>/<day>_laerm_sensor_<id>.csv
+
+Each file has the archive header and one row every ~INTERVAL_SECONDS
+(with jitter) holding LAeq/LA_min/LA_max that follow a day/night cycle,
+rush-hour bumps, random loud events (LAmax spikes) and the odd dropout,
+so parsers, aggregations and event detection see realistic input.
+
+Usage:
+    python benchmarks/synth_archive.py out_dir --sensors 12 --days 7 [--start 2025-07-07]
+"""
+import os
+import sys
+import argparse
+import datetime
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sensor_registry import SENSOR_IDS  # noqa: E402
+
+HEADER = "sensor_id;sensor_type;location;lat;lon;timestamp;noise_LAeq;noise_LA_min;noise_LA_max\n"
+INTERVAL_SECONDS = 145     # typical laerm_sensor reporting interval
+DROPOUT_RATE = 0.002       # chance per row that the sensor skips ~30 minutes
+EVENT_RATE = 0.01          # chance per row of a loud event (scooter, siren...)
+
+
+def day_levels(rng, n, seconds):
+    hours = seconds / 3600.0
+    base = 42 + 12 * np.clip(np.sin((hours - 5) / 24 * 2 * np.pi), -0.4, 1)   # quiet nights
+    base += 4 * np.exp(-((hours - 8.5) ** 2) / 1.5) + 4 * np.exp(-((hours - 17.5) ** 2) / 2)
+    laeq = base + rng.normal(0, 2.5, n)
+    la_min = laeq - rng.uniform(3, 8, n)
+    la_max = laeq + rng.uniform(5, 12, n)
+    events = rng.random(n) < EVENT_RATE
+    la_max[events] += rng.uniform(10, 30, events.sum())
+    laeq[events] += rng.uniform(2, 8, events.sum())
+    return laeq, la_min, la_max
+
+
+def write_day(out_dir, sensor_id, day, rng):
+    offsets = np.cumsum(rng.normal(INTERVAL_SECONDS, 5, int(86400 / INTERVAL_SECONDS) + 10))
+    offsets = offsets[offsets < 86400]
+    for start in np.flatnonzero(rng.random(len(offsets)) < DROPOUT_RATE):
+        offsets[start:start + 12] = -1
+    offsets = offsets[offsets >= 0]
+    laeq, la_min, la_max = day_levels(rng, len(offsets), offsets)
+
+    midnight = datetime.datetime.combine(day, datetime.time())
+    lat, lon = 51.92 + (sensor_id % 97) / 10000, 4.47 + (sensor_id % 89) / 10000
+    lines = [HEADER]
+    for t, eq, lo, hi in zip(offsets, laeq, la_min, la_max):
+        ts = (midnight + datetime.timedelta(seconds=float(t))).strftime("%Y-%m-%dT%H:%M:%S")
+        lines.append(f"{sensor_id};Laerm;{sensor_id - 40000};{lat:.3f};{lon:.3f};{ts};"
+                     f"{eq:.1f};{lo:.1f};{hi:.1f}\n")
+
+    day_str = day.isoformat()
+    folder = os.path.join(out_dir, day_str)
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, f"{day_str}_laerm_sensor_{sensor_id}.csv")
+    with open(path, "w") as f:
+        f.writelines(lines)
+    return len(lines) - 1
+
+
+def generate(out_dir, sensors, days, start, seed=0):
+    """Write sensors x days files. Returns (sensor ids, days, total rows)."""
+    rng = np.random.default_rng(seed)
+    sensor_ids = SENSOR_IDS[:sensors] if sensors <= len(SENSOR_IDS) else \
+        SENSOR_IDS + [100000 + i for i in range(sensors - len(SENSOR_IDS))]
+    day_list = [start + datetime.timedelta(days=i) for i in range(days)]
+    rows = 0
+    for day in day_list:
+        for sensor_id in sensor_ids:
+            rows += write_day(out_dir, sensor_id, day, rng)
+    return sensor_ids, day_list, rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic laerm_sensor archive CSVs")
+    parser.add_argument("out_dir")
+    parser.add_argument("--sensors", type=int, default=12)
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--start", default="2025-07-07")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    ids, day_list, rows = generate(args.out_dir, args.sensors, args.days,
+                                   datetime.date.fromisoformat(args.start), args.seed)
+    print(f"✅ {len(ids)} sensors x {len(day_list)} days, {rows} rows in {args.out_dir}/")
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""Incremental build of the GitHub Pages site into SITE_DIR.
+
+Only what the pages need is published: the map and dashboard pages at the
+root (PUBLISH), graphs/ and everything under reports/. Every published
+file is recorded in SITE_DIR/manifest.json with its SHA-256, and a run
+only touches files whose content changed since the previous build:
+
+    copy       new or changed files are copied into SITE_DIR
+    images     report PNG/JPGs also get a THUMB_WIDTH px thumbnail and a
+               WEB_WIDTH px web image (WebP), rendered in a process pool
+               and named after the content hash, so they can be cached
+               forever
+    prune      files that disappeared from the tree are removed again
+
+reports/index.json lists every report artifact (sensor, period, size,
+thumbnail, web image) for reports/gallery.html, so visitors load
+thumbnails instead of full-size PNGs.
+
+Keep SITE_DIR between runs (the Pages workflow caches it) to stay
+incremental; an empty SITE_DIR simply rebuilds everything.
+
+Usage:
+    python build_site.py [--site _site] [--workers 4] [--force]
+"""
+import os
+import re
+import glob
+import json
+import shutil
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import pipeline_metrics as metrics
+
+# ===== SETTINGS =====
+SITE_DIR = os.getenv("SITE_DIR", "_site")
+REPORTS_DIR = "reports"
+PUBLISH = ["*.html", "*.js", "*.json", "graphs/**/*", f"{REPORTS_DIR}/**/*"]
+SKIP = {"sensor_state.json"}
+DERIVED_DIR = f"{REPORTS_DIR}/_web"
+SKIP_DIRS = (DERIVED_DIR, f"{REPORTS_DIR}/_cache", f"{REPORTS_DIR}/_profile")
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+
+THUMB_WIDTH = 400
+WEB_WIDTH = 1200
+WEBP_QUALITY = 80
+WORKERS = int(os.getenv("SITE_WORKERS", os.cpu_count() or 1))
+
+MANIFEST_VERSION = 1
+IMAGE_PARAMS = {"thumb": THUMB_WIDTH, "web": WEB_WIDTH, "quality": WEBP_QUALITY}
+
+
+# ===== FUNCTIONS =====
+def sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def source_files(root="."):
+    """Relative paths of everything to publish (posix separators)."""
+    paths = set()
+    for pattern in PUBLISH:
+        for path in glob.glob(os.path.join(root, pattern), recursive=True):
+            rel = os.path.relpath(path, root).replace(os.sep, "/")
+            if os.path.isfile(path) and os.path.basename(rel) not in SKIP \
+                    and not rel.startswith(SKIP_DIRS):
+                paths.add(rel)
+    return sorted(paths)
+
+
+def load_manifest(site_dir):
+    path = os.path.join(site_dir, "manifest.json")
+    if os.path.exists(path):
+        with open(path) as f:
+            manifest = json.load(f)
+        if manifest.get("version") == MANIFEST_VERSION:
+            return manifest
+    return {"version": MANIFEST_VERSION, "images": IMAGE_PARAMS, "files": {}}
+
+
+def save_manifest(site_dir, manifest):
+    path = os.path.join(site_dir, "manifest.json")
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def is_image(rel):
+    return rel.startswith(f"{REPORTS_DIR}/") and rel.lower().endswith(IMAGE_EXTENSIONS)
+
+
+def derived_paths(rel, digest):
+    stem = os.path.splitext(rel[len(REPORTS_DIR) + 1:])[0]
+    base = f"{DERIVED_DIR}/{stem}.{digest[:10]}"
+    return f"{base}.thumb.webp", f"{base}.webp"
+
+
+def _save_webp(image, path):
+    tmp = f"{path}.tmp"
+    image.save(tmp, "WEBP", quality=WEBP_QUALITY, method=4)
+    os.replace(tmp, path)
+
+
+def render_image(src, thumb_path, web_path):
+    """Thumbnail and web-sized copy of one image (runs in a worker process)."""
+    from PIL import Image
+    with Image.open(src) as image:
+        image.load()
+        size = image.size
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+        for path, width in ((web_path, WEB_WIDTH), (thumb_path, THUMB_WIDTH)):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if image.width > width:
+                image = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+            _save_webp(image, path)              # web first, then shrink the same image further
+    return size
+
+
+def describe(rel, entry):
+    """Gallery record of one report artifact."""
+    name = os.path.basename(rel)
+    sensor = re.search(r"(?<!\d)(\d{5})(?!\d)", rel)
+    period = re.search(r"(\d{4})_(T\d)", rel)
+    record = {
+        "path": rel[len(REPORTS_DIR) + 1:],
+        "name": name,
+        "kind": "image" if is_image(rel) else os.path.splitext(name)[1].lstrip(".").lower(),
+        "sensor": sensor.group(1) if sensor else None,
+        "period": f"{period.group(1)} {period.group(2)}" if period else None,
+        "bytes": entry["size"],
+        "hash": entry["sha256"][:10],
+    }
+    if "thumb" in entry:
+        record.update(thumb=entry["thumb"][len(REPORTS_DIR) + 1:], web=entry["web"][len(REPORTS_DIR) + 1:],
+                      width=entry["width"], height=entry["height"])
+    return record
+
+
+def _remove(site_dir, rel):
+    path = os.path.join(site_dir, rel)
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def build(site_dir=SITE_DIR, workers=WORKERS, force=False, root="."):
+    os.makedirs(site_dir, exist_ok=True)
+    manifest = load_manifest(site_dir)
+    if force or manifest.get("images") != IMAGE_PARAMS:
+        manifest = {"version": MANIFEST_VERSION, "images": IMAGE_PARAMS, "files": {}}
+    old = manifest["files"]
+    files, changed, renders = {}, [], []
+
+    with metrics.timer("scan"):
+        for rel in source_files(root):
+            src = os.path.join(root, rel)
+            stat = os.stat(src)
+            previous = old.get(rel)
+            # Same size and mtime: trust the recorded hash (CI checkouts reset mtimes, so they rehash)
+            if previous and previous["size"] == stat.st_size and previous.get("mtime_ns") == stat.st_mtime_ns:
+                digest = previous["sha256"]
+            else:
+                digest = sha256(src)
+            entry = {"sha256": digest, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+            outputs = [rel]
+            if is_image(rel):
+                entry["thumb"], entry["web"] = derived_paths(rel, digest)
+                outputs += [entry["thumb"], entry["web"]]
+            unchanged = (previous and previous["sha256"] == digest
+                         and all(os.path.exists(os.path.join(site_dir, p)) for p in outputs))
+            if unchanged:
+                entry.update({k: previous[k] for k in ("width", "height") if k in previous})
+            else:
+                changed.append(rel)
+                if is_image(rel):
+                    renders.append(rel)
+            files[rel] = entry
+
+    with metrics.timer("copy"):
+        for rel in changed:
+            dst = os.path.join(site_dir, rel)
+            os.makedirs(os.path.dirname(dst) or ".", exist_ok=True)
+            shutil.copy2(os.path.join(root, rel), dst)
+
+    if renders:
+        with metrics.timer("render"), ProcessPoolExecutor(max_workers=max(1, workers)) as pool:
+            futures = {pool.submit(render_image, os.path.join(root, rel),
+                                   os.path.join(site_dir, files[rel]["thumb"]),
+                                   os.path.join(site_dir, files[rel]["web"])): rel for rel in renders}
+            for future in as_completed(futures):
+                rel = futures[future]
+                try:
+                    files[rel]["width"], files[rel]["height"] = future.result()
+                except Exception as e:
+                    print(f"⚠️ {rel}: {e}", flush=True)
+                    del files[rel]["thumb"], files[rel]["web"]
+
+    # Prune removed sources and derived images of older content
+    removed = [rel for rel in old if rel not in files]
+    for rel in removed:
+        _remove(site_dir, rel)
+    for rel, previous in old.items():
+        current = files.get(rel, {})
+        for key in ("thumb", "web"):
+            if key in previous and previous[key] != current.get(key):
+                _remove(site_dir, previous[key])
+
+    index = [describe(rel, entry) for rel, entry in files.items() if rel.startswith(f"{REPORTS_DIR}/")
+             and rel.lower().endswith((".png", ".jpg", ".jpeg", ".pdf"))]
+    index_path = os.path.join(site_dir, REPORTS_DIR, "index.json")
+    os.makedirs(os.path.dirname(index_path), exist_ok=True)
+    with open(index_path, "w") as f:
+        json.dump({"artifacts": index}, f, separators=(",", ":"))
+
+    manifest["files"] = files
+    save_manifest(site_dir, manifest)
+    metrics.inc("site_files_total", len(changed), result="changed")
+    metrics.inc("site_files_total", len(files) - len(changed), result="unchanged")
+    metrics.inc("site_images_rendered_total", len(renders))
+    return {"files": len(files), "changed": len(changed), "rendered": len(renders), "removed": len(removed)}
+
+
+# ===== MAIN =====
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Incremental static site build")
+    parser.add_argument("--site", default=SITE_DIR)
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--force", action="store_true", help="ignore the manifest and rebuild everything")
+    args = parser.parse_args()
+
+    print(f"🚀 Building site into {args.site}/", flush=True)
+    stats = build(args.site, args.workers, args.force)
+    print(f"✅ {stats['files']} files: {stats['changed']} new or changed, "
+          f"{stats['rendered']} images rendered, {stats['removed']} removed", flush=True)
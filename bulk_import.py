@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""Bulk historical import from the archive's per-month / per-year bundles.
+
+One bundle holds every laerm_sensor for a whole month (or year), so a
+trimester re-import is three downloads instead of ~90 x sensors requests.
+Bundles are streamed: rows are decompressed one at a time and filtered on
+sensor_id before they are parsed. Because a bundle is not guaranteed to be
+ordered by time, the kept rows are spooled to a temporary SQLite file and
+each sensor-day is handed once, complete, to the same encoder and writer
+the daily backfills use. Malformed lines are skipped and counted.
+
+Usage:
+    python bulk_import.py 2025-07 2025-08 2025-09     # monthly bundles
+    python bulk_import.py 2025                         # yearly bundle
+    python bulk_import.py 2025-07 --sensors 94695,89747
+"""
+import os
+import io
+import csv
+import gzip
+import json
+import sqlite3
+import zipfile
+import argparse
+import tempfile
+import requests
+from collections import defaultdict
+import profiling
+from noise_ingest import ARCHIVE_URL, influx_client, ingest_rows, install_hooks
+from sensor_registry import SENSOR_IDS
+
+# ===== SETTINGS =====
+# Bundle locations; overridable because the archive layout is not versioned.
+MONTH_BUNDLE_URL = os.getenv(
+    "BULK_MONTH_URL", ARCHIVE_URL + "/csv_per_month/{period}/{period}_laerm.zip"
+)
+YEAR_BUNDLE_URL = os.getenv(
+    "BULK_YEAR_URL", ARCHIVE_URL + "/csv_per_year/{period}/{period}_laerm.zip"
+)
+
+CHUNK_SIZE = 1024 * 1024
+MAX_LOGGED = 5             # malformed lines printed per bundle before only counting
+
+
+# ===== FUNCTIONS =====
+def bundle_url(period):
+    template = YEAR_BUNDLE_URL if len(period) == 4 else MONTH_BUNDLE_URL
+    return template.format(period=period)
+
+
+def _download(url, fileobj):
+    """Copy the response body to `fileobj` in fixed-size chunks."""
+    with requests.get(url, stream=True, timeout=60) as r:
+        if r.status_code != 200:
+            print(f"❌ Failed to fetch {url} (status {r.status_code})", flush=True)
+            return False
+        for chunk in r.iter_content(chunk_size=CHUNK_SIZE):
+            fileobj.write(chunk)
+    fileobj.seek(0)
+    return True
+
+
+def iter_csv_lines(url):
+    """Yield decoded text lines of a .csv, .csv.gz or .zip bundle."""
+    if url.endswith(".gz"):
+        with requests.get(url, stream=True, timeout=60) as r:
+            if r.status_code != 200:
+                print(f"❌ Failed to fetch {url} (status {r.status_code})", flush=True)
+                return
+            with gzip.GzipFile(fileobj=r.raw) as gz:
+                yield from io.TextIOWrapper(gz, encoding="utf-8")
+        return
+
+    if url.endswith(".csv"):
+        with requests.get(url, stream=True, timeout=60) as r:
+            if r.status_code != 200:
+                print(f"❌ Failed to fetch {url} (status {r.status_code})", flush=True)
+                return
+            for line in r.iter_lines(decode_unicode=True):
+                yield line
+        return
+
+    # Zip needs its central directory (at the end), so spool to disk first.
+    with tempfile.TemporaryFile() as tmp:
+        if not _download(url, tmp):
+            return
+        with zipfile.ZipFile(tmp) as zf:
+            for name in zf.namelist():
+                if not name.endswith(".csv"):
+                    continue
+                with zf.open(name) as member:
+                    yield from io.TextIOWrapper(member, encoding="utf-8")
+
+
+def iter_csv_rows(url, sensor_ids):
+    """Yield (sensor_id, row dict) for rows of `sensor_ids` only.
+
+    Lines that do not match their header (truncated or garbled) and files
+    whose header lacks sensor_id are skipped and logged.
+    """
+    wanted = {str(s) for s in sensor_ids}
+    header = None
+    sensor_col = None
+    skipped = 0
+
+    def skip(reason, fields):
+        nonlocal skipped
+        skipped += 1
+        if skipped <= MAX_LOGGED:
+            print(f"⚠️ Skipping {reason}: {';'.join(fields)[:120]!r}", flush=True)
+
+    for fields in csv.reader(iter_csv_lines(url), delimiter=";"):
+        if not fields:
+            continue
+        if header is None or "sensor_id" in fields:
+            # Zip bundles may hold one file per day, each with its own header.
+            header = fields
+            sensor_col = header.index("sensor_id") if "sensor_id" in header else None
+            if sensor_col is None:
+                skip("header without sensor_id", fields)
+            continue
+        if sensor_col is None:
+            skipped += 1
+            continue
+        if len(fields) != len(header):
+            skip("malformed line", fields)
+            continue
+        if fields[sensor_col] not in wanted:
+            continue
+        yield fields[sensor_col], dict(zip(header, fields))
+    if skipped:
+        print(f"⚠️ Skipped {skipped} malformed lines in {url}", flush=True)
+
+
+def iter_parquet_rows(url, sensor_ids):
+    """Yield (sensor_id, row dict) from a Parquet bundle (needs pyarrow)."""
+    try:
+        import pyarrow.compute as pc
+        import pyarrow.parquet as pq
+    except ImportError:
+        print("❌ pyarrow is required for Parquet bundles (pip install pyarrow)", flush=True)
+        return
+
+    columns = ["sensor_id", "timestamp", "noise_LAeq", "noise_LA_min", "noise_LA_max"]
+    with tempfile.TemporaryFile() as tmp:
+        if not _download(url, tmp):
+            return
+        parquet = pq.ParquetFile(tmp)
+        for batch in parquet.iter_batches(columns=columns, batch_size=65536):
+            ids = batch.column("sensor_id").cast("int64")
+            batch = batch.filter(pc.is_in(ids, value_set=_int_array(sensor_ids)))
+            for row in batch.to_pylist():
+                row = {k: ("" if v is None else str(v)) for k, v in row.items()}
+                yield row["sensor_id"], row
+
+
+def _int_array(values):
+    import pyarrow as pa
+    return pa.array([int(v) for v in values], type=pa.int64())
+
+
+def iter_bundle_rows(url, sensor_ids):
+    if url.endswith(".parquet"):
+        return iter_parquet_rows(url, sensor_ids)
+    return iter_csv_rows(url, sensor_ids)
+
+
+def import_bundle(url, sensor_ids, client):
+    """Stream one bundle into Influx, each sensor-day exactly once.
+
+    Rows are spooled to a temporary SQLite file keyed by (sensor, day) and
+    read back grouped, so a bundle in any order ingests every sensor-day
+    in one complete call (the hooks see whole days, never partial slices)
+    while memory stays at about one sensor-day.
+    """
+    print(f"📦 Streaming {url} ...", flush=True)
+    totals = defaultdict(int)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        spool = sqlite3.connect(os.path.join(tmpdir, "spool.sqlite"))
+        spool.execute("CREATE TABLE rows (sensor_id TEXT, day TEXT, row TEXT)")
+        spool.executemany(
+            "INSERT INTO rows VALUES (?, ?, ?)",
+            ((sensor_id, row.get("timestamp", "")[:10], json.dumps(row))
+             for sensor_id, row in iter_bundle_rows(url, sensor_ids)),
+        )
+        spool.commit()
+
+        current, rows = None, []
+        for sensor_id, day, raw in spool.execute(
+                "SELECT sensor_id, day, row FROM rows ORDER BY sensor_id, day, rowid"):
+            if (sensor_id, day) != current:
+                if rows:
+                    totals[current[0]] += ingest_rows(current[0], current[1], rows, client)
+                current, rows = (sensor_id, day), []
+            rows.append(json.loads(raw))
+        if rows:
+            totals[current[0]] += ingest_rows(current[0], current[1], rows, client)
+        spool.close()
+
+    for sensor_id, total in sorted(totals.items()):
+        print(f"✅ Wrote {total} points for sensor {sensor_id}", flush=True)
+    return sum(totals.values())
+
+
+# ===== MAIN =====
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk import monthly/yearly archive bundles")
+    parser.add_argument("periods", nargs="+", help="YYYY-MM (monthly bundle) or YYYY (yearly bundle)")
+    parser.add_argument("--sensors", help="comma separated sensor ids (default: all registry sensors)")
+    parser.add_argument("--url", help="explicit bundle URL template with {period}")
+    profiling.add_argument(parser)
+    args = parser.parse_args()
+    profiling.from_args(args)
+
+    sensor_ids = [int(s) for s in args.sensors.split(",")] if args.sensors else SENSOR_IDS
+
+    print(f"🚀 Bulk import of {', '.join(args.periods)} for {len(sensor_ids)} sensors", flush=True)
+    install_hooks()
+    grand_total = 0
+    with influx_client() as client:
+        for period in args.periods:
+            url = args.url.format(period=period) if args.url else bundle_url(period)
+            try:
+                grand_total += import_bundle(url, sensor_ids, client)
+            except Exception as e:
+                print(f"❌ Error processing {url}: {e}", flush=True)
+    print(f"🎉 Done! {grand_total} points written", flush=True)
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""City-wide analytics over all live sensors at once.
+
+Hourly means of every sensor are loaded into one aligned cube
+
+    cube[sensor, day, hour]      local (Europe/Amsterdam) days and hours, NaN = no data
+
+and everything below is computed on the whole cube with NumPy, never per
+sensor:
+
+  * correlation   pairwise Pearson over common hours, of the levels and
+                  of the anomalies (level minus the weekday/hour baseline,
+                  so the shared day/night rhythm does not dominate)
+  * ranking       per hour, sensors ranked loudest (1) to quietest; mean
+                  rank per sensor and per hour of day
+  * anomalies     z-score of each hour against the sensor's own
+                  weekday/hour baseline (the BASELINE_WEEKS before the
+                  analysed days), with
+                  the share of sensors anomalous in the same hour, so a
+                  loud night reads as local (one sensor) or central (many)
+  * clusters      runs of consecutive hours in which at least
+                  CLUSTER_MIN_SENSORS sensors exceed the exceedance norm
+
+Results go to one compact JSON file next to the viewer data
+(graphs/data/cross_sensor.json) for the map pages.
+
+Usage:
+    python cross_sensor.py                              # last 7 full days
+    python cross_sensor.py --start 2025-07-01 --end 2025-09-30 [--out graphs/data/cross_sensor.json]
+"""
+import os
+import json
+import argparse
+import datetime
+import numpy as np
+import pandas as pd
+import sensor_registry
+import pipeline_metrics as metrics
+from data_sources import default_router
+from exceedance import PERIODS
+
+# ===== SETTINGS =====
+TIMEZONE = "Europe/Amsterdam"
+METRIC = "LAeq"
+OUTPUT_PATH = os.path.join("graphs", "data", "cross_sensor.json")
+LOCATIONS_FILE = "sensor_locations.json"
+
+BASELINE_WEEKS = 8          # history for the weekday/hour baselines
+MIN_BASELINE = 3            # samples per (sensor, weekday, hour) before a z-score counts
+MIN_OVERLAP_HOURS = 48      # common hours before a correlation is reported
+Z_THRESHOLD = 3.0
+CENTRAL_SHARE = 0.5         # anomalous in >= this share of sensors -> "central"
+CLUSTER_MIN_SENSORS = 3
+MAX_ANOMALIES = 200
+
+
+# ===== FUNCTIONS =====
+def local_midnight_utc(day):
+    return pd.Timestamp(day).tz_localize(TIMEZONE).tz_convert("UTC")
+
+
+def build_cube(df, sensor_ids, first_day, n_days, metric=METRIC):
+    """Long hourly batch -> cube[sensor, day, hour] of means (NaN where empty)."""
+    shape = (len(sensor_ids), n_days, 24)
+    sums = np.zeros(shape)
+    counts = np.zeros(shape)
+    index = {str(s): i for i, s in enumerate(sensor_ids)}
+    sensor_idx = df["sensor_id"].astype(str).map(index)
+    local = df["timestamp"].dt.tz_convert(TIMEZONE)
+    day_idx = (local.dt.tz_localize(None).dt.normalize() - pd.Timestamp(first_day)).dt.days
+    values = df[metric].to_numpy(dtype=float)
+
+    ok = (sensor_idx.notna() & day_idx.between(0, n_days - 1)).to_numpy() & ~np.isnan(values)
+    coords = (sensor_idx.to_numpy()[ok].astype(int), day_idx.to_numpy()[ok], local.dt.hour.to_numpy()[ok])
+    np.add.at(sums, coords, values[ok])           # DST fall-back: the doubled hour is averaged
+    np.add.at(counts, coords, 1)
+    with np.errstate(invalid="ignore"):
+        return sums / counts
+
+
+def load_cube(sensor_ids, first_day, last_day, metric=METRIC, router=None):
+    """Cube for local days [first_day, last_day] from the cheapest complete source."""
+    n_days = (last_day - first_day).days + 1
+    router = router or default_router(verbose=False)
+    with metrics.timer("query"):
+        df = router.read(sensor_ids, local_midnight_utc(first_day),
+                         local_midnight_utc(last_day + datetime.timedelta(days=1)), "1h")
+    return build_cube(df, sensor_ids, first_day, n_days, metric)
+
+
+def weekday_baseline(cube, weekdays):
+    """Mean and std per (sensor, weekday, hour); NaN below MIN_BASELINE samples."""
+    shape = (cube.shape[0], 7, 24)
+    valid = ~np.isnan(cube)
+    x = np.where(valid, cube, 0.0)
+    n, s, ss = np.zeros(shape), np.zeros(shape), np.zeros(shape)
+    for w in range(7):                            # 7 slices, each vectorized over sensors/days/hours
+        days = weekdays == w
+        n[:, w] = valid[:, days].sum(axis=1)
+        s[:, w] = x[:, days].sum(axis=1)
+        ss[:, w] = (x[:, days] ** 2).sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = s / n
+        std = np.sqrt(np.maximum(ss - n * mean ** 2, 0) / (n - 1))
+    enough = n >= MIN_BASELINE
+    return np.where(enough, mean, np.nan), np.where(enough & (std > 0), std, np.nan)
+
+
+def correlation_matrix(series):
+    """Pairwise Pearson of rows over their common non-NaN columns -> (corr, overlap)."""
+    valid = (~np.isnan(series)).astype(float)
+    x = np.where(valid > 0, series, 0.0)
+    n = valid @ valid.T
+    sx = x @ valid.T                              # sum of row i over hours where j is valid too
+    sxx = (x ** 2) @ valid.T
+    sxy = x @ x.T
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mx, my = sx / n, sx.T / n
+        cov = sxy / n - mx * my
+        var_x = sxx / n - mx ** 2
+        var_y = sxx.T / n - my ** 2
+        corr = cov / np.sqrt(var_x * var_y)
+    corr[n < MIN_OVERLAP_HOURS] = np.nan
+    return np.clip(corr, -1, 1), n.astype(int)
+
+
+def hourly_ranks(cube):
+    """rank[sensor, day, hour]: 1 = loudest sensor that hour, NaN where no data."""
+    order = np.argsort(np.where(np.isnan(cube), np.inf, -cube), axis=0, kind="stable")
+    ranks = np.empty_like(order)
+    np.put_along_axis(ranks, order, np.arange(1, cube.shape[0] + 1)[:, None, None], axis=0)
+    return np.where(np.isnan(cube), np.nan, ranks)
+
+
+def hour_thresholds():
+    return np.array([threshold for _, threshold in PERIODS], dtype=float)
+
+
+def _runs(mask):
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+
+def exceedance_clusters(cube, sensor_ids, first_day):
+    """Runs of hours where >= CLUSTER_MIN_SENSORS sensors exceed their hour's norm."""
+    excess = cube - hour_thresholds()
+    above = np.nan_to_num(excess, nan=-np.inf) > 0
+    flat_above = above.reshape(len(sensor_ids), -1)          # sensor x (day*24 + hour)
+    flat_excess = excess.reshape(len(sensor_ids), -1)
+    count = flat_above.sum(axis=0)
+    clusters = []
+    for start, end in zip(*_runs(count >= CLUSTER_MIN_SENSORS)):
+        members = flat_above[:, start:end].any(axis=1)
+        clusters.append({
+            "start": _slot_time(first_day, start),
+            "hours": int(end - start),
+            "peak_sensors": int(count[start:end].max()),
+            "sensors": [str(s) for s, m in zip(sensor_ids, members) if m],
+            "max_excess": round(float(np.nanmax(flat_excess[:, start:end])), 1),
+        })
+    return clusters
+
+
+def _slot_time(first_day, slot):
+    day, hour = divmod(int(slot), 24)
+    return f"{first_day + datetime.timedelta(days=day)}T{hour:02d}:00"
+
+
+def _rounded(array, digits):
+    return [[None if np.isnan(v) else round(float(v), digits) for v in row] for row in np.atleast_2d(array)]
+
+
+def analyze(cube, sensor_ids, first_day, analysis_start):
+    """All cross-sensor results for days from analysis_start (earlier days only feed the baselines)."""
+    weekdays = np.array([(first_day + datetime.timedelta(days=d)).weekday() for d in range(cube.shape[1])])
+    offset = (analysis_start - first_day).days
+    mean, std = weekday_baseline(cube[:, :offset], weekdays[:offset])   # history only: an outlier
+    window, window_days = cube[:, offset:], weekdays[offset:]            # cannot mask itself
+    deviation = window - mean[:, window_days]
+    z = deviation / std[:, window_days]
+    n_sensors = len(sensor_ids)
+
+    corr_levels, overlap = correlation_matrix(window.reshape(n_sensors, -1))
+    corr_anomalies, _ = correlation_matrix(deviation.reshape(n_sensors, -1))
+
+    ranks = hourly_ranks(window)
+    with np.errstate(invalid="ignore"):
+        rank_mean = np.nanmean(ranks.reshape(n_sensors, -1), axis=1)
+        rank_by_hour = np.nanmean(ranks, axis=1)
+        loudest = np.nansum(ranks == 1, axis=(1, 2)) / np.maximum((~np.isnan(ranks)).sum(axis=(1, 2)), 1)
+
+    # Anomalies with their spread: how many sensors were anomalous in the same hour
+    high = np.nan_to_num(np.abs(z), nan=0) >= Z_THRESHOLD
+    reporting = (~np.isnan(z)).sum(axis=0)
+    spread = np.where(reporting > 0, high.sum(axis=0) / np.maximum(reporting, 1), 0.0)
+    s_idx, d_idx, h_idx = np.nonzero(high)
+    order = np.argsort(-np.abs(z[s_idx, d_idx, h_idx]))[:MAX_ANOMALIES]
+    anomalies = [{
+        "sensor": str(sensor_ids[s]),
+        "time": _slot_time(analysis_start, d * 24 + h),
+        "level": round(float(window[s, d, h]), 1),
+        "z": round(float(z[s, d, h]), 2),
+        "spread": round(float(spread[d, h]), 2),
+        "scope": "central" if spread[d, h] >= CENTRAL_SHARE else "local",
+    } for s, d, h in zip(s_idx[order], d_idx[order], h_idx[order])]
+
+    return {
+        "coverage": [round(float(c), 3) for c in (~np.isnan(window)).mean(axis=(1, 2))],
+        "correlation": {
+            "levels": _rounded(corr_levels, 3),
+            "anomalies": _rounded(corr_anomalies, 3),
+            "overlap_hours": overlap.tolist(),
+        },
+        "ranking": {
+            "mean": _rounded(rank_mean, 2)[0],
+            "loudest_share": [round(float(v), 3) for v in loudest],
+            "by_hour": _rounded(rank_by_hour, 2),
+        },
+        "anomalies": anomalies,
+        "clusters": exceedance_clusters(window, sensor_ids, analysis_start),
+    }
+
+
+def load_locations(sensor_ids, path=LOCATIONS_FILE):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        raw = json.load(f)
+    return {str(s): [float(raw[str(s)]["lat"]), float(raw[str(s)]["lon"])]
+            for s in sensor_ids if str(s) in raw}
+
+
+def run(sensor_ids, start, end, out_path=OUTPUT_PATH, router=None, metric=METRIC):
+    first_day = start - datetime.timedelta(weeks=BASELINE_WEEKS)
+    cube = load_cube(sensor_ids, first_day, end, metric, router)
+    with metrics.timer("aggregate"):
+        result = analyze(cube, sensor_ids, first_day, start)
+    payload = {
+        "generated": datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "start": str(start), "end": str(end), "timezone": TIMEZONE, "metric": metric,
+        "sensors": [str(s) for s in sensor_ids],
+        "locations": load_locations(sensor_ids),
+        **result,
+    }
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    with open(out_path, "w") as f:
+        json.dump(payload, f, separators=(",", ":"))
+    return payload
+
+
+# ===== MAIN =====
+if __name__ == "__main__":
+    yesterday = datetime.date.today() - datetime.timedelta(days=1)
+    parser = argparse.ArgumentParser(description="Cross-sensor correlations, rankings, anomalies and clusters")
+    parser.add_argument("--start", type=datetime.date.fromisoformat,
+                        default=yesterday - datetime.timedelta(days=6))
+    parser.add_argument("--end", type=datetime.date.fromisoformat, default=yesterday, help="inclusive")
+    parser.add_argument("--sensors", help="comma separated ids (default: live sensors)")
+    parser.add_argument("--metric", default=METRIC, choices=["LAeq", "LAmin", "LAmax"])
+    parser.add_argument("--out", default=OUTPUT_PATH)
+    args = parser.parse_args()
+
+    sensor_ids = [int(s) for s in args.sensors.split(",")] if args.sensors else \
+        sensor_registry.live_sensors(sensor_registry.load_state())
+    print(f"🚀 Cross-sensor analysis of {len(sensor_ids)} sensors, {args.start} → {args.end}", flush=True)
+    payload = run(sensor_ids, args.start, args.end, args.out, metric=args.metric)
+    central = sum(1 for a in payload["anomalies"] if a["scope"] == "central")
+    print(f"📊 {len(payload['anomalies'])} anomalous hours ({central} central), "
+          f"{len(payload['clusters'])} exceedance clusters", flush=True)
+    print(f"✅ Saved {args.out}")
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""Per sensor-day data quality, checked at ingest in one vectorized pass.
+
+Every ingested archive day is checked for
+
+    impossible   levels outside MIN_LEVEL..MAX_LEVEL dB(A), or LAmin > LAeq
+                 or LAeq > LAmax (beyond ORDER_TOLERANCE)
+    stuck        runs of >= STUCK_RUN consecutive samples with identical
+                 LAeq/LAmin/LAmax (frozen firmware or microphone)
+    clock        timestamps going backwards, duplicated, or outside the day
+    gaps         silences longer than GAP_SECONDS, including from midnight
+                 to the first sample and from the last one to midnight
+
+and one summary row per (sensor, day) is kept in a small SQLite table
+with `ok = 0` and the failed checks in `flags` when the day should not be
+trusted. Reports drop those days via `bad_days` / `exclude_bad_days`
+without ever scanning raw points.
+
+Usage:
+    python data_quality.py extract archive_dir/ [more files or dirs]
+    python data_quality.py report 2025-07-01 2025-09-30 [--sensor 94695] [--bad]
+
+Set DATA_QUALITY_DB=path to check every ingested sensor-day.
+"""
+import os
+import csv
+import glob
+import sqlite3
+import argparse
+import datetime
+import numpy as np
+import pandas as pd
+
+# ===== SETTINGS =====
+DB_PATH = os.getenv("DATA_QUALITY_DB", "data_quality.sqlite")
+LEVEL_COLUMNS = ["noise_LAeq", "noise_LA_min", "noise_LA_max"]
+
+MIN_LEVEL = 20.0         # dB(A); below the microphone noise floor
+MAX_LEVEL = 140.0        # dB(A); above the pain threshold
+ORDER_TOLERANCE = 0.5    # dB slack for LAmin <= LAeq <= LAmax
+STUCK_RUN = 12           # identical samples in a row (~30 min at 145 s)
+GAP_SECONDS = 15 * 60
+
+MIN_COVERAGE = 0.8       # share of the day not inside a gap
+MAX_IMPOSSIBLE = 0.01    # share of samples
+MAX_STUCK = 0.1
+MAX_CLOCK = 0.01
+
+EPOCH = pd.Timestamp(0, tz="UTC")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS day_quality (
+    sensor_id    INTEGER NOT NULL,
+    day          TEXT    NOT NULL,   -- ingested archive day (UTC file day)
+    rows         INTEGER NOT NULL,
+    valid        INTEGER NOT NULL,   -- parseable timestamp and at least one level
+    impossible   INTEGER NOT NULL,
+    stuck        INTEGER NOT NULL,   -- samples inside stuck runs
+    clock_jumps  INTEGER NOT NULL,
+    gaps         INTEGER NOT NULL,
+    gap_minutes  REAL    NOT NULL,
+    longest_gap  REAL    NOT NULL,   -- minutes
+    coverage     REAL    NOT NULL,
+    flags        TEXT    NOT NULL,   -- comma separated failed checks
+    ok           INTEGER NOT NULL,
+    PRIMARY KEY (sensor_id, day)
+);
+CREATE INDEX IF NOT EXISTS day_quality_day ON day_quality (day, ok);
+"""
+FIELDS = ["rows", "valid", "impossible", "stuck", "clock_jumps", "gaps", "gap_minutes",
+          "longest_gap", "coverage", "flags", "ok"]
+
+
+# ===== FUNCTIONS =====
+def connect(path=DB_PATH):
+    conn = sqlite3.connect(path, timeout=30)
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def rows_to_arrays(rows):
+    """Archive CSV rows -> (seconds since epoch, NaN for bad stamps; levels n x 3), file order."""
+    frame = pd.DataFrame(rows, columns=["timestamp", *LEVEL_COLUMNS])
+    ts = pd.to_datetime(frame["timestamp"], errors="coerce", utc=True)
+    seconds = ((ts - EPOCH) / pd.Timedelta(seconds=1)).to_numpy(dtype=float)
+    levels = frame[LEVEL_COLUMNS].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float)
+    return seconds, levels
+
+
+def _run_lengths(mask):
+    """Lengths of the runs of True in a boolean array."""
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    return np.flatnonzero(edges == -1) - np.flatnonzero(edges == 1)
+
+
+def check_day(day, seconds, levels):
+    """Quality summary of one sensor-day (dict with FIELDS)."""
+    day_start = (pd.Timestamp(day, tz="UTC") - EPOCH) / pd.Timedelta(seconds=1)
+    day_end = day_start + 86400
+    n = len(seconds)
+    has_time = ~np.isnan(seconds)
+    finite = np.isfinite(levels)
+    valid = has_time & finite.any(axis=1)
+
+    # Impossible: out of range, or the LAmin <= LAeq <= LAmax order broken
+    with np.errstate(invalid="ignore"):
+        out_of_range = (finite & ((levels < MIN_LEVEL) | (levels > MAX_LEVEL))).any(axis=1)
+        laeq, lamin, lamax = levels[:, 0], levels[:, 1], levels[:, 2]
+        disorder = (lamin > laeq + ORDER_TOLERANCE) | (laeq > lamax + ORDER_TOLERANCE)
+    impossible = int((valid & (out_of_range | disorder)).sum())
+
+    # Stuck: consecutive valid samples repeating all three levels exactly
+    v = levels[valid]
+    same = (v[1:] == v[:-1]).all(axis=1) if len(v) > 1 else np.zeros(0, bool)
+    runs = _run_lengths(same) + 1                 # n equal steps = n + 1 samples
+    stuck = int(runs[runs >= STUCK_RUN].sum())
+
+    # Clock: steps backwards, duplicate stamps, stamps outside the file's day
+    t = seconds[has_time]
+    step = np.diff(t)
+    outside = (t < day_start) | (t >= day_end)
+    clock_jumps = int((step < 0).sum() + (step == 0).sum() + outside.sum())
+
+    # Gaps over the day, counting the edges from and to midnight
+    inside = np.unique(t[~outside])
+    spans = np.diff(np.concatenate(([day_start], inside, [day_end])))
+    gap = spans > GAP_SECONDS
+    gap_seconds = float(spans[gap].sum())
+    coverage = 1.0 - gap_seconds / 86400 if inside.size else 0.0
+
+    flags = []
+    if coverage < MIN_COVERAGE:
+        flags.append("coverage")
+    if n and impossible / n > MAX_IMPOSSIBLE:
+        flags.append("impossible")
+    if n and stuck / n > MAX_STUCK:
+        flags.append("stuck")
+    if n and clock_jumps / n > MAX_CLOCK:
+        flags.append("clock")
+    return {
+        "rows": n,
+        "valid": int(valid.sum()),
+        "impossible": impossible,
+        "stuck": stuck,
+        "clock_jumps": clock_jumps,
+        "gaps": int(gap.sum()),
+        "gap_minutes": round(gap_seconds / 60, 1),
+        "longest_gap": round(float(spans.max()) / 60, 1) if spans.size else 1440.0,
+        "coverage": round(coverage, 4),
+        "flags": ",".join(flags),
+        "ok": int(not flags),
+    }
+
+
+def store_quality(conn, sensor_id, day, summary):
+    conn.execute(
+        f"INSERT OR REPLACE INTO day_quality (sensor_id, day, {', '.join(FIELDS)}) "
+        f"VALUES (?, ?, {', '.join('?' * len(FIELDS))})",
+        [int(sensor_id), str(day)] + [summary[f] for f in FIELDS]
+    )
+    conn.commit()
+
+
+def check_rows(conn, sensor_id, day, rows):
+    summary = check_day(str(day), *rows_to_arrays(rows))
+    store_quality(conn, sensor_id, day, summary)
+    return summary
+
+
+def attach_to_ingest(path=DB_PATH):
+    """Check every sensor-day written by noise_ingest."""
+    import noise_ingest
+    import pipeline_metrics as metrics
+    conn = connect(path)
+
+    def data_quality_hook(sensor_id, day, rows):
+        summary = check_rows(conn, sensor_id, str(day), rows)
+        if not summary["ok"]:
+            metrics.inc("quality_bad_days_total", sensor=sensor_id)
+            print(f"⚠️ Quality {sensor_id} {day}: {summary['flags']}", flush=True)
+
+    noise_ingest.register_hook(data_quality_hook)
+    return conn
+
+
+def quality(conn, start, end, sensor_id=None, bad_only=False):
+    """[{sensor_id, day, FIELDS...}] for days in [start, end]."""
+    query = f"SELECT sensor_id, day, {', '.join(FIELDS)} FROM day_quality WHERE day BETWEEN ? AND ?"
+    params = [str(start), str(end)]
+    if sensor_id is not None:
+        query += " AND sensor_id = ?"
+        params.append(int(sensor_id))
+    if bad_only:
+        query += " AND ok = 0"
+    columns = ["sensor_id", "day"] + FIELDS
+    return [dict(zip(columns, row)) for row in conn.execute(query + " ORDER BY day, sensor_id", params)]
+
+
+def bad_days(start, end, path=DB_PATH):
+    """{(sensor_id as str, 'YYYY-MM-DD')} flagged in [start, end]; empty without a database."""
+    if not os.path.exists(path):
+        return set()
+    conn = connect(path)
+    try:
+        return {(str(r["sensor_id"]), r["day"]) for r in quality(conn, start, end, bad_only=True)}
+    finally:
+        conn.close()
+
+
+def exclude_bad_days(df, bad):
+    """Drop rows of a data_sources batch that fall on a flagged (sensor, UTC day)."""
+    if not bad or df.empty:
+        return df
+    keys = df["sensor_id"].astype(str) + "|" + df["timestamp"].dt.strftime("%Y-%m-%d")
+    return df[~keys.isin({f"{s}|{d}" for s, d in bad})]
+
+
+def _csv_paths(inputs):
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            paths.extend(glob.glob(os.path.join(item, "**", "*.csv"), recursive=True))
+        else:
+            paths.append(item)
+    return sorted(paths)
+
+
+# ===== MAIN =====
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per sensor-day data quality")
+    parser.add_argument("--db", default=DB_PATH)
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_extract = sub.add_parser("extract", help="check archive day CSVs")
+    p_extract.add_argument("inputs", nargs="+")
+    p_report = sub.add_parser("report", help="quality per sensor and day")
+    p_report.add_argument("start")
+    p_report.add_argument("end", nargs="?", default=str(datetime.date.today()))
+    p_report.add_argument("--sensor", type=int)
+    p_report.add_argument("--bad", action="store_true", help="only days that failed a check")
+    args = parser.parse_args()
+
+    conn = connect(args.db)
+    if args.command == "extract":
+        checked = bad = 0
+        for path in _csv_paths(args.inputs):
+            name = os.path.splitext(os.path.basename(path))[0]
+            day, sensor_id = name[:10], name.rsplit("_", 1)[-1]
+            with open(path, newline="") as f:
+                summary = check_rows(conn, sensor_id, day, list(csv.DictReader(f, delimiter=";")))
+            checked += 1
+            bad += not summary["ok"]
+        print(f"✅ {checked} sensor-days checked, {bad} flagged, in {args.db}")
+    else:
+        rows = quality(conn, args.start, args.end, args.sensor, args.bad)
+        for r in rows:
+            status = "✅" if r["ok"] else f"❌ {r['flags']}"
+            print(f"{r['sensor_id']} {r['day']}: {r['valid']}/{r['rows']} valid, "
+                  f"coverage {r['coverage']:.0%}, {r['gaps']} gaps ({r['gap_minutes']:.0f} min), "
+                  f"{r['impossible']} impossible, {r['stuck']} stuck, {r['clock_jumps']} clock  {status}")
+        print(f"📊 {sum(1 for r in rows if not r['ok'])} of {len(rows)} sensor-days flagged "
+              f"in {args.start} → {args.end}")
@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+"""One way to read sensor data, whatever the backend.
+
+Every source returns the same columnar batch: a DataFrame with
+
+    timestamp (UTC, tz-aware) | sensor_id (str) | LAeq | LAmin | LAmax
+
+for [start, end) at resolution "raw" (every archive sample) or "1h"
+(hourly means, as aggregateWindow(every: 1h, fn: mean)).
+
+Sources, cheapest first:
+
+    cube      hourly_cube memmap (1h only)
+    influx    one Flux query for all requested sensors
+    archive   archive.sensor.community day CSVs, one request per sensor-day
+
+DataRouter asks each source in cost order for the sensors that are still
+missing. A sensor counts as served once a source returns data for at
+least MIN_COVERAGE of the hours in the range (up to now); sensors a
+source covers only partly -- a half-ingested Influx range -- fall through
+to the next source, and if none covers them the most complete partial
+batch is used. Gaps on days ingest_log has as written are downtime, not
+missing ingest: Influx's partial batch is final there and the archive is
+not asked. So a report works offline from the cube, from Influx, or
+straight from the archive without code changes.
+
+Usage:
+    from data_sources import default_router
+    df = default_router().read([94695, 89747], "2025-07-07", "2025-07-14", "1h")
+"""
+import io
+import os
+import datetime
+import numpy as np
+import pandas as pd
+import requests
+from concurrent.futures import ThreadPoolExecutor
+import ingest_log
+import pipeline_metrics as metrics
+
+# ===== SETTINGS =====
+INFLUX_URL = os.getenv("INFLUX_URL")
+INFLUX_TOKEN = os.getenv("INFLUX_TOKEN")
+INFLUX_ORG = os.getenv("INFLUX_ORG")
+INFLUX_BUCKET = os.getenv("INFLUX_BUCKET", "noise_data")
+
+COLUMNS = ["timestamp", "sensor_id", "LAeq", "LAmin", "LAmax"]
+RESOLUTIONS = ("raw", "1h")
+MIN_COVERAGE = 0.9         # fraction of hours a source must hold for a sensor
+ARCHIVE_WORKERS = 8        # concurrent archive day downloads
+
+ARCHIVE_COLUMNS = {"noise_LAeq": "LAeq", "noise_LA_min": "LAmin", "noise_LA_max": "LAmax"}
+
+
+# ===== FUNCTIONS =====
+def empty_frame():
+    return pd.DataFrame({c: pd.Series(dtype="float64") for c in COLUMNS}).astype(
+        {"timestamp": "datetime64[ns, UTC]", "sensor_id": "object"})
+
+
+def _timestamp(value):
+    ts = pd.Timestamp(value)
+    return ts.tz_localize("UTC") if ts.tzinfo is None else ts.tz_convert("UTC")
+
+
+def expected_hours(start, end):
+    """Hours of [start, end) that can have data by now."""
+    stop = min(end, pd.Timestamp.now(tz="UTC").ceil("h"))
+    return max(int(np.ceil((stop - start) / pd.Timedelta(hours=1))), 0)
+
+
+def coverage(df, start, end):
+    """{sensor_id: share of expected hours with at least one level} for a batch."""
+    hours = expected_hours(start, end)
+    if df.empty or not hours:
+        return {}
+    present = df[df[["LAeq", "LAmin", "LAmax"]].notna().any(axis=1)]
+    counts = present.assign(hour=present["timestamp"].dt.floor("h")) \
+        .drop_duplicates(["sensor_id", "hour"]).groupby("sensor_id").size()
+    return {str(s): min(n / hours, 1.0) for s, n in counts.items()}
+
+
+def to_hourly(df):
+    """Hourly means per sensor, hours stamped at their start."""
+    if df.empty:
+        return df
+    hourly = df.assign(timestamp=df["timestamp"].dt.floor("h")) \
+        .groupby(["sensor_id", "timestamp"], as_index=False)[["LAeq", "LAmin", "LAmax"]].mean()
+    return hourly[COLUMNS]
+
+
+class DataSource:
+    """Base class: `read` returns a batch in COLUMNS layout, possibly partial."""
+    name = "source"
+    cost = 0
+    resolutions = RESOLUTIONS
+
+    def available(self):
+        return True
+
+    def complete_sensors(self, sensor_ids, start, end, resolution):
+        """Sensors this source can serve completely without reading (None = unknown)."""
+        return None
+
+    def settled(self, start, end):
+        """True when no costlier source can hold more of [start, end) than this one."""
+        return False
+
+    def read(self, sensor_ids, start, end, resolution):
+        raise NotImplementedError
+
+
+class CubeSource(DataSource):
+    name = "cube"
+    cost = 1
+    resolutions = ("1h",)
+
+    def __init__(self, path=None, min_coverage=MIN_COVERAGE):
+        import hourly_cube
+        self.path = path or hourly_cube.CUBE_DIR
+        self.min_coverage = min_coverage
+
+    def available(self):
+        return os.path.exists(os.path.join(self.path, "index.json"))
+
+    def _reader(self):
+        import hourly_cube
+        return hourly_cube.open_reader(self.path)
+
+    def complete_sensors(self, sensor_ids, start, end, resolution):
+        cube = self._reader().window(sensor_ids, start, end)
+        coverage = (~np.isnan(cube[..., 0])).mean(axis=1) if cube.shape[1] else np.zeros(len(sensor_ids))
+        return [s for s, c in zip(sensor_ids, coverage) if c >= self.min_coverage]
+
+    def read(self, sensor_ids, start, end, resolution):
+        with metrics.timer("query", source=self.name):
+            df = self._reader().frame(sensor_ids, start, end)
+        return df.astype({"LAeq": float, "LAmin": float, "LAmax": float})[COLUMNS]
+
+
+class InfluxSource(DataSource):
+    name = "influx"
+    cost = 10
+
+    def available(self):
+        return bool(INFLUX_URL and INFLUX_TOKEN)
+
+    def settled(self, start, end):
+        # Influx is written from the archive: for days already ingested, a
+        # gap in Influx is a gap in the archive too (sensor downtime).
+        written = ingest_log.writes()
+        day, today = start.date(), pd.Timestamp.now(tz="UTC").date()
+        while day < today and pd.Timestamp(day, tz="UTC") < end:
+            if day.isoformat() not in written:
+                return False
+            day += datetime.timedelta(days=1)
+        return True
+
+    def query(self, sensor_ids, start, end, resolution):
+        id_set = ", ".join(f'"{s}"' for s in sensor_ids)
+        window = '\n  |> aggregateWindow(every: 1h, fn: mean, createEmpty: false, timeSrc: "_start")' \
+            if resolution == "1h" else ""
+        return f'''
+from(bucket: "{INFLUX_BUCKET}")
+  |> range(start: {start.strftime("%Y-%m-%dT%H:%M:%SZ")}, stop: {end.strftime("%Y-%m-%dT%H:%M:%SZ")})
+  |> filter(fn: (r) => r._measurement == "noise" and contains(value: r.sensor_id, set: [{id_set}]))
+  |> filter(fn: (r) => r._field == "LAeq" or r._field == "LAmin" or r._field == "LAmax"){window}
+  |> pivot(rowKey: ["_time"], columnKey: ["_field"], valueColumn: "_value")
+  |> keep(columns: ["_time", "sensor_id", "LAeq", "LAmin", "LAmax"])
+'''
+
+    def run_query(self, query):
+        from influxdb_client import InfluxDBClient
+        from query_cache import cached_query_data_frame
+        with InfluxDBClient(url=INFLUX_URL, token=INFLUX_TOKEN, org=INFLUX_ORG) as client:
+            tables = cached_query_data_frame(client.query_api(), query)
+        if isinstance(tables, list):
+            tables = pd.concat(tables) if tables else pd.DataFrame()
+        return tables
+
+    def read(self, sensor_ids, start, end, resolution):
+        with metrics.timer("query", source=self.name):
+            tables = self.run_query(self.query(sensor_ids, start, end, resolution))
+        if tables.empty:
+            return empty_frame()
+        df = tables.rename(columns={"_time": "timestamp"})
+        for column in ("LAeq", "LAmin", "LAmax"):
+            if column not in df:
+                df[column] = np.nan
+        df["timestamp"] = pd.to_datetime(df["timestamp"], utc=True)
+        df["sensor_id"] = df["sensor_id"].astype(str)
+        return df[COLUMNS].reset_index(drop=True)
+
+
+class ArchiveSource(DataSource):
+    name = "archive"
+    cost = 100
+
+    def fetch_day(self, sensor_id, day):
+        from noise_ingest import day_url
+        url = day_url(sensor_id, day)
+        try:
+            with metrics.timer("fetch", source=self.name, sensor=sensor_id, day=day):
+                r = requests.get(url, timeout=20)
+        except requests.RequestException as e:
+            print(f"⚠️ Error fetching {url}: {e}")
+            return None
+        metrics.inc("fetch_total", status=r.status_code, sensor=sensor_id, day=day)
+        if r.status_code != 200 or not r.text.strip():
+            return None
+        return r.text
+
+    def parse(self, sensor_id, text):
+        """Archive day CSV -> batch, rows as Influx stores them.
+
+        Rows without a valid timestamp are dropped, and so are rows without
+        any level (ingest writes no point for those); a missing LAmin or
+        LAmax stays NaN like the absent field in Influx.
+        """
+        df = pd.read_csv(io.StringIO(text), sep=";")
+        if not all(c in df.columns for c in ["timestamp", *ARCHIVE_COLUMNS]):
+            return None
+        df = df[["timestamp", *ARCHIVE_COLUMNS]].rename(columns=ARCHIVE_COLUMNS)
+        df["timestamp"] = pd.to_datetime(df["timestamp"], errors="coerce", utc=True)
+        for column in ARCHIVE_COLUMNS.values():
+            df[column] = pd.to_numeric(df[column], errors="coerce")
+        df["sensor_id"] = str(sensor_id)
+        df = df.dropna(subset=["timestamp", "sensor_id"])
+        return df.dropna(subset=list(ARCHIVE_COLUMNS.values()), how="all")[COLUMNS]
+
+    def read(self, sensor_ids, start, end, resolution):
+        tasks = []
+        day = start.date()
+        while pd.Timestamp(day, tz="UTC") < end:
+            tasks.extend((sensor_id, day.isoformat()) for sensor_id in sensor_ids)
+            day += datetime.timedelta(days=1)
+
+        # Downloads overlap; each day is parsed as soon as it arrives, in order
+        frames = []
+        with ThreadPoolExecutor(max_workers=ARCHIVE_WORKERS) as pool:
+            texts = pool.map(lambda task: self.fetch_day(*task), tasks)
+            for (sensor_id, day), text in zip(tasks, texts):
+                if text is not None:
+                    with metrics.timer("parse", source=self.name, sensor=sensor_id, day=day):
+                        parsed = self.parse(sensor_id, text)
+                    if parsed is not None:
+                        frames.append(parsed)
+        if not frames:
+            return empty_frame()
+        df = pd.concat(frames, ignore_index=True)
+        df = df[(df["timestamp"] >= start) & (df["timestamp"] < end)]
+        return to_hourly(df) if resolution == "1h" else df
+
+
+class DataRouter:
+    """Serve each sensor from the cheapest source that has it completely."""
+
+    def __init__(self, sources, verbose=True, min_coverage=MIN_COVERAGE):
+        self.sources = sorted(sources, key=lambda s: s.cost)
+        self.verbose = verbose
+        self.min_coverage = min_coverage
+
+    def read(self, sensor_ids, start, end, resolution="1h"):
+        if resolution not in RESOLUTIONS:
+            raise ValueError(f"resolution must be one of {RESOLUTIONS}")
+        start, end = _timestamp(start), _timestamp(end)
+        if end <= start:
+            raise ValueError(f"end {end} is not after start {start}")
+        missing = [str(s) for s in sensor_ids]
+        frames = []
+        partial = {}                       # sensor -> (coverage, rows) of the best incomplete source
+        for source in self.sources:
+            if not missing:
+                break
+            if resolution not in source.resolutions or not source.available():
+                continue
+            wanted = missing
+            try:
+                complete = source.complete_sensors(missing, start, end, resolution)
+            except Exception as e:
+                print(f"⚠️ {source.name} coverage check failed, reading all sensors: {e}", flush=True)
+                complete = None
+            if complete is not None:
+                wanted = [str(s) for s in complete]
+                if not wanted:
+                    continue
+            try:
+                df = source.read(wanted, start, end, resolution)
+            except Exception as e:
+                print(f"⚠️ {source.name} failed, falling back: {e}", flush=True)
+                continue
+            metrics.inc("rows_read_total", len(df), source=source.name, resolution=resolution)
+            covered = coverage(df, start, end)
+            served = {s for s, c in covered.items() if c >= self.min_coverage and s in missing}
+            if served:
+                frames.append(df[df["sensor_id"].isin(served)])
+                missing = [s for s in missing if s not in served]
+                if self.verbose:
+                    print(f"📡 {source.name}: {len(served)} sensors ({resolution})", flush=True)
+            for s in missing:
+                if covered.get(s, 0) > partial.get(s, (0, None))[0]:
+                    partial[s] = (covered[s], df[df["sensor_id"] == s])
+            short = [s for s in missing if s in covered]
+            if short and source.settled(start, end):
+                # Nothing costlier can fill these gaps: use what this source has
+                frames.extend(partial[s][1] for s in short)
+                missing = [s for s in missing if s not in short]
+                metrics.inc("settled_reads_total", len(short), source=source.name)
+                if self.verbose:
+                    print(f"📡 {source.name}: {len(short)} sensors with gaps in ingested days, kept as is",
+                          flush=True)
+            elif short:
+                metrics.inc("partial_reads_total", len(short), source=source.name)
+                if self.verbose:
+                    print(f"⚠️ {source.name}: {len(short)} sensors incomplete, falling through", flush=True)
+        for s in missing:
+            if s in partial:
+                frames.append(partial[s][1])
+                if self.verbose:
+                    print(f"⚠️ {s}: best coverage {partial[s][0]:.0%}, using what exists", flush=True)
+        if not frames:
+            return empty_frame()
+        return pd.concat(frames, ignore_index=True).sort_values(["sensor_id", "timestamp"], ignore_index=True)
+
+
+def default_router(verbose=True):
+    return DataRouter([CubeSource(), InfluxSource(), ArchiveSource()], verbose=verbose)
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""Pixel-bounded downsampling for time-series plots.
+
+A week of raw sensor data has tens of thousands of points per field,
+far more than the few hundred to few thousand pixel columns of a chart.
+`downsample` reduces one series to at most `n_out` points by combining:
+
+  * Largest-Triangle-Three-Buckets (LTTB), which keeps the overall shape,
+  * a min/max envelope: the lowest and highest sample of every bucket,
+    so short LAmax peaks and LAmin dips stay visible.
+
+Works on NumPy arrays. x may be numeric or datetime-like (numpy
+datetime64, pandas DatetimeIndex/Series, tz-aware or not); the selected
+x values are returned as a pandas Index or NumPy array, keeping the tz.
+
+Usage:
+    from downsample import downsample, points_for_width
+    x, y = downsample(df.index, df["LAmax"], points_for_width(11))
+"""
+import numpy as np
+import pandas as pd
+
+# ===== SETTINGS =====
+DEFAULT_DPI = 100
+POINTS_PER_PIXEL = 2     # a line needs about two points per pixel column
+
+
+# ===== FUNCTIONS =====
+def points_for_width(width_inches, dpi=DEFAULT_DPI):
+    """Point budget for a plot `width_inches` wide at `dpi`."""
+    return int(width_inches * dpi * POINTS_PER_PIXEL)
+
+
+def _as_float(x):
+    values = np.asarray(x)
+    if values.dtype.kind in "iuf":
+        return values.astype(float)
+    if values.dtype.kind == "M":
+        return values.astype("datetime64[ns]").astype(np.int64).astype(float)
+    return pd.to_datetime(x, utc=True).asi8.astype(float)
+
+
+def lttb_indices(x, y, n_out):
+    """Indices of the `n_out` points LTTB selects from (x, y), sorted, float arrays."""
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    # Bucket edges for the n - 2 inner points; first and last are always kept
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # Average of the next bucket (the last point for the final bucket)
+        nlo, nhi = hi, edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[nlo:nhi].mean()
+        avg_y = y[nlo:nhi].mean()
+        # Triangle area (x2) between the previous pick, each candidate and that average
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def envelope_indices(y, n_buckets):
+    """Indices of the minimum and maximum sample of each of `n_buckets` equal buckets."""
+    n = len(y)
+    if n_buckets >= n:
+        return np.arange(n)
+    starts = np.linspace(0, n, n_buckets + 1).astype(int)[:-1]
+    # Pad to a rectangle so argmin/argmax run once over all buckets
+    width = int(np.max(np.diff(np.append(starts, n))))
+    offsets = starts[:, None] + np.arange(width)[None, :]
+    valid = offsets < n
+    offsets = np.minimum(offsets, n - 1)
+    values = y[offsets]
+    lows = np.where(valid, values, np.inf).argmin(axis=1)
+    highs = np.where(valid, values, -np.inf).argmax(axis=1)
+    return np.concatenate((starts + lows, starts + highs))
+
+
+def downsample(x, y, n_out):
+    """Reduce (x, y) to at most `n_out` points, keeping shape and per-bucket extremes.
+
+    Half the budget goes to LTTB, half to the min/max envelope. NaNs in y
+    are dropped. Returns (x_selected, y_selected) as arrays in time order.
+    """
+    y = np.asarray(y, dtype=float)
+    x_values = pd.Index(x) if isinstance(x, (pd.Index, pd.Series)) else np.asarray(x)
+    xf = _as_float(x_values)
+    ok = ~np.isnan(y)
+    if not ok.all():
+        y, x_values, xf = y[ok], x_values[ok], xf[ok]
+    if len(y) <= n_out:
+        return x_values, y
+
+    order = np.argsort(xf, kind="stable")
+    if (order != np.arange(len(order))).any():
+        y, x_values, xf = y[order], x_values[order], xf[order]
+
+    keep = np.union1d(lttb_indices(xf, y, n_out // 2), envelope_indices(y, n_out // 4))
+    return x_values[keep], y[keep]
+
+
+def downsample_frame(df, columns, n_out):
+    """{column: (x, y)} for each column of a time-indexed DataFrame."""
+    return {c: downsample(df.index, df[c].to_numpy(dtype=float), n_out) for c in columns if c in df}
@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""Streaming exceedance detection with fixed-size per-sensor state.
+
+Readings (sensor, time, LAeq) are consumed one at a time, from ingest or
+from a replay of archive CSVs. For each sensor the engine keeps:
+
+  * a rolling Leq over the last WINDOW_MINUTES, as a ring of per-minute
+    energy bins (O(1) per reading, fixed memory),
+  * the time the rolling Leq first went above the current norm,
+  * the peak of the running exceedance.
+
+The norm comes from a 24-entry hour -> (period, threshold) table in local
+time. Once the rolling Leq has been above it for MIN_MINUTES_ABOVE an
+`exceedance_start` event is emitted, and an `exceedance_end` with the
+duration and peak when it drops back. Events go to a JSON-lines sink.
+
+State never spans a data gap of WINDOW_MINUTES or more, nor a UTC day:
+the sensor's state is closed there (an open exceedance ends at its last
+reading) and starts afresh, so replaying a sensor-day on its own gives
+the same events as replaying it in sequence. Readings older than the
+rolling window are dropped.
+
+Usage:
+    python exceedance.py replay archive_dir/ [--out reports/exceedances.jsonl]
+
+Set EXCEEDANCE_SINK=path to feed every ingested sensor-day through the
+engine during backfills (see attach_to_ingest).
+"""
+import os
+import csv
+import glob
+import json
+import math
+import time
+import atexit
+import argparse
+import datetime
+import pytz
+
+# ===== SETTINGS =====
+TIMEZONE = pytz.timezone("Europe/Amsterdam")
+SINK_PATH = os.getenv("EXCEEDANCE_SINK", os.path.join("reports", "exceedances.jsonl"))
+
+# Norms in dB(A); day/night match weekly_report.py, evening as in Lden (day - 5)
+DAY_THRESHOLD = 65
+EVENING_THRESHOLD = 60
+NIGHT_THRESHOLD = 50
+
+WINDOW_MINUTES = 15       # rolling Leq window
+MIN_MINUTES_ABOVE = 5     # minutes above the norm before an event starts
+
+
+def _period_table():
+    table = []
+    for hour in range(24):
+        if 7 <= hour < 19:
+            table.append(("day", DAY_THRESHOLD))
+        elif 19 <= hour < 23:
+            table.append(("evening", EVENING_THRESHOLD))
+        else:
+            table.append(("night", NIGHT_THRESHOLD))
+    return table
+
+
+PERIODS = _period_table()
+
+
+# ===== FUNCTIONS =====
+def _event_key(event):
+    return event.get("type"), event.get("sensor_id"), event.get("time")
+
+
+class JsonlSink:
+    """Append events as JSON lines to a local file, skipping events it already holds.
+
+    Re-ingesting a sensor-day (a retried queue task, an overlapping
+    backfill) replays the same events; they are keyed on (type, sensor,
+    time) so the file keeps one copy.
+    """
+
+    def __init__(self, path=SINK_PATH):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.seen = set()
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    try:
+                        self.seen.add(_event_key(json.loads(line)))
+                    except ValueError:
+                        continue
+        self._f = open(path, "a")
+        self.count = 0
+        self.skipped = 0
+
+    def write(self, event):
+        key = _event_key(event)
+        if key in self.seen:
+            self.skipped += 1
+            return
+        self.seen.add(key)
+        self._f.write(json.dumps(event, separators=(",", ":")) + "\n")
+        self.count += 1
+
+    def close(self):
+        self._f.close()
+
+
+class SensorState:
+    __slots__ = ("bin_minute", "bin_energy", "bin_count", "energy", "count",
+                 "last_minute", "above_since", "peak", "in_event", "day", "last_ts", "last_leq")
+
+    def __init__(self, day=None):
+        self.bin_minute = [-1] * WINDOW_MINUTES
+        self.bin_energy = [0.0] * WINDOW_MINUTES
+        self.bin_count = [0] * WINDOW_MINUTES
+        self.energy = 0.0
+        self.count = 0
+        self.last_minute = None
+        self.above_since = None
+        self.peak = 0.0
+        self.in_event = False
+        self.day = day
+        self.last_ts = None
+        self.last_leq = None
+
+    def _clear(self, slot):
+        self.energy -= self.bin_energy[slot]
+        self.count -= self.bin_count[slot]
+        self.bin_energy[slot] = 0.0
+        self.bin_count[slot] = 0
+
+    def add(self, minute, energy):
+        """Add one reading's energy and return the rolling Leq in dB."""
+        last = self.last_minute
+        if last is not None and minute > last:
+            # Drop bins that fell out of the window, at most WINDOW_MINUTES
+            for m in range(max(last + 1, minute - WINDOW_MINUTES + 1), minute):
+                self._clear(m % WINDOW_MINUTES)
+        if last is None or minute > last:
+            self.last_minute = minute
+        slot = minute % WINDOW_MINUTES
+        if self.bin_minute[slot] != minute:
+            self._clear(slot)
+            self.bin_minute[slot] = minute
+        self.bin_energy[slot] += energy
+        self.bin_count[slot] += 1
+        self.energy += energy
+        self.count += 1
+        return 10.0 * math.log10(self.energy / self.count)
+
+
+class ExceedanceEngine:
+    def __init__(self, sink):
+        self.sink = sink
+        self.states = {}
+        self._local_hours = {}
+
+    def _period(self, ts):
+        utc_hour = int(ts // 3600)
+        local = self._local_hours.get(utc_hour)
+        if local is None:
+            if len(self._local_hours) > 100000:
+                self._local_hours.clear()
+            local = datetime.datetime.fromtimestamp(utc_hour * 3600, TIMEZONE).hour
+            self._local_hours[utc_hour] = local
+        return PERIODS[local]
+
+    def update(self, sensor_id, ts, laeq):
+        """Feed one reading (`ts` = UTC epoch seconds). Returns an event or None."""
+        minute, day = int(ts // 60), int(ts // 86400)
+        state = self.states.get(sensor_id)
+        closed = None
+        if state is not None:
+            if day != state.day or minute - state.last_minute >= WINDOW_MINUTES:
+                closed = self.close(sensor_id)
+                state = None
+            elif minute <= state.last_minute - WINDOW_MINUTES:
+                return None                       # older than the window: its bin is gone
+        if state is None:
+            state = self.states[sensor_id] = SensorState(day)
+        leq = state.add(minute, 10.0 ** (laeq / 10.0))
+        if state.last_ts is None or ts > state.last_ts:
+            state.last_ts, state.last_leq = ts, leq
+        return self._check(sensor_id, state, ts, leq) or closed
+
+    def close(self, sensor_id):
+        """Forget a sensor's state; an open exceedance ends at its last reading."""
+        state = self.states.pop(sensor_id, None)
+        if state is None or not state.in_event:
+            return None
+        period, threshold = self._period(state.last_ts)
+        event = self._emit("exceedance_end", sensor_id, state.last_ts, period, threshold,
+                           state.last_leq, state)
+        event["duration_min"] = round((state.last_ts - state.above_since) / 60, 1)
+        return event
+
+    def _check(self, sensor_id, state, ts, leq):
+        period, threshold = self._period(ts)
+
+        if leq > threshold:
+            if state.above_since is None:
+                state.above_since = ts
+                state.peak = leq
+            elif leq > state.peak:
+                state.peak = leq
+            if not state.in_event and ts - state.above_since >= MIN_MINUTES_ABOVE * 60:
+                state.in_event = True
+                return self._emit("exceedance_start", sensor_id, state.above_since, period,
+                                  threshold, leq, state)
+            return None
+
+        event = None
+        if state.in_event:
+            event = self._emit("exceedance_end", sensor_id, ts, period, threshold, leq, state)
+            event["duration_min"] = round((ts - state.above_since) / 60, 1)
+            state.in_event = False
+        state.above_since = None
+        return event
+
+    def _emit(self, kind, sensor_id, ts, period, threshold, leq, state):
+        event = {
+            "type": kind,
+            "sensor_id": str(sensor_id),
+            "time": datetime.datetime.fromtimestamp(ts, pytz.utc).isoformat(),
+            "period": period,
+            "threshold": threshold,
+            "leq": round(leq, 1),
+            "peak_leq": round(state.peak, 1),
+        }
+        self.sink.write(event)
+        return event
+
+    def feed_rows(self, sensor_id, rows):
+        """Feed archive CSV rows (dicts) of one sensor-day in time order, then close it."""
+        for row in rows:
+            value = row.get("noise_LAeq")
+            if not value:
+                continue
+            try:
+                ts = datetime.datetime.fromisoformat(row["timestamp"])
+                laeq = float(value)
+            except (KeyError, ValueError):
+                continue
+            if ts.tzinfo is None:
+                ts = ts.replace(tzinfo=pytz.utc)
+            self.update(sensor_id, ts.timestamp(), laeq)
+        self.close(sensor_id)
+
+
+def attach_to_ingest(path=SINK_PATH):
+    """Run every sensor-day written by noise_ingest through a shared engine."""
+    import noise_ingest
+    engine = ExceedanceEngine(JsonlSink(path))
+    atexit.register(engine.sink.close)
+
+    def exceedance_hook(sensor_id, day, rows):
+        engine.feed_rows(sensor_id, rows)
+
+    noise_ingest.register_hook(exceedance_hook)
+    return engine
+
+
+def replay_files(paths, engine):
+    """Replay archive day CSVs (…_laerm_sensor_<id>.csv) in day order."""
+    epoch = datetime.datetime(1970, 1, 1)
+    update = engine.update
+    for path in sorted(paths, key=os.path.basename):
+        sensor_id = os.path.splitext(os.path.basename(path))[0].rsplit("_", 1)[-1]
+        with open(path, newline="") as f:
+            reader = csv.reader(f, delimiter=";")
+            header = next(reader, None)
+            if not header or "noise_LAeq" not in header:
+                continue
+            ts_col = header.index("timestamp")
+            leq_col = header.index("noise_LAeq")
+            for fields in reader:
+                try:
+                    ts = (datetime.datetime.fromisoformat(fields[ts_col]) - epoch).total_seconds()
+                    laeq = float(fields[leq_col])
+                except (IndexError, ValueError):
+                    continue
+                update(sensor_id, ts, laeq)
+        engine.close(sensor_id)
+
+
+# ===== MAIN =====
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Streaming exceedance detection")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_replay = sub.add_parser("replay", help="replay archive CSV files or directories")
+    p_replay.add_argument("inputs", nargs="+")
+    p_replay.add_argument("--out", default=SINK_PATH)
+    args = parser.parse_args()
+
+    paths = []
+    for item in args.inputs:
+        if os.path.isdir(item):
+            paths.extend(glob.glob(os.path.join(item, "**", "*.csv"), recursive=True))
+        else:
+            paths.append(item)
+
+    sink = JsonlSink(args.out)
+    engine = ExceedanceEngine(sink)
+    started = time.perf_counter()
+    replay_files(paths, engine)
+    sink.close()
+    print(f"✅ {len(paths)} files replayed in {time.perf_counter() - started:.1f}s, "
+          f"{sink.count} events written to {args.out}")
@@ -1,20 +1,14 @@
-import os
 import requests
 import csv
 import io
 import datetime
 import time
 from collections import defaultdict
-from influxdb_client import InfluxDBClient, Point, WriteOptions
+from noise_ingest import day_url, ingest_rows, install_hooks
 
 # ===== SETTINGS =====
 SENSOR_ID = 94695
 
-INFLUX_URL = os.getenv("INFLUX_URL")
-INFLUX_TOKEN = os.getenv("INFLUX_TOKEN")
-INFLUX_ORG = os.getenv("INFLUX_ORG")
-INFLUX_BUCKET = os.getenv("INFLUX_BUCKET", "noise_data")
-
 # Third trimester 2025
 START_DATE = datetime.date(2025, 7, 1)
 END_DATE = datetime.date(2025, 9, 30)
@@ -22,7 +16,7 @@ END_DATE = datetime.date(2025, 9, 30)
 # ===== FUNCTIONS =====
 def fetch_and_push(sensor_id, day: datetime.date):
     day_str = day.strftime("%Y-%m-%d")
-    url = f"https://archive.sensor.community/{day_str}/{day_str}_laerm_sensor_{sensor_id}.csv"
+    url = day_url(sensor_id, day_str)
     print(f"Fetching {url} ...", flush=True)
 
     try:
@@ -37,30 +31,7 @@ def fetch_and_push(sensor_id, day: datetime.date):
             print(f"⚠️ No data in CSV for {day_str}", flush=True)
             return 0
 
-        points_count = 0
-        with InfluxDBClient(url=INFLUX_URL, token=INFLUX_TOKEN, org=INFLUX_ORG) as client:
-            write_api = client.write_api(write_options=WriteOptions(batch_size=1000, flush_interval=10000))
-            points = []
-            for row in rows:
-                try:
-                    timestamp = datetime.datetime.fromisoformat(row["timestamp"])
-                    fields = {}
-                    for key in ["LAeq", "LAmin", "LAmax"]:
-                        if row.get(key):
-                            fields[key] = float(row[key])
-                    if fields:
-                        point = Point("noise") \
-                            .tag("sensor_id", str(sensor_id)) \
-                            .time(timestamp) \
-                            .field("LAeq", fields.get("LAeq", 0)) \
-                            .field("LAmin", fields.get("LAmin", 0)) \
-                            .field("LAmax", fields.get("LAmax", 0))
-                        points.append(point)
-                except Exception as e:
-                    print(f"⚠️ Skipping row due to error: {e}", flush=True)
-            if points:
-                write_api.write(bucket=INFLUX_BUCKET, record=points)
-                points_count = len(points)
+        points_count = ingest_rows(sensor_id, day_str, rows)
         print(f"✅ Wrote {points_count} points for {sensor_id} on {day_str}", flush=True)
         return points_count
     except Exception as e:
@@ -85,5 +56,6 @@ def backfill_range(start_date: datetime.date, end_date: datetime.date):
 # ===== MAIN =====
 if __name__ == "__main__":
     print(f"🚀 Starting backfill for sensor {SENSOR_ID} from {START_DATE} to {END_DATE}")
+    install_hooks()
     backfill_range(START_DATE, END_DATE)
     print("🎉 Done!")
@@ -1,16 +1,22 @@
 import os
+import json
+import numpy as np
 import pandas as pd
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from influxdb_client import InfluxDBClient
-import plotly.graph_objects as go
+from query_cache import cached_query_data_frame
+import pipeline_metrics as metrics
 
 # ---------------
 # CONFIGURATION
 # ---------------
-INFLUX_URL = "https://eu-central-1-1.aws.cloud2.influxdata.com"
-               # Replace with your bucket
+INFLUX_URL = os.getenv("INFLUX_URL", "https://eu-central-1-1.aws.cloud2.influxdata.com")
+INFLUX_TOKEN = os.getenv("INFLUX_TOKEN")
+INFLUX_ORG = os.getenv("INFLUX_ORG")
+INFLUX_BUCKET = os.getenv("INFLUX_BUCKET", "noise_data")
 MEASUREMENT = "noise"
 FIELD = "LAeq"
+STEP_SECONDS = 3600
 
 # List of sensor chip_ids
 chip_ids = [
@@ -22,9 +28,10 @@ chip_ids = [
     94693, 94284, 94696, 94735, 94701, 94447, 94692
 ]
 
-# Create output folder if not exists
+# Output: graphs/data/sensor_<id>.json + graphs/data/index.json, shown by graphs/index.html
 output_folder = "graphs"
-os.makedirs(output_folder, exist_ok=True)
+data_folder = os.path.join(output_folder, "data")
+os.makedirs(data_folder, exist_ok=True)
 
 # Define time range: last 7 full days (exclude today)
 end = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
@@ -32,77 +39,74 @@ start = end - timedelta(days=7)
 start_str = start.isoformat() + "Z"
 end_str = end.isoformat() + "Z"
 
-# Connect InfluxDB client once
-client = InfluxDBClient(url=INFLUX_URL, token=INFLUX_TOKEN, org=INFLUX_ORG)
-query_api = client.query_api()
 
-def query_sensor_data(chip_id):
+def query_all_sensors(query_api):
+    """Hourly LAeq means for every chip_id in one query."""
+    id_set = ", ".join(f'"{c}"' for c in chip_ids)
     query = f'''
     from(bucket: "{INFLUX_BUCKET}")
       |> range(start: {start_str}, stop: {end_str})
       |> filter(fn: (r) => r["_measurement"] == "{MEASUREMENT}")
-      |> filter(fn: (r) => r["chip_id"] == "{chip_id}")
       |> filter(fn: (r) => r["_field"] == "{FIELD}")
-      |> aggregateWindow(every: 1h, fn: mean, createEmpty: false)
-      |> yield(name: "mean")
+      |> filter(fn: (r) => contains(value: r["chip_id"], set: [{id_set}]))
+      |> aggregateWindow(every: 1h, fn: mean, createEmpty: false, timeSrc: "_start")
+      |> keep(columns: ["_time", "_value", "chip_id"])
     '''
-    tables = query_api.query_data_frame(query)
+    tables = cached_query_data_frame(query_api, query)
     if isinstance(tables, list):
-        df = pd.concat(tables)
-    else:
-        df = tables
-    if df.empty:
-        return None
-    df = df[["_time", "_value"]].rename(columns={"_time": "time", "_value": "LAeq"})
-    df["time"] = pd.to_datetime(df["time"])
+        tables = pd.concat(tables) if tables else pd.DataFrame()
+    if tables.empty:
+        return tables
+    df = tables[["_time", "_value", "chip_id"]].rename(columns={"_time": "time", "_value": "LAeq"})
+    df["time"] = pd.to_datetime(df["time"], utc=True)
     return df
 
-def generate_graph(df, chip_id):
-    fig = go.Figure()
 
-    fig.add_trace(go.Scatter(
-        x=df["time"],
-        y=df["LAeq"],
-        mode="lines+markers",
-        name="LAeq (dB)",
-        line=dict(color="blue", width=2)
-    ))
+def series_payload(df, chip_id):
+    """Regular hourly grid: start + step implied, gaps as null, values to 0.1 dB."""
+    origin = pd.Timestamp(start, tz="UTC")
+    hours = int((end - start).total_seconds() // STEP_SECONDS)
+    values = np.full(hours, np.nan)
+    slot = (df["time"] - origin) // pd.Timedelta(seconds=STEP_SECONDS)
+    ok = (slot >= 0) & (slot < hours)
+    values[slot[ok].to_numpy()] = df["LAeq"][ok].to_numpy(dtype=float)
+    return {
+        "sensor": str(chip_id),
+        "field": FIELD,
+        "start": int(origin.timestamp()),
+        "step": STEP_SECONDS,
+        "values": [None if np.isnan(v) else round(float(v), 1) for v in values],
+    }
 
-    # Night shading (22:00 - 07:00) per day
-    for i in range(7):
-        night_start = start + timedelta(days=i, hours=22)
-        night_end = start + timedelta(days=i+1, hours=7)
-        fig.add_vrect(
-            x0=night_start, x1=night_end,
-            fillcolor="rgba(200, 200, 200, 0.3)",
-            line_width=0,
-            layer="below"
-        )
 
-    fig.update_layout(
-        title=f"Weekly Noise Level (LAeq) – Sensor {chip_id}",
-        xaxis_title="Time",
-        yaxis_title="LAeq (dB)",
-        template="plotly_white",
-        height=600,
-        width=1000,
-        margin=dict(l=60, r=40, t=80, b=50)
-    )
+def write_sensor_json(df, chip_id):
+    payload = series_payload(df, chip_id)
+    filename = os.path.join(data_folder, f"sensor_{chip_id}.json")
+    with open(filename, "w") as f:
+        json.dump(payload, f, separators=(",", ":"))
+    print(f"Generated {filename}")
+    return payload
 
-    filename_html = os.path.join(output_folder, f"sensor_{chip_id}_7d.html")
-    fig.write_html(filename_html)
-    print(f"Generated {filename_html}")
 
 # --------------------
-# Main loop: generate graphs for all sensors
+# Main: one query, one small JSON file per sensor, one index for the viewer
 # --------------------
+with InfluxDBClient(url=INFLUX_URL, token=INFLUX_TOKEN, org=INFLUX_ORG) as client, metrics.timer("query"):
+    df_all = query_all_sensors(client.query_api())
+
+index = {"generated": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"), "start": start_str, "end": end_str, "sensors": []}
+groups = dict(tuple(df_all.groupby("chip_id"))) if not df_all.empty else {}
 for chip_id in chip_ids:
-    print(f"Processing sensor {chip_id}...")
-    df_sensor = query_sensor_data(str(chip_id))
+    df_sensor = groups.get(str(chip_id))
     if df_sensor is None:
         print(f"⚠ No data for sensor {chip_id}, skipping.")
         continue
-    generate_graph(df_sensor, chip_id)
+    with metrics.timer("encode", sensor=chip_id):
+        payload = write_sensor_json(df_sensor, chip_id)
+    points = [v for v in payload["values"] if v is not None]
+    index["sensors"].append({"id": str(chip_id), "points": len(points), "max": max(points, default=None)})
+
+with open(os.path.join(data_folder, "index.json"), "w") as f:
+    json.dump(index, f, separators=(",", ":"))
 
-client.close()
-print("✅ All done!")
+print(f"✅ All done! {len(index['sensors'])} sensors in {data_folder}/, view with {output_folder}/index.html")
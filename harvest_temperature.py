@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""Harvest live temperatures around Rotterdam from the NILU SensorThings API.
+
+Replaces the browser-side crawl of test-temperature.html: one run writes a
+small temperature.json that the page loads as a heat layer.
+
+  * filters run on the server where the API accepts them: the bounding box
+    (st_within on the Thing location) and active datastreams whose
+    ObservedProperty is temperature, with only the latest observation
+    expanded. If the server rejects a filter the next, simpler QUERY_LEVELS
+    variant is used and the same checks are applied locally, so the output
+    is identical either way
+  * the first page asks for $count; the remaining $skip pages are fetched
+    concurrently (WORKERS), each with retries and backoff on 429/5xx and
+    connection errors. Every level orders by id so the pages are stable,
+    and Things are de-duplicated on @iot.id in case the set shifts between
+    pages. Without a count, @iot.nextLink is followed serially
+  * the harvested point list is cached under CACHE_DIR for TTL_SECONDS, so
+    repeated runs (or several pages built in one job) hit the API once
+
+Output: {"generated", "count", "points": [[lat, lon, °C], ...]}
+
+Usage:
+    python harvest_temperature.py [--out temperature.json] [--refresh]
+
+NILU_CACHE_DIR=off disables the cache.
+"""
+import os
+import json
+import time
+import random
+import hashlib
+import argparse
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+import requests
+import pipeline_metrics as metrics
+
+# ===== SETTINGS =====
+API_URL = os.getenv("NILU_STA_URL", "https://api-virtualair.nilu.no/v1.1")
+OUTPUT_PATH = os.getenv("TEMPERATURE_OUTPUT", "temperature.json")
+CACHE_DIR = os.getenv("NILU_CACHE_DIR", os.path.join(".cache", "nilu"))
+TTL_SECONDS = int(os.getenv("NILU_CACHE_TTL", 15 * 60))
+
+BBOX = (4.3, 51.8, 4.7, 52.0)     # lon_min, lat_min, lon_max, lat_max (Rotterdam)
+OBSERVED_PROPERTY = os.getenv("NILU_OBSERVED_PROPERTY", "temperature")   # lower case, substring match
+MAX_AGE_HOURS = 6                 # older latest observations are left out
+PAGE_SIZE = 100
+WORKERS = 4
+RETRIES = 4
+BACKOFF = 1.0                     # seconds, doubled per attempt
+TIMEOUT = 30
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+
+# ===== FUNCTIONS =====
+def _bbox_polygon():
+    lon0, lat0, lon1, lat1 = BBOX
+    ring = f"{lon0} {lat0}, {lon1} {lat0}, {lon1} {lat1}, {lon0} {lat1}, {lon0} {lat0}"
+    return f"geography'POLYGON(({ring}))'"
+
+
+LATEST = "Observations($orderby=phenomenonTime desc;$top=1;$select=result,phenomenonTime)"
+PROPERTY = "ObservedProperty($select=name)"
+IS_TEMPERATURE = f"substringof('{OBSERVED_PROPERTY}', tolower(ObservedProperty/name))"
+QUERY_LEVELS = [
+    # bbox + active temperature datastreams on the server, minimal payload
+    {"$filter": f"st_within(Locations/location, {_bbox_polygon()}) and Datastreams/isActive eq true"
+                f" and substringof('{OBSERVED_PROPERTY}', tolower(Datastreams/ObservedProperty/name))",
+     "$select": "id",
+     "$orderby": "id",
+     "$expand": f"Locations($select=location),Datastreams($filter=isActive eq true and {IS_TEMPERATURE};"
+                f"$select=isActive;$expand={PROPERTY},{LATEST})"},
+    # bbox only
+    {"$filter": f"st_within(Locations/location, {_bbox_polygon()})",
+     "$orderby": "id",
+     "$expand": f"Locations,Datastreams($expand={PROPERTY},{LATEST})"},
+    # what the page used to send, plus the property to filter on
+    {"$orderby": "id",
+     "$expand": "Datastreams/Observations($orderby=phenomenonTime desc;$top=1),"
+                "Datastreams/ObservedProperty,Locations"},
+]
+
+
+class QueryRejected(Exception):
+    pass
+
+
+def get_json(session, url, params=None):
+    """GET with retries on 429/5xx and connection errors; QueryRejected on other 4xx."""
+    for attempt in range(RETRIES + 1):
+        try:
+            with metrics.timer("fetch"):
+                response = session.get(url, params=params, timeout=TIMEOUT)
+            metrics.inc("fetch_total", status=response.status_code)
+            if response.status_code == 200:
+                return response.json()
+            if response.status_code not in RETRY_STATUS:
+                raise QueryRejected(f"{response.status_code} {response.text[:200]}")
+            retry_after = response.headers.get("Retry-After", "")
+            wait = float(retry_after) if retry_after.isdigit() else BACKOFF * 2 ** attempt
+        except (requests.ConnectionError, requests.Timeout) as e:
+            metrics.inc("fetch_total", status="error")
+            if attempt == RETRIES:
+                raise
+            wait = BACKOFF * 2 ** attempt
+            print(f"⚠️ {e.__class__.__name__}, retrying in {wait:.0f}s", flush=True)
+        if attempt < RETRIES:
+            time.sleep(wait * (1 + random.random() / 4))
+    raise requests.HTTPError(f"{url}: still failing after {RETRIES} retries")
+
+
+def fetch_things(session, params):
+    """All Things for one query variant: $count first, then $skip pages in parallel."""
+    url = f"{API_URL}/Things"
+    first = get_json(session, url, dict(params, **{"$top": PAGE_SIZE, "$count": "true"}))
+    things = list(first.get("value", []))
+    total = first.get("@iot.count")
+    if total is None or "@iot.nextLink" not in first:
+        link = first.get("@iot.nextLink")
+        while link:                                   # no count: serial nextLink chain
+            page = get_json(session, link)
+            things += page.get("value", [])
+            link = page.get("@iot.nextLink")
+        return unique_things(things)
+
+    stride = len(things) or PAGE_SIZE                 # the server may cap $top below PAGE_SIZE
+    skips = range(stride, int(total), stride)
+
+    def page(skip):
+        return get_json(session, url, dict(params, **{"$top": stride, "$skip": skip})).get("value", [])
+
+    with ThreadPoolExecutor(max_workers=WORKERS) as pool:
+        for values in pool.map(page, skips):
+            things += values
+    return unique_things(things)
+
+
+def unique_things(things):
+    """First occurrence of every @iot.id, in page order."""
+    seen = set()
+    unique = []
+    for thing in things:
+        thing_id = thing.get("@iot.id", thing.get("id"))
+        if thing_id is not None and thing_id in seen:
+            continue
+        seen.add(thing_id)
+        unique.append(thing)
+    return unique
+
+
+def _coordinates(location):
+    """GeoJSON Point or Feature -> (lon, lat), else None."""
+    geometry = location.get("geometry", location) if isinstance(location, dict) else None
+    coords = (geometry or {}).get("coordinates")
+    if geometry and geometry.get("type", "Point") == "Point" and coords and len(coords) >= 2:
+        return float(coords[0]), float(coords[1])
+    return None
+
+
+def _observed_at(value):
+    end = str(value or "").split("/")[-1]             # intervals: take the end
+    try:
+        observed = datetime.datetime.fromisoformat(end.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return observed if observed.tzinfo else observed.replace(tzinfo=datetime.timezone.utc)
+
+
+def _is_temperature(datastream):
+    name = (datastream.get("ObservedProperty") or {}).get("name") or ""
+    return OBSERVED_PROPERTY in name.lower()
+
+
+def to_points(things, now=None):
+    """Things -> [[lat, lon, temperature]] inside BBOX with a recent active temperature reading."""
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    oldest = now - datetime.timedelta(hours=MAX_AGE_HOURS)
+    lon0, lat0, lon1, lat1 = BBOX
+    points = []
+    for thing in things:
+        locations = thing.get("Locations") or []
+        lonlat = _coordinates(locations[0].get("location")) if locations else None
+        if lonlat is None or not (lon0 < lonlat[0] < lon1 and lat0 < lonlat[1] < lat1):
+            continue
+        for ds in thing.get("Datastreams") or []:
+            observations = ds.get("Observations") or []
+            if ds.get("isActive") is not True or not observations or not _is_temperature(ds):
+                continue
+            observed = _observed_at(observations[0].get("phenomenonTime"))
+            try:
+                value = float(observations[0].get("result"))
+            except (TypeError, ValueError):
+                continue
+            if observed is not None and observed < oldest:
+                continue
+            points.append([round(lonlat[1], 5), round(lonlat[0], 5), round(value, 1)])
+            break                                     # one reading per Thing, as on the page
+    return points
+
+
+def _cache_path(key):
+    return os.path.join(CACHE_DIR, hashlib.sha1(key.encode()).hexdigest()[:16] + ".json")
+
+
+def cached_points(key, ttl=TTL_SECONDS):
+    if CACHE_DIR == "off" or ttl <= 0:
+        return None
+    path = _cache_path(key)
+    if not os.path.exists(path) or time.time() - os.path.getmtime(path) > ttl:
+        metrics.inc("nilu_cache_total", result="miss")
+        return None
+    metrics.inc("nilu_cache_total", result="hit")
+    with open(path) as f:
+        return json.load(f)
+
+
+def store_points(key, points):
+    if CACHE_DIR == "off":
+        return
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = _cache_path(key)
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(points, f, separators=(",", ":"))
+    os.replace(f"{path}.tmp", path)
+
+
+def harvest(ttl=TTL_SECONDS):
+    """Point list for the heat layer, from the cache when younger than `ttl`."""
+    key = json.dumps([API_URL, BBOX, MAX_AGE_HOURS, OBSERVED_PROPERTY, QUERY_LEVELS])
+    points = cached_points(key, ttl)
+    if points is not None:
+        return points
+
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_maxsize=WORKERS)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    for level, params in enumerate(QUERY_LEVELS):
+        try:
+            things = fetch_things(session, params)
+            break
+        except QueryRejected as e:
+            if level == len(QUERY_LEVELS) - 1:
+                raise
+            print(f"⚠️ Query level {level} rejected ({e}); filtering locally", flush=True)
+    with metrics.timer("parse"):
+        points = to_points(things)
+    metrics.inc("things_total", len(things))
+    store_points(key, points)
+    return points
+
+
+def write_output(points, path=OUTPUT_PATH):
+    payload = {
+        "generated": datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "count": len(points),
+        "points": points,
+    }
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(payload, f, separators=(",", ":"))
+    os.replace(f"{path}.tmp", path)
+
+
+# ===== MAIN =====
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Harvest NILU temperatures for the heat layer")
+    parser.add_argument("--out", default=OUTPUT_PATH)
+    parser.add_argument("--refresh", action="store_true", help="ignore the cache")
+    args = parser.parse_args()
+
+    print(f"🚀 Harvesting temperatures from {API_URL}", flush=True)
+    points = harvest(ttl=0 if args.refresh else TTL_SECONDS)
+    write_output(points, args.out)
+    print(f"✅ Saved {len(points)} points to {args.out}")
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""Fast day x hour heatmaps in the reports' noise colour scheme.
+
+Drop-in for the `sns.heatmap(adjusted.T, annot=pivot.T, fmt=".0f",
+linewidths=.5)` calls in the report scripts, for grids of any size:
+
+  * one `imshow` image instead of a patch per cell, so a year grid is as
+    cheap to draw as a week and embeds in a PDF as a single image,
+  * cell borders as two minor-tick grids instead of per-cell edges,
+  * annotations are cached glyph paths stamped by one PathCollection per
+    distinct label instead of a Text artist per cell, and only while the
+    grid is small (<= ANNOTATE_MAX_CELLS); larger grids are drawn without
+    them, where the numbers would be unreadable anyway.
+
+Usage:
+    from heatmap_render import plot_heatmap
+    fig, ax = plot_heatmap(pivot.T, adjusted_pivot.T, cbar_label="Avg LAmax dB(A)")
+"""
+import numpy as np
+import matplotlib.pyplot as plt
+from matplotlib.collections import PathCollection
+from matplotlib.colors import LinearSegmentedColormap, PowerNorm
+from matplotlib.font_manager import FontProperties
+from matplotlib.path import Path
+from matplotlib.textpath import TextPath
+from matplotlib.transforms import Affine2D
+
+# ===== SETTINGS =====
+ANNOTATE_MAX_CELLS = 24 * 31     # a month of hours still gets numbers
+MAX_TICK_LABELS = 40             # thin out column labels above this
+GRID_MAX_CELLS = 24 * 92         # draw cell borders up to a trimester
+
+
+# ===== FUNCTIONS =====
+def noise_cmap():
+    return LinearSegmentedColormap.from_list(
+        "noise_levels", ["gray", "green", "yellow", "red", "darkred", "black"]
+    )
+
+
+def noise_norm():
+    return PowerNorm(gamma=2.5, vmin=0, vmax=80)
+
+
+def _text_colors(rgba):
+    """White text on dark cells, dark grey on light ones (seaborn's rule)."""
+    r, g, b = (np.where(c <= 0.03928, c / 12.92, ((c + 0.055) / 1.055) ** 2.4)
+               for c in (rgba[..., 0], rgba[..., 1], rgba[..., 2]))
+    luminance = 0.2126 * r + 0.7152 * g + 0.0722 * b
+    return np.where(luminance > 0.408, ".15", "w")
+
+
+_label_paths = {}
+
+
+def _label_path(label, fontsize):
+    """Glyph outline of `label` in points, centred on the origin (cached)."""
+    path = _label_paths.get((label, fontsize))
+    if path is None:
+        path = TextPath((0, 0), label, size=fontsize, prop=FontProperties())
+        extents = path.get_extents()
+        path = _label_paths[(label, fontsize)] = Path(
+            path.vertices - [(extents.x0 + extents.x1) / 2, (extents.y0 + extents.y1) / 2], path.codes)
+    return path
+
+
+def _annotate(ax, values, text_colors, fmt, fontsize):
+    """Cell labels as one PathCollection per distinct label instead of a Text per cell.
+
+    Each collection stamps one cached glyph path at all of its cells, which
+    the vector backends store once and reuse.
+    """
+    rows, cols = np.nonzero(~np.isnan(values))
+    labels = np.array([fmt.format(v) for v in values[rows, cols]])
+    transform = Affine2D().scale(1 / 72) + ax.figure.dpi_scale_trans
+    for label in np.unique(labels):
+        cells = labels == label
+        ax.add_collection(PathCollection(
+            [_label_path(label, fontsize)], offsets=np.column_stack([cols[cells], rows[cells]]),
+            offset_transform=ax.transData, transform=transform,
+            facecolors=text_colors[rows[cells], cols[cells]], edgecolors="none", linewidths=0, zorder=3,
+        ), autolim=False)
+
+
+def draw_heatmap(ax, values, colors=None, cmap=None, norm=None, row_labels=None, col_labels=None,
+                 annotate="auto", fmt="{:.0f}", cbar_label=None, linewidth=0.5):
+    """Draw a (rows x cols) grid on `ax`. `colors` sets the shade (default: values).
+
+    `values` and `colors` may be DataFrames (labels are taken from them) or arrays.
+    Returns the AxesImage.
+    """
+    if row_labels is None and hasattr(values, "index"):
+        row_labels = list(values.index)
+    if col_labels is None and hasattr(values, "columns"):
+        col_labels = list(values.columns)
+    values = np.asarray(values, dtype=float)
+    colors = values if colors is None else np.asarray(colors, dtype=float)
+    cmap = cmap or noise_cmap()
+    norm = norm or noise_norm()
+    n_rows, n_cols = values.shape
+
+    image = ax.imshow(np.ma.masked_invalid(colors), cmap=cmap, norm=norm, aspect="auto",
+                      interpolation="nearest")
+
+    if GRID_MAX_CELLS >= values.size and linewidth:
+        ax.set_xticks(np.arange(-0.5, n_cols, 1), minor=True)
+        ax.set_yticks(np.arange(-0.5, n_rows, 1), minor=True)
+        ax.grid(which="minor", color="white", linewidth=linewidth)
+        ax.tick_params(which="minor", length=0)
+    for spine in ax.spines.values():
+        spine.set_visible(False)
+
+    if annotate == "auto":
+        annotate = values.size <= ANNOTATE_MAX_CELLS
+    if annotate:
+        rgba = cmap(norm(np.ma.masked_invalid(colors)))
+        text_colors = _text_colors(rgba)
+        fontsize = 10 if n_cols <= 10 else 8 if n_cols <= 20 else 6
+        _annotate(ax, values, text_colors, fmt, fontsize)
+
+    if row_labels is not None:
+        ax.set_yticks(range(n_rows), row_labels)
+    if col_labels is not None:
+        step = max(1, int(np.ceil(n_cols / MAX_TICK_LABELS)))
+        ax.set_xticks(range(0, n_cols, step), col_labels[::step])
+    if cbar_label is not None:
+        ax.figure.colorbar(image, ax=ax, label=cbar_label)
+    return image
+
+
+def plot_heatmap(values, colors=None, figsize=(12, 6), **kwargs):
+    """New figure with one heatmap; returns (fig, ax)."""
+    fig, ax = plt.subplots(figsize=figsize)
+    draw_heatmap(ax, values, colors, **kwargs)
+    return fig, ax
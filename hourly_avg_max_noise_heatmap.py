@@ -2,26 +2,17 @@
 import os
 import pandas as pd
 import matplotlib.pyplot as plt
-import seaborn as sns
 from datetime import datetime, timedelta
-from influxdb_client import InfluxDBClient
-from matplotlib.colors import LinearSegmentedColormap, PowerNorm
 from matplotlib.backends.backend_pdf import PdfPages
+from heatmap_render import plot_heatmap
+import sensor_registry
+from data_sources import default_router
+from data_quality import bad_days, exclude_bad_days
 
 # ===== SETTINGS =====
 REPORTS_DIR = "reports"
 os.makedirs(REPORTS_DIR, exist_ok=True)
 
-SENSOR_IDS = [
-    89747, 94284, 94735, 94449, 94687, 94448, 94693, 94701,
-    95492, 95490, 95484, 94695
-]
-
-INFLUX_URL = os.environ["INFLUX_URL"]
-INFLUX_TOKEN = os.environ["INFLUX_TOKEN"]
-INFLUX_ORG = os.environ["INFLUX_ORG"]
-INFLUX_BUCKET = os.environ.get("INFLUX_BUCKET", "noise_data")
-
 FIELD = "LAmax"
 
 # ===== FUNCTIONS =====
@@ -31,33 +22,11 @@ def get_last_full_week():
     last_monday = last_sunday - timedelta(days=6)
     return last_monday, last_sunday
 
-def fetch_sensor_data(sensor_id, start_date, end_date):
-    client = InfluxDBClient(url=INFLUX_URL, token=INFLUX_TOKEN, org=INFLUX_ORG)
-    query_api = client.query_api()
-
-    start_iso = start_date.strftime("%Y-%m-%dT00:00:00Z")
-    end_iso = (end_date + timedelta(days=1)).strftime("%Y-%m-%dT00:00:00Z")
-
-    query = f'''
-from(bucket: "{INFLUX_BUCKET}")
-  |> range(start: {start_iso}, stop: {end_iso})
-  |> filter(fn: (r) => r._measurement == "noise" and r._field == "{FIELD}")
-  |> filter(fn: (r) => r.sensor_id == {sensor_id})
-'''
-    tables = query_api.query(query)
-    rows = []
-    for table in tables:
-        for record in table.records:
-            rows.append({
-                "timestamp": record.get_time(),
-                FIELD: record.get_value()
-            })
-    df = pd.DataFrame(rows)
-    if df.empty:
-        print(f"⚠️ No data for sensor {sensor_id}")
-        return None
-    df["timestamp"] = pd.to_datetime(df["timestamp"])
-    return df
+def fetch_week_data(sensor_ids, start_date, end_date):
+    """Hourly FIELD means for all sensors (cube, Influx or archive, whichever is complete)."""
+    df = default_router().read(sensor_ids, start_date, end_date + timedelta(days=1), "1h")
+    df = exclude_bad_days(df, bad_days(start_date, end_date))
+    return df[["timestamp", "sensor_id", FIELD]].dropna(subset=[FIELD])
 
 def build_heatmap(df, sensor_id, start_date, end_date):
     # Hour and date columns
@@ -82,25 +51,15 @@ def build_heatmap(df, sensor_id, start_date, end_date):
 
     adjusted_pivot = pivot.add(adj_map, axis=1)
 
-    # Color map and normalization
-    cmap = LinearSegmentedColormap.from_list(
-        "noise_levels", ["gray", "green", "yellow", "red", "darkred", "black"]
-    )
-    norm = PowerNorm(gamma=2.5, vmin=0, vmax=80)
-
     # Plot heatmap
-    plt.figure(figsize=(12, 6))
-    ax = sns.heatmap(
+    fig, ax = plot_heatmap(
+        pivot.T,
         adjusted_pivot.T,
-        annot=pivot.T,
-        fmt=".0f",
-        cmap=cmap,
-        norm=norm,
-        cbar_kws={'label': f'Avg {FIELD} dB(A)'},
-        linewidths=.5
+        figsize=(12, 6),
+        cbar_label=f'Avg {FIELD} dB(A)',
+        col_labels=[d.strftime("%a %d") for d in pivot.index]
     )
-    ax.set_yticklabels(hour_order)
-    ax.set_xticklabels([d.strftime("%a %d") for d in pivot.index], rotation=45)
+    ax.tick_params(axis="x", rotation=45)
     plt.ylabel("Hour of day (07 → 07)")
     plt.xlabel("Date")
     plt.title(f"Hourly Average Max Noise Heatmap ({FIELD})\nSensor {sensor_id} {start_date} → {end_date}")
@@ -125,7 +84,11 @@ def build_heatmap(df, sensor_id, start_date, end_date):
 # ===== MAIN =====
 if __name__ == "__main__":
     start_date, end_date = get_last_full_week()
-    for sensor_id in SENSOR_IDS:
-        df = fetch_sensor_data(sensor_id, start_date, end_date)
-        if df is not None:
-            build_heatmap(df, sensor_id, start_date, end_date)
+    sensor_ids = sensor_registry.live_sensors(sensor_registry.load_state())
+    data = fetch_week_data(sensor_ids, start_date, end_date)
+    for sensor_id in sensor_ids:
+        df = data[data["sensor_id"] == str(sensor_id)]
+        if df.empty:
+            print(f"⚠️ No data for sensor {sensor_id}")
+            continue
+        build_heatmap(df.copy(), sensor_id, start_date, end_date)
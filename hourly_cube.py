@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""Memory-mapped hourly store: (sensor x hour x metric) float32 per year.
+
+Layout under CUBE_DIR:
+
+    index.json    {"metrics": [...], "max_sensors": 64, "slots": {"94695": 0, ...}}
+    <year>.f32    raw float32, shape (MAX_SENSORS, hours in year, 3), NaN = no data
+
+Hour h of a year file is UTC hour (year start + h). A sensor's hours are
+contiguous, so reading one sensor over any range inside a year is a
+zero-copy slice of the memmap and a year-long multi-sensor view costs
+page faults instead of queries. Values are hourly means of LAeq, LAmin
+and LAmax, the same as aggregateWindow(every: 1h, fn: mean) in Influx.
+
+Ingest appends through a hook: every written sensor-day is reduced to
+hourly means and stored in place (rewriting a day overwrites its hours).
+A single writer per CUBE_DIR is assumed.
+
+Usage:
+    python hourly_cube.py build archive_dir/ [more files or dirs]
+    python hourly_cube.py info
+    python hourly_cube.py show 94695 2025-07-01 2025-07-08
+
+Set HOURLY_CUBE_DIR=path to append every ingested sensor-day. The ingest
+workflows do so and keep hourly_cube/ in the Actions cache; the weekly
+report restores it read-only.
+"""
+import os
+import csv
+import glob
+import json
+import argparse
+import datetime
+import numpy as np
+import pandas as pd
+
+# ===== SETTINGS =====
+CUBE_DIR = os.getenv("HOURLY_CUBE_DIR", "hourly_cube")
+MAX_SENSORS = 64
+METRICS = ["LAeq", "LAmin", "LAmax"]
+CSV_COLUMNS = ["noise_LAeq", "noise_LA_min", "noise_LA_max"]   # same order as METRICS
+
+
+# ===== FUNCTIONS =====
+def year_start_hour(year):
+    """Hours since the epoch at 1 Jan `year` 00:00 UTC."""
+    return (datetime.date(year, 1, 1) - datetime.date(1970, 1, 1)).days * 24
+
+
+def hours_in_year(year):
+    return year_start_hour(year + 1) - year_start_hour(year)
+
+
+def _utc(value):
+    ts = pd.Timestamp(value)
+    return ts.tz_localize("UTC") if ts.tzinfo is None else ts
+
+
+def to_epoch_hour(value):
+    """Date, datetime or ISO string -> hours since the epoch (UTC, floored)."""
+    return int(_utc(value).timestamp() // 3600)
+
+
+class HourlyCube:
+    """Lazily opened per-year memmaps plus the sensor -> slot index."""
+
+    def __init__(self, path=CUBE_DIR, mode="r"):
+        self.path = path
+        self.mode = mode
+        self._years = {}
+        self.index = self._load_index()
+
+    def _load_index(self):
+        index_path = os.path.join(self.path, "index.json")
+        if os.path.exists(index_path):
+            with open(index_path) as f:
+                return json.load(f)
+        return {"metrics": METRICS, "max_sensors": MAX_SENSORS, "slots": {}}
+
+    def _save_index(self):
+        os.makedirs(self.path, exist_ok=True)
+        tmp = os.path.join(self.path, "index.json.tmp")
+        with open(tmp, "w") as f:
+            json.dump(self.index, f, indent=1)
+        os.replace(tmp, os.path.join(self.path, "index.json"))
+
+    @property
+    def sensors(self):
+        return [int(s) for s in self.index["slots"]]
+
+    def slot(self, sensor_id, create=False):
+        slots = self.index["slots"]
+        key = str(sensor_id)
+        if key not in slots:
+            if not create:
+                return None
+            if len(slots) >= self.index["max_sensors"]:
+                raise ValueError(f"hourly cube is full ({self.index['max_sensors']} sensors)")
+            slots[key] = len(slots)
+            self._save_index()
+        return slots[key]
+
+    def year(self, year):
+        """The memmap of `year`, or None if it does not exist (read mode)."""
+        if year in self._years:
+            return self._years[year]
+        file_path = os.path.join(self.path, f"{year}.f32")
+        shape = (self.index["max_sensors"], hours_in_year(year), len(self.index["metrics"]))
+        if not os.path.exists(file_path):
+            if self.mode == "r":
+                return None
+            os.makedirs(self.path, exist_ok=True)
+            tmp = file_path + ".tmp"
+            np.full(shape, np.nan, dtype=np.float32).tofile(tmp)
+            os.replace(tmp, file_path)
+        self._years[year] = np.memmap(file_path, dtype=np.float32, mode=self.mode, shape=shape)
+        return self._years[year]
+
+    def years(self):
+        names = glob.glob(os.path.join(self.path, "*.f32"))
+        return sorted(int(os.path.basename(n)[:-4]) for n in names)
+
+    # --- writing ---
+    def put_hours(self, sensor_id, epoch_hours, values):
+        """Store rows of `values` (n x metrics) at `epoch_hours` for one sensor."""
+        slot = self.slot(sensor_id, create=True)
+        epoch_hours = np.asarray(epoch_hours, dtype=np.int64)
+        dates = (epoch_hours // 24).astype("datetime64[D]")
+        years = dates.astype("datetime64[Y]").astype(int) + 1970
+        for year in np.unique(years):
+            sel = years == year
+            block = self.year(int(year))
+            block[slot, epoch_hours[sel] - year_start_hour(int(year))] = values[sel]
+        return len(epoch_hours)
+
+    def append_rows(self, sensor_id, rows):
+        """Reduce archive CSV rows (dicts) to hourly means and store them."""
+        frame = pd.DataFrame(rows, columns=["timestamp"] + CSV_COLUMNS)
+        ts = pd.to_datetime(frame["timestamp"], errors="coerce", utc=True)
+        ok = ts.notna().to_numpy()
+        if not ok.any():
+            return 0
+        hours = ((ts[ok] - pd.Timestamp(0, tz="UTC")) // pd.Timedelta(hours=1)).to_numpy()
+        values = frame[CSV_COLUMNS].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float)[ok]
+
+        unique, inverse = np.unique(hours, return_inverse=True)
+        present = ~np.isnan(values)
+        sums = np.zeros((len(unique), len(METRICS)))
+        counts = np.zeros((len(unique), len(METRICS)))
+        np.add.at(sums, inverse, np.where(present, values, 0.0))
+        np.add.at(counts, inverse, present)
+        with np.errstate(invalid="ignore"):
+            means = (sums / counts).astype(np.float32)
+        return self.put_hours(sensor_id, unique, means)
+
+    def flush(self):
+        for block in self._years.values():
+            block.flush()
+
+    # --- reading ---
+    def series(self, sensor_id, start, end):
+        """(hours x metrics) for one sensor in [start, end); a view if inside one year."""
+        return self.window([sensor_id], start, end)[0]
+
+    def window(self, sensor_ids, start, end):
+        """(sensors x hours x metrics) for [start, end); unknown sensors/years are NaN."""
+        if _utc(end) <= _utc(start):
+            raise ValueError(f"window end {end} is not after start {start}")
+        h0, h1 = to_epoch_hour(start), to_epoch_hour(end)
+        slots = [self.slot(s) for s in sensor_ids]
+        first_year = int(np.datetime64(h0 // 24, "D").astype("datetime64[Y]").astype(int)) + 1970
+        last_year = int(np.datetime64((h1 - 1) // 24, "D").astype("datetime64[Y]").astype(int)) + 1970
+
+        # Zero-copy path: contiguous known slots inside one existing year
+        if first_year == last_year and None not in slots and slots:
+            block = self.year(first_year)
+            lo = slots[0]
+            if block is not None and slots == list(range(lo, lo + len(slots))):
+                base = year_start_hour(first_year)
+                return block[lo:lo + len(slots), h0 - base:h1 - base]
+
+        out = np.full((len(sensor_ids), h1 - h0, len(self.index["metrics"])), np.nan, dtype=np.float32)
+        for year in range(first_year, last_year + 1):
+            block = self.year(year)
+            if block is None:
+                continue
+            base = year_start_hour(year)
+            lo, hi = max(h0, base), min(h1, base + block.shape[1])
+            for i, slot in enumerate(slots):
+                if slot is not None:
+                    out[i, lo - h0:hi - h0] = block[slot, lo - base:hi - base]
+        return out
+
+    def coverage(self, sensor_ids, start, end):
+        """Fraction of (sensor, hour) cells in [start, end) that hold data."""
+        cube = self.window(sensor_ids, start, end)
+        if cube.size == 0:
+            return 0.0
+        return float((~np.isnan(cube[..., 0])).mean())
+
+    def frame(self, sensor_ids, start, end):
+        """Long DataFrame (timestamp, sensor_id, LAeq, LAmin, LAmax), empty hours dropped."""
+        h0 = to_epoch_hour(start)
+        cube = self.window(sensor_ids, start, end)
+        s_idx, h_idx = np.nonzero(~np.isnan(cube).all(axis=2))
+        df = pd.DataFrame(cube[s_idx, h_idx], columns=self.index["metrics"])
+        df.insert(0, "sensor_id", np.asarray([str(s) for s in sensor_ids])[s_idx])
+        df.insert(0, "timestamp", pd.to_datetime((h_idx + h0) * 3600, unit="s", utc=True))
+        return df
+
+
+_reader = None
+
+
+def open_reader(path=CUBE_DIR):
+    """Shared read-only cube; nothing is mapped until a window is read."""
+    global _reader
+    if _reader is None or _reader.path != path:
+        _reader = HourlyCube(path, mode="r")
+    return _reader
+
+
+def attach_to_ingest(path=CUBE_DIR):
+    """Append every sensor-day written by noise_ingest to the cube."""
+    import noise_ingest
+    cube = HourlyCube(path, mode="r+")
+
+    def hourly_cube_hook(sensor_id, day, rows):
+        cube.append_rows(sensor_id, rows)
+        cube.flush()
+
+    noise_ingest.register_hook(hourly_cube_hook)
+    return cube
+
+
+def _csv_paths(inputs):
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            paths.extend(glob.glob(os.path.join(item, "**", "*.csv"), recursive=True))
+        else:
+            paths.append(item)
+    return sorted(paths)
+
+
+# ===== MAIN =====
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Memory-mapped hourly sensor cube")
+    parser.add_argument("--dir", default=CUBE_DIR)
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_build = sub.add_parser("build", help="append archive day CSVs")
+    p_build.add_argument("inputs", nargs="+")
+    sub.add_parser("info", help="sensors, years and coverage")
+    p_show = sub.add_parser("show", help="print hourly values of one sensor")
+    p_show.add_argument("sensor", type=int)
+    p_show.add_argument("start")
+    p_show.add_argument("end")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        cube = HourlyCube(args.dir, mode="r+")
+        total = 0
+        for path in _csv_paths(args.inputs):
+            sensor_id = os.path.splitext(os.path.basename(path))[0].rsplit("_", 1)[-1]
+            with open(path, newline="") as f:
+                total += cube.append_rows(sensor_id, list(csv.DictReader(f, delimiter=";")))
+        cube.flush()
+        print(f"✅ {total} sensor-hours stored in {args.dir}/")
+    elif args.command == "info":
+        cube = HourlyCube(args.dir)
+        print(f"📦 {len(cube.sensors)} sensors: {cube.sensors}")
+        for year in cube.years():
+            block = cube.year(year)
+            filled = (~np.isnan(block[:len(cube.sensors), :, 0])).sum(axis=1)
+            print(f"  {year}: " + ", ".join(f"{s}={n}h" for s, n in zip(cube.sensors, filled) if n))
+    else:
+        df = HourlyCube(args.dir).frame([args.sensor], args.start, args.end)
+        print(df.to_string(index=False) if not df.empty else f"⚠️ No data for {args.sensor}")
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""Which days were (re)written to Influx, and when.
+
+noise_ingest notes every day it writes; query_cache drops closed entries
+whose range holds a day written after the entry was cached. The log is one
+"<day> <epoch seconds>" line per day (newest write wins) in LOG_PATH and
+needs nothing beyond the standard library, so the light ingest jobs can
+import it.
+
+Usage:
+    python ingest_log.py show
+    python ingest_log.py note 2025-07-01 [2025-07-31]    # mark a range as rewritten
+
+INGEST_LOG=off disables it.
+"""
+import os
+import time
+import atexit
+import argparse
+import datetime
+
+# ===== SETTINGS =====
+LOG_PATH = os.getenv("INGEST_LOG", os.path.join(".cache", "ingest", "ingested.log"))
+
+_pending = {}       # day -> last write (epoch seconds) in this process, flushed at exit
+
+
+# ===== FUNCTIONS =====
+def note_ingest(day):
+    """Record that `day` (YYYY-MM-DD, UTC) was (re)written to Influx just now."""
+    if LOG_PATH == "off":
+        return
+    if not _pending:
+        atexit.register(flush)
+    _pending[str(day)] = time.time()
+
+
+def read(path=LOG_PATH):
+    """{day: last write} from the log file only."""
+    writes = {}
+    if path == "off" or not os.path.exists(path):
+        return writes
+    with open(path) as f:
+        for line in f:
+            day, _, stamp = line.partition(" ")
+            try:
+                writes[day] = max(writes.get(day, 0.0), float(stamp))
+            except ValueError:
+                continue
+    return writes
+
+
+def writes(path=LOG_PATH):
+    """{day: last write} from the log and this process."""
+    merged = read(path)
+    for day, stamp in _pending.items():
+        merged[day] = max(merged.get(day, 0.0), stamp)
+    return merged
+
+
+def flush(path=LOG_PATH):
+    """Merge this process's writes into the log (rewritten, one line per day)."""
+    if not _pending or path == "off":
+        return
+    merged = writes(path)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(f"{path}.tmp", "w") as f:
+        f.writelines(f"{day} {stamp:.0f}\n" for day, stamp in sorted(merged.items()))
+    os.replace(f"{path}.tmp", path)
+    _pending.clear()
+
+
+# ===== MAIN =====
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Log of ingested days")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("show")
+    p_note = sub.add_parser("note")
+    p_note.add_argument("start")
+    p_note.add_argument("end", nargs="?")
+    args = parser.parse_args()
+
+    if args.command == "show":
+        for day, stamp in sorted(read().items()):
+            print(f"{day}  {datetime.datetime.fromtimestamp(stamp, datetime.timezone.utc):%Y-%m-%d %H:%M} UTC")
+    else:
+        day = datetime.date.fromisoformat(args.start)
+        end = datetime.date.fromisoformat(args.end or args.start)
+        while day <= end:
+            note_ingest(day.isoformat())
+            day += datetime.timedelta(days=1)
+        flush()
+        print(f"📝 Noted {args.start} → {end} in {LOG_PATH}")
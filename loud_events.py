@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""Loud-event index: LAmax events per sensor-day in a small SQLite table.
+
+Each ingested sensor-day is segmented in one vectorized pass:
+
+  1. samples with LAmax > EVENT_THRESHOLD form runs,
+  2. runs closer than MIN_GAP_SECONDS are merged into one event,
+  3. per event: start, duration, peak LAmax and sound exposure level
+     (SEL = 10*log10(sum(10^(L/10) * dt))).
+
+Events are keyed on the 07:00 -> 07:00 local day the reports use, with a
+night flag for 23:00-07:00, and a per-day count table is kept alongside
+so "events per night per location" never touches raw data.
+
+Usage:
+    python loud_events.py extract archive_dir/ [more files or dirs]
+    python loud_events.py counts 2025-07-01 2025-09-30 [--sensor 94695] [--night]
+
+Set LOUD_EVENTS_DB=path to extract events for every ingested sensor-day.
+"""
+import os
+import csv
+import glob
+import sqlite3
+import argparse
+import numpy as np
+import pandas as pd
+
+# ===== SETTINGS =====
+DB_PATH = os.getenv("LOUD_EVENTS_DB", "loud_events.sqlite")
+TIMEZONE = "Europe/Amsterdam"
+
+EVENT_THRESHOLD = 70.0   # dB(A) LAmax, WHO-style night events
+MIN_GAP_SECONDS = 120    # runs closer than this are one event
+NIGHT_HOURS = (23, 7)    # local [start, end)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    sensor_id  INTEGER NOT NULL,
+    source_day TEXT    NOT NULL,   -- ingested archive day (UTC file day)
+    day        TEXT    NOT NULL,   -- local 07:00 -> 07:00 day
+    start      TEXT    NOT NULL,   -- UTC ISO timestamp
+    duration_s REAL    NOT NULL,
+    peak       REAL    NOT NULL,
+    sel        REAL    NOT NULL,
+    night      INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS events_sensor_day ON events (sensor_id, day);
+CREATE INDEX IF NOT EXISTS events_source ON events (sensor_id, source_day);
+CREATE TABLE IF NOT EXISTS event_counts (
+    sensor_id    INTEGER NOT NULL,
+    day          TEXT    NOT NULL,
+    night_events INTEGER NOT NULL,
+    day_events   INTEGER NOT NULL,
+    PRIMARY KEY (sensor_id, day)
+);
+"""
+
+
+# ===== FUNCTIONS =====
+def connect(path=DB_PATH):
+    conn = sqlite3.connect(path, timeout=30)
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def rows_to_arrays(rows):
+    """Archive CSV rows -> (UTC timestamps as datetime64[s], LAmax float array)."""
+    frame = pd.DataFrame(rows, columns=["timestamp", "noise_LA_max"])
+    ts = pd.to_datetime(frame["timestamp"], errors="coerce", utc=True)
+    lamax = pd.to_numeric(frame["noise_LA_max"], errors="coerce")
+    ok = ts.notna() & lamax.notna()
+    ts = ts[ok].dt.tz_convert(None).to_numpy(dtype="datetime64[s]")
+    order = np.argsort(ts, kind="stable")
+    return ts[order], lamax[ok].to_numpy(dtype=float)[order]
+
+
+def detect_events(ts, lamax, threshold=EVENT_THRESHOLD, min_gap=MIN_GAP_SECONDS):
+    """Vectorized run-length segmentation. Returns a DataFrame of events."""
+    columns = ["start", "duration_s", "peak", "sel"]
+    if len(lamax) == 0:
+        return pd.DataFrame(columns=columns)
+
+    seconds = ts.astype("datetime64[s]").astype(np.int64)
+    above = lamax > threshold
+    edges = np.diff(np.concatenate(([0], above.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1) - 1      # inclusive
+    if starts.size == 0:
+        return pd.DataFrame(columns=columns)
+
+    # Merge runs separated by less than min_gap seconds
+    gaps = seconds[starts[1:]] - seconds[ends[:-1]]
+    new_event = np.concatenate(([True], gaps >= min_gap))
+    first = np.flatnonzero(new_event)
+    ev_start = starts[first]
+    ev_end = np.maximum.reduceat(ends, first)
+
+    # Per-sample interval: time to next sample, median for the last one
+    dt = np.diff(seconds).astype(float)
+    typical = float(np.median(dt)) if dt.size else 1.0
+    dt = np.concatenate((np.clip(dt, 0, typical * 3), [typical]))
+
+    # Sum/max over [start, end] spans with reduceat on interleaved bounds
+    bounds = np.empty(ev_start.size * 2, dtype=np.int64)
+    bounds[0::2] = ev_start
+    bounds[1::2] = ev_end + 1
+    energy = np.concatenate((10.0 ** (lamax / 10.0) * dt, [0.0]))
+    levels = np.concatenate((lamax, [-np.inf]))
+    sel = 10.0 * np.log10(np.add.reduceat(energy, bounds)[0::2])
+    peak = np.maximum.reduceat(levels, bounds)[0::2]
+    duration = seconds[ev_end] - seconds[ev_start] + dt[ev_end]
+
+    return pd.DataFrame({
+        "start": pd.to_datetime(seconds[ev_start], unit="s", utc=True),
+        "duration_s": duration.astype(float),
+        "peak": peak,
+        "sel": sel,
+    })
+
+
+def _local_day_and_night(starts):
+    local = starts.dt.tz_convert(TIMEZONE)
+    day = (local - pd.Timedelta(hours=7)).dt.strftime("%Y-%m-%d")
+    hour = local.dt.hour
+    night = (hour >= NIGHT_HOURS[0]) | (hour < NIGHT_HOURS[1])
+    return day, night.astype(int)
+
+
+def store_events(conn, sensor_id, source_day, events):
+    """Replace the events of one ingested sensor-day and refresh its counts."""
+    sensor_id = int(sensor_id)
+    touched = {r[0] for r in conn.execute(
+        "SELECT DISTINCT day FROM events WHERE sensor_id = ? AND source_day = ?",
+        (sensor_id, source_day)
+    )}
+    conn.execute("DELETE FROM events WHERE sensor_id = ? AND source_day = ?", (sensor_id, source_day))
+    if len(events):
+        day, night = _local_day_and_night(events["start"])
+        conn.executemany(
+            "INSERT INTO events (sensor_id, source_day, day, start, duration_s, peak, sel, night) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            zip([sensor_id] * len(events), [source_day] * len(events), day,
+                events["start"].dt.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                events["duration_s"].round(1), events["peak"].round(1),
+                events["sel"].round(1), night)
+        )
+        touched.update(day)
+    for d in touched:
+        conn.execute(
+            "INSERT OR REPLACE INTO event_counts (sensor_id, day, night_events, day_events) "
+            "SELECT ?, ?, COALESCE(SUM(night), 0), COALESCE(SUM(1 - night), 0) "
+            "FROM events WHERE sensor_id = ? AND day = ?",
+            (sensor_id, d, sensor_id, d)
+        )
+    conn.commit()
+    return len(events)
+
+
+def extract_rows(conn, sensor_id, source_day, rows):
+    ts, lamax = rows_to_arrays(rows)
+    return store_events(conn, sensor_id, source_day, detect_events(ts, lamax))
+
+
+def attach_to_ingest(path=DB_PATH):
+    """Extract events for every sensor-day written by noise_ingest."""
+    import noise_ingest
+    conn = connect(path)
+
+    def loud_events_hook(sensor_id, day, rows):
+        extract_rows(conn, sensor_id, str(day), rows)
+
+    noise_ingest.register_hook(loud_events_hook)
+    return conn
+
+
+def event_counts(conn, start, end, sensor_id=None):
+    """{(sensor_id, day): (night_events, day_events)} for days in [start, end]."""
+    query = "SELECT sensor_id, day, night_events, day_events FROM event_counts WHERE day BETWEEN ? AND ?"
+    params = [str(start), str(end)]
+    if sensor_id is not None:
+        query += " AND sensor_id = ?"
+        params.append(int(sensor_id))
+    return {(s, d): (n, e) for s, d, n, e in conn.execute(query, params)}
+
+
+def _csv_paths(inputs):
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            paths.extend(glob.glob(os.path.join(item, "**", "*.csv"), recursive=True))
+        else:
+            paths.append(item)
+    return sorted(paths)
+
+
+# ===== MAIN =====
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Loud LAmax event index")
+    parser.add_argument("--db", default=DB_PATH)
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_extract = sub.add_parser("extract", help="index archive day CSVs")
+    p_extract.add_argument("inputs", nargs="+")
+    p_counts = sub.add_parser("counts", help="event counts per sensor and day")
+    p_counts.add_argument("start")
+    p_counts.add_argument("end")
+    p_counts.add_argument("--sensor", type=int)
+    p_counts.add_argument("--night", action="store_true", help="only night events")
+    args = parser.parse_args()
+
+    conn = connect(args.db)
+    if args.command == "extract":
+        total = 0
+        for path in _csv_paths(args.inputs):
+            name = os.path.splitext(os.path.basename(path))[0]
+            source_day, sensor_id = name[:10], name.rsplit("_", 1)[-1]
+            with open(path, newline="") as f:
+                total += extract_rows(conn, sensor_id, source_day, list(csv.DictReader(f, delimiter=";")))
+        print(f"✅ {total} loud events indexed in {args.db}")
+    else:
+        counts = event_counts(conn, args.start, args.end, args.sensor)
+        for (sensor_id, day), (night, daytime) in sorted(counts.items()):
+            print(f"{sensor_id} {day}: {night} night" + ("" if args.night else f", {daytime} day"))
+        print(f"📊 {sum(n for n, _ in counts.values())} night events in {args.start} → {args.end}")
@@ -0,0 +1,116 @@
+import os
+import math
+import datetime
+from influxdb_client import InfluxDBClient, Point, WriteOptions
+import ingest_log
+import pipeline_metrics as metrics
+
+# ===== SETTINGS =====
+ARCHIVE_URL = os.getenv("ARCHIVE_URL", "https://archive.sensor.community")
+
+INFLUX_URL = os.getenv("INFLUX_URL")
+INFLUX_TOKEN = os.getenv("INFLUX_TOKEN")
+INFLUX_ORG = os.getenv("INFLUX_ORG")
+INFLUX_BUCKET = os.getenv("INFLUX_BUCKET", "noise_data")
+
+# CSV headers of the laerm_sensor archive files -> Influx fields
+CSV_FIELDS = [
+    ("noise_LAeq", "LAeq"),
+    ("noise_LA_min", "LAmin"),
+    ("noise_LA_max", "LAmax"),
+]
+
+# Called as hook(sensor_id, day, rows) after every ingested sensor-day
+INGEST_HOOKS = []
+
+
+# ===== FUNCTIONS =====
+def day_url(sensor_id, day):
+    return f"{ARCHIVE_URL}/{day}/{day}_laerm_sensor_{sensor_id}.csv"
+
+
+def influx_client():
+    return InfluxDBClient(url=INFLUX_URL, token=INFLUX_TOKEN, org=INFLUX_ORG)
+
+
+def rows_to_points(sensor_id, rows):
+    """Encode archive CSV rows (dicts keyed by CSV header) as Influx points.
+
+    Only the fields present in a row are written: an empty LA_min stays
+    absent instead of becoming 0 dB and dragging every mean down.
+    """
+    points = []
+    tag = str(sensor_id)
+    for row in rows:
+        try:
+            timestamp = datetime.datetime.fromisoformat(row["timestamp"])
+            point = None
+            for key, field_name in CSV_FIELDS:
+                raw = row.get(key)
+                if not raw:
+                    continue
+                value = float(raw)
+                if not math.isfinite(value):
+                    continue
+                if point is None:
+                    point = Point("noise").tag("sensor_id", tag).time(timestamp)
+                point.field(field_name, value)
+            if point is not None:
+                points.append(point)
+        except Exception as e:
+            print(f"⚠️ Skipping row due to error: {e}", flush=True)
+    return points
+
+
+def write_points(points, client=None):
+    """Write points to INFLUX_BUCKET, reusing `client` when one is passed."""
+    if not points:
+        return 0
+    if client is None:
+        with influx_client() as client:
+            return write_points(points, client)
+    with client.write_api(write_options=WriteOptions(batch_size=1000, flush_interval=10000)) as write_api:
+        write_api.write(bucket=INFLUX_BUCKET, record=points)
+    return len(points)
+
+
+def register_hook(hook):
+    if hook not in INGEST_HOOKS:
+        INGEST_HOOKS.append(hook)
+
+
+def install_hooks():
+    """Register the optional post-ingest stages enabled in the environment."""
+    if os.getenv("EXCEEDANCE_SINK"):
+        import exceedance
+        exceedance.attach_to_ingest(os.environ["EXCEEDANCE_SINK"])
+    if os.getenv("LOUD_EVENTS_DB"):
+        import loud_events
+        loud_events.attach_to_ingest(os.environ["LOUD_EVENTS_DB"])
+    if os.getenv("DATA_QUALITY_DB"):
+        import data_quality
+        data_quality.attach_to_ingest(os.environ["DATA_QUALITY_DB"])
+    if os.getenv("HOURLY_CUBE_DIR"):
+        import hourly_cube
+        hourly_cube.attach_to_ingest(os.environ["HOURLY_CUBE_DIR"])
+
+
+def ingest_rows(sensor_id, day, rows, client=None):
+    """Encode and write one sensor-day of archive rows. Returns the point count."""
+    with metrics.timer("encode", sensor=sensor_id, day=day):
+        points = rows_to_points(sensor_id, rows)
+    with metrics.timer("write", sensor=sensor_id, day=day):
+        written = write_points(points, client)
+    metrics.inc("rows_total", len(rows), sensor=sensor_id, day=day)
+    metrics.inc("rows_dropped_total", len(rows) - len(points), sensor=sensor_id, day=day)
+    metrics.inc("points_written_total", written, sensor=sensor_id, day=day)
+    if written:
+        ingest_log.note_ingest(day)
+    for hook in INGEST_HOOKS:
+        name = getattr(hook, "__name__", hook)
+        try:
+            with metrics.timer(f"hook_{name}", sensor=sensor_id, day=day):
+                hook(sensor_id, day, rows)
+        except Exception as e:
+            print(f"⚠️ Ingest hook {name} failed: {e}", flush=True)
+    return written
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""Gridded noise surface for Rotterdam centrum from point sensors.
+
+The interpolation weights only depend on the sensor positions and the
+grid, never on the levels, so they are computed once as a (cells x
+sensors) matrix and cached on disk. Every frame is then one product:
+
+    surface = W @ levels
+
+Frames that share the same set of reporting sensors are stacked and
+rendered with a single matrix-matrix product. Two methods are available:
+
+    idw      inverse distance weighting (power POWER)
+    kriging  ordinary kriging with an exponential variogram
+
+Output per frame is a transparent PNG overlay (for L.imageOverlay) plus
+one index.json with the bounds and frame list, and all frames as a
+compact uint8 raster (surfaces.u8, QUANT_STEP dB per step).
+
+Usage:
+    python noise_surface.py                        # frames from animation_data.json
+    python noise_surface.py --method kriging --out surfaces
+"""
+import os
+import json
+import hashlib
+import argparse
+import numpy as np
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+from matplotlib.colors import LinearSegmentedColormap, PowerNorm
+
+# ===== SETTINGS =====
+LOCATIONS_FILE = "sensor_locations.json"
+FRAMES_FILE = "animation_data.json"
+OUTPUT_DIR = "surfaces"
+CACHE_DIR = os.path.join(".cache", "surface_weights")
+
+# Rotterdam centrum, same box index.html uses to pick sensors
+BOUNDS = {"south": 51.89, "west": 4.44, "north": 51.93, "east": 4.55}
+GRID_SHAPE = (160, 240)  # rows (lat), cols (lon)
+
+POWER = 2.0                                             # IDW distance power
+VARIOGRAM = {"nugget": 1.0, "sill": 25.0, "range": 800.0}  # dB^2, dB^2, metres
+
+EARTH_RADIUS = 6371000.0
+OVERLAY_ALPHA = 0.55
+QUANT_STEP = 0.5  # dB per raster step in surfaces.u8
+
+
+# ===== FUNCTIONS =====
+def load_locations(path=LOCATIONS_FILE):
+    with open(path) as f:
+        raw = json.load(f)
+    return {str(s): (float(v["lat"]), float(v["lon"])) for s, v in raw.items()}
+
+
+def grid_coords(bounds=BOUNDS, shape=GRID_SHAPE):
+    """Cell-centre latitudes (north to south) and longitudes (west to east)."""
+    rows, cols = shape
+    lat_step = (bounds["north"] - bounds["south"]) / rows
+    lon_step = (bounds["east"] - bounds["west"]) / cols
+    lats = bounds["north"] - lat_step * (np.arange(rows) + 0.5)
+    lons = bounds["west"] + lon_step * (np.arange(cols) + 0.5)
+    return lats, lons
+
+
+def _to_metres(lats, lons, ref_lat):
+    """Local equirectangular projection; fine at city scale."""
+    x = np.radians(lons) * EARTH_RADIUS * np.cos(np.radians(ref_lat))
+    y = np.radians(lats) * EARTH_RADIUS
+    return x, y
+
+
+def _distances(sensor_xy, cell_xy):
+    dx = cell_xy[0][:, None] - sensor_xy[0][None, :]
+    dy = cell_xy[1][:, None] - sensor_xy[1][None, :]
+    return np.hypot(dx, dy)
+
+
+def _variogram(h, nugget, sill, range_):
+    gamma = nugget + (sill - nugget) * (1.0 - np.exp(-3.0 * h / range_))
+    return np.where(h == 0, 0.0, gamma)
+
+
+def idw_weights(dist, power=POWER):
+    with np.errstate(divide="ignore"):
+        w = 1.0 / np.power(dist, power)
+    exact = dist == 0
+    rows = exact.any(axis=1)
+    w[rows] = exact[rows].astype(float)
+    return w / w.sum(axis=1, keepdims=True)
+
+
+def kriging_weights(sensor_dist, cell_dist, variogram=VARIOGRAM):
+    """Ordinary kriging weights for every cell at once (one matrix inverse)."""
+    n = sensor_dist.shape[0]
+    params = (variogram["nugget"], variogram["sill"], variogram["range"])
+    system = np.ones((n + 1, n + 1))
+    system[:n, :n] = _variogram(sensor_dist, *params)
+    system[n, n] = 0.0
+    rhs = np.ones((n + 1, cell_dist.shape[0]))
+    rhs[:n] = _variogram(cell_dist, *params).T
+    solution = np.linalg.solve(system, rhs)
+    return solution[:n].T
+
+
+class SurfaceModel:
+    """Weight matrices for one sensor set and grid, cached per sensor subset."""
+
+    def __init__(self, locations, method="idw", bounds=BOUNDS, shape=GRID_SHAPE,
+                 cache_dir=CACHE_DIR):
+        self.sensor_ids = sorted(locations)
+        self.method = method
+        self.bounds = bounds
+        self.shape = shape
+        self.cache_dir = cache_dir
+        self._weights = {}
+
+        lats, lons = grid_coords(bounds, shape)
+        ref_lat = (bounds["north"] + bounds["south"]) / 2
+        grid_lat, grid_lon = np.meshgrid(lats, lons, indexing="ij")
+        self._cells = _to_metres(grid_lat.ravel(), grid_lon.ravel(), ref_lat)
+        coords = np.array([locations[s] for s in self.sensor_ids])
+        self._sensors = _to_metres(coords[:, 0], coords[:, 1], ref_lat)
+        self._key = hashlib.sha1(json.dumps(
+            [method, POWER, VARIOGRAM, bounds, list(shape),
+             [[s, *locations[s]] for s in self.sensor_ids]]
+        ).encode()).hexdigest()[:16]
+
+    def _compute(self, subset):
+        idx = np.array(subset)
+        sensor_xy = (self._sensors[0][idx], self._sensors[1][idx])
+        cell_dist = _distances(sensor_xy, self._cells)
+        if self.method == "kriging":
+            sensor_dist = _distances(sensor_xy, sensor_xy)
+            return kriging_weights(sensor_dist, cell_dist)
+        return idw_weights(cell_dist)
+
+    def weights(self, subset):
+        """(cells x len(subset)) float32 matrix for the given sensor indices."""
+        subset = tuple(subset)
+        if subset in self._weights:
+            return self._weights[subset]
+        mask = "".join("1" if i in subset else "0" for i in range(len(self.sensor_ids)))
+        path = os.path.join(self.cache_dir, f"{self._key}_{mask}.npy")
+        if os.path.exists(path):
+            w = np.load(path)
+        else:
+            w = self._compute(subset).astype(np.float32)
+            os.makedirs(self.cache_dir, exist_ok=True)
+            np.save(path, w)
+        self._weights[subset] = w
+        return w
+
+    def surfaces(self, levels):
+        """levels: (sensors x frames) with NaN for missing -> (frames, rows, cols)."""
+        levels = np.asarray(levels, dtype=np.float32)
+        n_frames = levels.shape[1]
+        out = np.full((n_frames, self.shape[0] * self.shape[1]), np.nan, dtype=np.float32)
+        present = ~np.isnan(levels)
+        patterns, inverse = np.unique(present.T, axis=0, return_inverse=True)
+        for p, pattern in enumerate(patterns):
+            subset = np.flatnonzero(pattern)
+            if subset.size == 0:
+                continue
+            frames = np.flatnonzero(inverse.ravel() == p)
+            w = self.weights(subset)
+            out[frames] = (w @ levels[np.ix_(subset, frames)]).T
+        return out.reshape(n_frames, *self.shape)
+
+
+def load_frames(path=FRAMES_FILE):
+    """Read animation_data.json style frames -> (labels, {sensor: [levels]}, locations)."""
+    with open(path) as f:
+        raw = json.load(f)
+    labels = [frame.get("time", frame.get("hour")) for frame in raw]
+    series = {}
+    locations = {}
+    for i, frame in enumerate(raw):
+        for sensor in frame["sensors"]:
+            sid = str(sensor["id"])
+            locations[sid] = (float(sensor["lat"]), float(sensor["lon"]))
+            series.setdefault(sid, [np.nan] * len(raw))[i] = sensor.get("value", np.nan)
+    return labels, series, locations
+
+
+def noise_colormap():
+    return LinearSegmentedColormap.from_list(
+        "noise_levels", ["gray", "green", "yellow", "red", "darkred", "black"]
+    )
+
+
+def write_png(surface, path, cmap=None, norm=None):
+    cmap = cmap or noise_colormap()
+    norm = norm or PowerNorm(gamma=2.5, vmin=0, vmax=80)
+    rgba = cmap(norm(np.ma.masked_invalid(surface)))
+    rgba[..., 3] = np.where(np.isnan(surface), 0.0, OVERLAY_ALPHA)
+    plt.imsave(path, rgba)
+
+
+def quantize(surface):
+    """uint8 raster at QUANT_STEP dB resolution; 255 marks no data."""
+    q = np.clip(np.round(np.nan_to_num(surface, nan=-1) / QUANT_STEP), 0, 254)
+    q[np.isnan(surface)] = 255
+    return q.astype(np.uint8)
+
+
+def render_frames(model, labels, surfaces, out_dir=OUTPUT_DIR):
+    os.makedirs(out_dir, exist_ok=True)
+    frames = []
+    for i, (label, surface) in enumerate(zip(labels, surfaces)):
+        name = f"frame_{i:04d}.png"
+        write_png(surface, os.path.join(out_dir, name))
+        frames.append({"label": label, "png": name})
+    # All frames as one (frames x rows x cols) uint8 block for scripted use
+    quantize(np.asarray(surfaces)).tofile(os.path.join(out_dir, "surfaces.u8"))
+    index = {
+        "method": model.method,
+        "bounds": [[model.bounds["south"], model.bounds["west"]],
+                   [model.bounds["north"], model.bounds["east"]]],
+        "shape": list(model.shape),
+        "raster": "surfaces.u8",
+        "raster_step_db": QUANT_STEP,
+        "frames": frames,
+    }
+    with open(os.path.join(out_dir, "index.json"), "w") as f:
+        json.dump(index, f, separators=(",", ":"))
+    return index
+
+
+# ===== MAIN =====
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Interpolated noise surfaces")
+    parser.add_argument("--frames", default=FRAMES_FILE, help="animation_data.json style input")
+    parser.add_argument("--method", choices=["idw", "kriging"], default="idw")
+    parser.add_argument("--out", default=OUTPUT_DIR)
+    args = parser.parse_args()
+
+    labels, series, frame_locations = load_frames(args.frames)
+    locations = load_locations()
+    locations.update(frame_locations)
+    locations = {s: locations[s] for s in series}
+
+    model = SurfaceModel(locations, method=args.method)
+    levels = np.array([series[s] for s in model.sensor_ids], dtype=np.float32)
+    surfaces = model.surfaces(levels)
+    render_frames(model, labels, surfaces, args.out)
+    print(f"✅ {len(labels)} {args.method} surfaces written to {args.out}/")
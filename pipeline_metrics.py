@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""Counters and latency histograms for the ingest and report scripts.
+
+Stages (fetch, parse, encode, write, query, aggregate, render, ...) are
+timed with `timer`, which feeds the `stage_seconds` histogram; anything
+countable goes through `inc`. Both take free-form labels, normally
+sensor and day (scripts import it as `metrics`):
+
+    with metrics.timer("fetch", sensor=sensor_id, day=day):
+        response = requests.get(url, timeout=30)
+    metrics.inc("rows_total", len(rows), sensor=sensor_id, day=day)
+
+Call them once per batch (a sensor-day, a query), never per row: an
+update is a dict lookup under a lock, which is negligible per batch but
+not free inside the per-row loops.
+
+At exit the registry is written to
+
+    <PIPELINE_METRICS_DIR>/<job>.json     everything, all labels
+    <PROMETHEUS_TEXTFILE_DIR>/noise_<job>.prom
+                                          Prometheus text format for the node
+                                          exporter textfile collector; the
+                                          `day` label is summed away to keep
+                                          the series count bounded
+
+where <job> is the script name (or PIPELINE_METRICS_JOB).
+PIPELINE_METRICS_DIR=off disables collection entirely.
+
+Usage:
+    python pipeline_metrics.py [path/to/job.json]     # print a stage summary
+"""
+import os
+import re
+import sys
+import json
+import time
+import atexit
+import bisect
+import argparse
+import threading
+
+# ===== SETTINGS =====
+METRICS_DIR = os.getenv("PIPELINE_METRICS_DIR", "metrics")
+TEXTFILE_DIR = os.getenv("PROMETHEUS_TEXTFILE_DIR", METRICS_DIR)
+JOB = os.getenv("PIPELINE_METRICS_JOB")
+PREFIX = "noise_"
+PROM_DROP_LABELS = ("day",)
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+ENABLED = METRICS_DIR != "off"
+
+_lock = threading.Lock()
+_counters = {}       # (name, labels) -> value
+_histograms = {}     # (name, labels) -> [count per bucket..., +Inf count, sum]
+_started = time.time()
+_flush_pid = None
+_profiler = None     # profiling session notified of stage enter/exit (see profiling.py)
+
+
+# ===== FUNCTIONS =====
+def _key(name, labels):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+
+def _register_flush():
+    global _flush_pid
+    if _flush_pid is None:
+        _flush_pid = os.getpid()
+        atexit.register(flush)
+
+
+def inc(name, n=1, **labels):
+    """Add `n` to counter `name`."""
+    if not ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + n
+    _register_flush()
+
+
+def observe(name, value, **labels):
+    """Record one observation (seconds) in histogram `name`."""
+    if not ENABLED:
+        return
+    key = _key(name, labels)
+    slot = bisect.bisect_left(BUCKETS, value)
+    with _lock:
+        counts = _histograms.get(key)
+        if counts is None:
+            counts = _histograms[key] = [0] * (len(BUCKETS) + 1) + [0.0]
+        counts[slot] += 1
+        counts[-1] += value
+    _register_flush()
+
+
+class _Timer:
+    __slots__ = ("stage", "labels", "started")
+
+    def __init__(self, stage, labels):
+        self.stage = stage
+        self.labels = labels
+
+    def __enter__(self):
+        if _profiler is not None:
+            _profiler.enter(self.stage)
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if _profiler is not None:
+            _profiler.exit(self.stage)
+        observe("stage_seconds", time.perf_counter() - self.started, stage=self.stage, **self.labels)
+        if exc_type is not None:
+            inc("stage_errors_total", stage=self.stage, **self.labels)
+        return False
+
+
+def timer(stage, **labels):
+    """Context manager timing one run of `stage`; failures count in stage_errors_total."""
+    return _Timer(stage, labels)
+
+
+def timed(stage, **labels):
+    """Decorator form of `timer`."""
+    def wrap(fn):
+        def inner(*args, **kwargs):
+            with _Timer(stage, labels):
+                return fn(*args, **kwargs)
+        inner.__name__ = fn.__name__
+        inner.__doc__ = fn.__doc__
+        return inner
+    return wrap
+
+
+def set_profiler(session):
+    global _profiler
+    _profiler = session
+
+
+def job_name():
+    name = JOB or os.path.splitext(os.path.basename(sys.argv[0] or ""))[0] or "python"
+    return re.sub(r"\W+", "_", name).strip("_")
+
+
+def snapshot():
+    """Everything recorded so far, as a JSON-ready dict."""
+    with _lock:
+        counters = dict(_counters)
+        histograms = {k: list(v) for k, v in _histograms.items()}
+    stages = {}
+    for (name, labels), counts in histograms.items():
+        if name != "stage_seconds":
+            continue
+        stage = dict(labels)["stage"]
+        total = stages.setdefault(stage, {"count": 0, "seconds": 0.0})
+        total["count"] += sum(counts[:-1])
+        total["seconds"] += counts[-1]
+    for total in stages.values():
+        total["seconds"] = round(total["seconds"], 3)
+        total["mean_seconds"] = round(total["seconds"] / total["count"], 4) if total["count"] else None
+    return {
+        "job": job_name(),
+        "started": _started,
+        "finished": time.time(),
+        "duration_seconds": round(time.time() - _started, 3),
+        "stages": stages,
+        "counters": [{"name": n, "labels": dict(l), "value": v} for (n, l), v in sorted(counters.items())],
+        "histograms": [{"name": n, "labels": dict(l), "count": sum(c[:-1]), "sum": round(c[-1], 6),
+                        "buckets": c[:-1]} for (n, l), c in sorted(histograms.items())],
+    }
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _prom_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (f'{k}="{_escape(v)}"' for k, v in pairs)
+    return "{" + ",".join(escaped) + "}"
+
+
+def _drop(labels):
+    return tuple((k, v) for k, v in labels if k not in PROM_DROP_LABELS)
+
+
+def prometheus_text(snap):
+    """Prometheus text exposition of a snapshot (day label summed away)."""
+    job = (("job", snap["job"]),)
+    counters, histograms = {}, {}
+    for c in snap["counters"]:
+        key = (c["name"], _drop(sorted(c["labels"].items())))
+        counters[key] = counters.get(key, 0) + c["value"]
+    for h in snap["histograms"]:
+        key = (h["name"], _drop(sorted(h["labels"].items())))
+        merged = histograms.setdefault(key, [0] * len(h["buckets"]) + [0.0])
+        for i, n in enumerate(h["buckets"]):
+            merged[i] += n
+        merged[-1] += h["sum"]
+
+    lines = []
+    for name in sorted({n for n, _ in counters}):
+        lines += [f"# HELP {PREFIX}{name} Pipeline counter {name}.", f"# TYPE {PREFIX}{name} counter"]
+        for (n, labels), value in sorted(counters.items()):
+            if n == name:
+                lines.append(f"{PREFIX}{name}{_prom_labels(job + labels)} {value}")
+    for name in sorted({n for n, _ in histograms}):
+        lines += [f"# HELP {PREFIX}{name} Pipeline latency {name}.", f"# TYPE {PREFIX}{name} histogram"]
+        for (n, labels), counts in sorted(histograms.items()):
+            if n != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(list(BUCKETS) + ["+Inf"], counts[:-1]):
+                cumulative += count
+                lines.append(f"{PREFIX}{name}_bucket{_prom_labels(job + labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{PREFIX}{name}_sum{_prom_labels(job + labels)} {counts[-1]:.6f}")
+            lines.append(f"{PREFIX}{name}_count{_prom_labels(job + labels)} {cumulative}")
+    lines.append(f"# TYPE {PREFIX}last_run_timestamp_seconds gauge")
+    lines.append(f"{PREFIX}last_run_timestamp_seconds{_prom_labels(job)} {snap['finished']:.0f}")
+    return "\n".join(lines) + "\n"
+
+
+def _write_atomic(path, text):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+def flush():
+    """Write the JSON summary and the Prometheus textfile (registered with atexit)."""
+    if not ENABLED or os.getpid() != _flush_pid:      # forked workers leave it to the parent
+        return None
+    snap = snapshot()
+    if not snap["counters"] and not snap["histograms"]:
+        return None
+    json_path = os.path.join(METRICS_DIR, f"{snap['job']}.json")
+    _write_atomic(json_path, json.dumps(snap, indent=1))
+    _write_atomic(os.path.join(TEXTFILE_DIR, f"{PREFIX}{snap['job']}.prom"), prometheus_text(snap))
+    print(f"📊 Metrics written to {json_path}", flush=True)
+    return json_path
+
+
+def print_summary(snap):
+    print(f"📊 {snap['job']}: {snap['duration_seconds']:.1f}s", flush=True)
+    for stage, total in sorted(snap["stages"].items(), key=lambda s: -s[1]["seconds"]):
+        print(f"   {stage:<12} {total['seconds']:8.2f}s over {total['count']:>6} runs", flush=True)
+    counters = {}
+    for c in snap["counters"]:
+        counters[c["name"]] = counters.get(c["name"], 0) + c["value"]
+    for name, value in sorted(counters.items()):
+        print(f"   {name:<24} {value}", flush=True)
+
+
+if os.getenv("NOISE_PROFILE") and __name__ != "__main__":
+    import profiling
+    profiling.start()
+
+
+# ===== MAIN =====
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarize a pipeline metrics JSON file")
+    parser.add_argument("paths", nargs="*", help=f"default: every job in {METRICS_DIR}/")
+    args = parser.parse_args()
+
+    paths = args.paths or sorted(os.path.join(METRICS_DIR, p) for p in os.listdir(METRICS_DIR)
+                                 if p.endswith(".json"))
+    for path in paths:
+        with open(path) as f:
+            print_summary(json.load(f))
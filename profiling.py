@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""Opt-in profiling of any script, broken down by pipeline stage.
+
+Stages are the `pipeline_metrics.timer(...)` blocks the scripts already
+have (fetch, parse, encode, write, query, aggregate, render, ...); the
+rest of the run is attributed to "main". Modes, comma separated:
+
+    sample     wall-clock stack sampling (SAMPLE_INTERVAL) of every thread
+               that is inside a stage, written as collapsed stacks for
+               flamegraph.pl / speedscope
+    cprofile   deterministic cProfile per stage and thread, merged into
+               one .pstats file per stage (snakeviz, gprof2dot)
+    mem        tracemalloc: net and peak allocation per stage plus the
+               top allocation sites of the first MEM_SNAPSHOTS runs; the
+               snapshots are taken outside the stage's timer, profiler and
+               samples, so they do not inflate its wall time
+
+Each run writes reports/_profile/<script>-<time>/ with summary.txt (stage
+wall times and ranked hotspots) next to the mode's raw output.
+
+Enable with the environment (any script that uses pipeline_metrics):
+    NOISE_PROFILE=sample,mem python backfill_last_week.py
+or wrap any entry point:
+    python profiling.py --mode cprofile third_trimester_one_sensor.py
+or, for the argparse scripts, pass --profile sample.
+"""
+import os
+import gc
+import sys
+import time
+import runpy
+import atexit
+import contextlib
+import pstats
+import cProfile
+import argparse
+import datetime
+import threading
+import tracemalloc
+from collections import Counter
+
+# ===== SETTINGS =====
+PROFILE_DIR = os.path.join("reports", "_profile")
+MODES = ("sample", "cprofile", "mem")
+SAMPLE_INTERVAL = float(os.getenv("NOISE_PROFILE_INTERVAL", 0.005))
+MEM_FRAMES = int(os.getenv("NOISE_PROFILE_FRAMES", 1))
+MEM_SNAPSHOTS = int(os.getenv("NOISE_PROFILE_SNAPSHOTS", 2))   # site diffs per stage (slow)
+TOP_N = 20
+
+_session = None
+
+
+# ===== FUNCTIONS =====
+def parse_modes(value):
+    """'sample,mem' -> {'sample', 'mem'}; '1' / 'on' mean sample."""
+    modes = {m.strip().lower() for m in (value or "").split(",") if m.strip()}
+    if modes & {"1", "on", "true", "yes"}:
+        modes = (modes - {"1", "on", "true", "yes"}) | {"sample"}
+    unknown = modes - set(MODES)
+    if unknown:
+        raise ValueError(f"unknown profile mode(s) {', '.join(sorted(unknown))}; use {', '.join(MODES)}")
+    return modes
+
+
+_frame_names = {}
+
+
+def _frame_name(code):
+    name = _frame_names.get(code)
+    if name is None:
+        name = _frame_names[code] = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+    return name
+
+
+def _own_site(filename):
+    return os.path.basename(filename) not in ("tracemalloc.py", "profiling.py")
+
+
+def _site_sizes():
+    """{allocation site: bytes} now; small, so holding it across a stage is cheap for the GC."""
+    return {str(stat.traceback[0]): stat.size
+            for stat in tracemalloc.take_snapshot().statistics("lineno")
+            if _own_site(stat.traceback[0].filename)}
+
+
+class ProfileSession:
+    """Per-thread stage stacks feeding the sampler, cProfile and tracemalloc."""
+
+    def __init__(self, modes, job):
+        self.modes = modes
+        self.job = job
+        self.started = time.time()
+        self.lock = threading.Lock()
+        self.stacks = {}                     # thread id -> [[stage, profiler, mem, t0, overhead], ...]
+        self.busy = set()                    # threads inside a tracemalloc snapshot
+        self.wall = Counter()
+        self.runs = Counter()
+        self.samples = Counter()             # collapsed stack -> count
+        self.pstats = {}                     # stage -> pstats.Stats
+        self.mem = {}                        # stage -> {"net", "peak", "sites": Counter}
+        self._stop = threading.Event()
+        self._sampler = None
+
+    # ----- stage stack -----
+    def enter(self, stage):
+        stack = self.stacks.setdefault(threading.get_ident(), [])
+        if stack and stack[-1][1] is not None:
+            stack[-1][1].disable()           # cProfile time is exclusive per stage
+        mem_state = None
+        if "mem" in self.modes:
+            # Snapshot before the stage's timer, profiler and samples start
+            with self._overhead(stack):
+                sizes = None
+                if self.runs[stage] < MEM_SNAPSHOTS:
+                    sizes = _site_sizes()
+                current, _ = tracemalloc.get_traced_memory()
+                tracemalloc.reset_peak()
+            mem_state = (current, sizes)
+        profiler = None
+        if "cprofile" in self.modes:
+            profiler = cProfile.Profile()
+            profiler.enable()
+        stack.append([stage, profiler, mem_state, time.perf_counter(), 0.0])
+
+    def exit(self, stage):
+        stack = self.stacks.get(threading.get_ident())
+        if not stack or stack[-1][0] != stage:
+            return
+        _, profiler, mem_state, started, overhead = stack.pop()
+        elapsed = time.perf_counter() - started - overhead
+        if profiler is not None:
+            profiler.disable()
+        mem = None
+        if mem_state is not None:
+            current, peak = tracemalloc.get_traced_memory()
+            before, sizes = mem_state
+            sites = None
+            if sizes is not None:
+                with self._overhead(stack):
+                    sites = Counter({site: size - sizes.get(site, 0) for site, size in _site_sizes().items()
+                                     if size > sizes.get(site, 0)})
+            mem = (current - before, peak - before, sites)
+        with self.lock:
+            self.wall[stage] += elapsed
+            self.runs[stage] += 1
+            if profiler is not None:
+                if stage in self.pstats:
+                    self.pstats[stage].add(profiler)
+                else:
+                    self.pstats[stage] = pstats.Stats(profiler)
+            if mem is not None:
+                entry = self.mem.setdefault(stage, {"net": 0, "peak": 0, "sites": Counter()})
+                entry["net"] += mem[0]
+                entry["peak"] = max(entry["peak"], mem[1])
+                if mem[2]:
+                    entry["sites"].update(mem[2])
+        if stack and stack[-1][1] is not None:
+            stack[-1][1].enable()
+
+    @contextlib.contextmanager
+    def _overhead(self, stack):
+        """Hide profiler work from the sampler and take it off the open stages' wall time."""
+        tid = threading.get_ident()
+        self.busy.add(tid)
+        collecting = gc.isenabled()
+        gc.disable()                         # the snapshot's garbage would be collected inside the stage
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            if collecting:
+                gc.collect(0)
+                gc.enable()
+            spent = time.perf_counter() - started
+            for entry in stack:
+                entry[4] += spent
+            self.busy.discard(tid)
+
+    # ----- sampling -----
+    def _sample_loop(self):
+        while not self._stop.wait(SAMPLE_INTERVAL):
+            for tid, frame in sys._current_frames().items():
+                stack = self.stacks.get(tid)
+                if not stack or tid in self.busy:    # idle pool / client threads, snapshots
+                    continue
+                root = stack[-1][0]
+                frames = []
+                while frame is not None:
+                    frames.append(_frame_name(frame.f_code))
+                    frame = frame.f_back
+                self.samples[";".join([root] + frames[::-1])] += 1
+
+    # ----- lifecycle -----
+    def start(self):
+        if "mem" in self.modes and not tracemalloc.is_tracing():
+            tracemalloc.start(MEM_FRAMES)
+        self.enter("main")
+        if "sample" in self.modes:
+            self._sampler = threading.Thread(target=self._sample_loop, name="profiler", daemon=True)
+            self._sampler.start()
+
+    def finish(self):
+        main = self.stacks.get(threading.main_thread().ident) or []
+        while main:
+            self.exit(main[-1][0])
+        if self._sampler is not None:
+            self._stop.set()
+            self._sampler.join()
+        return self.write()
+
+    # ----- output -----
+    def write(self):
+        stamp = datetime.datetime.fromtimestamp(self.started).strftime("%Y%m%d-%H%M%S")
+        out_dir = os.path.join(PROFILE_DIR, f"{self.job}-{stamp}")
+        os.makedirs(out_dir, exist_ok=True)
+        lines = [f"Profile of {self.job} ({', '.join(sorted(self.modes))}), "
+                 f"{time.time() - self.started:.1f}s wall", "", "Stages (wall, including nested stages):"]
+        for stage, seconds in self.wall.most_common():
+            lines.append(f"  {stage:<28} {seconds:9.3f}s  {self.runs[stage]:>6} runs")
+
+        if self.samples:
+            with open(os.path.join(out_dir, "stacks.collapsed"), "w") as f:
+                for stack, count in self.samples.most_common():
+                    f.write(f"{stack} {count}\n")
+            total = sum(self.samples.values())
+            own, inclusive = Counter(), Counter()
+            for stack, count in self.samples.items():
+                frames = stack.split(";")[1:]
+                if frames:
+                    own[frames[-1]] += count
+                for name in set(frames):
+                    inclusive[name] += count
+            lines += ["", f"Hotspots by own samples ({total} samples, {SAMPLE_INTERVAL * 1000:g} ms interval):"]
+            lines += [f"  {n / total:6.1%}  {name}" for name, n in own.most_common(TOP_N)]
+            lines += ["", "Hotspots by inclusive samples:"]
+            lines += [f"  {n / total:6.1%}  {name}" for name, n in inclusive.most_common(TOP_N)]
+
+        for stage, stats in sorted(self.pstats.items()):
+            safe = "".join(c if c.isalnum() or c in "-_" else "_" for c in stage)
+            stats.dump_stats(os.path.join(out_dir, f"{safe}.pstats"))
+            lines += ["", f"cProfile {stage} (own time, exclusive of nested stages):"]
+            rows = sorted(stats.stats.items(), key=lambda kv: kv[1][2], reverse=True)[:TOP_N]
+            for (filename, line, func), (_, calls, own_time, cumulative, _) in rows:
+                lines.append(f"  {own_time:9.3f}s own {cumulative:9.3f}s cum {calls:>9} calls  "
+                             f"{func} ({os.path.basename(filename)}:{line})")
+
+        for stage, entry in sorted(self.mem.items()):
+            lines += ["", f"Memory {stage}: net {entry['net'] / 2**20:+.1f} MB, "
+                          f"peak {entry['peak'] / 2**20:.1f} MB above stage start"]
+            lines += [f"  {size / 2**20:8.2f} MB  {site}" for site, size in entry["sites"].most_common(TOP_N)]
+
+        with open(os.path.join(out_dir, "summary.txt"), "w") as f:
+            f.write("\n".join(lines) + "\n")
+        print(f"🔬 Profile written to {out_dir}/", flush=True)
+        return out_dir
+
+
+def _job(argv0):
+    return os.path.splitext(os.path.basename(argv0 or ""))[0].replace(" ", "_") or "python"
+
+
+def start(modes=None, job=None):
+    """Start profiling this process (idempotent); output is written at exit."""
+    global _session
+    if _session is not None:
+        return _session
+    modes = parse_modes(modes if modes is not None else os.getenv("NOISE_PROFILE"))
+    if not modes:
+        return None
+    import pipeline_metrics
+    _session = ProfileSession(modes, job or _job(sys.argv[0]))
+    _session.start()
+    pipeline_metrics.set_profiler(_session)
+    atexit.register(stop)
+    return _session
+
+
+def stop():
+    global _session
+    session, _session = _session, None
+    if session is None:
+        return None
+    import pipeline_metrics
+    pipeline_metrics.set_profiler(None)
+    return session.finish()
+
+
+def add_argument(parser):
+    parser.add_argument("--profile", metavar="MODES", default=os.getenv("NOISE_PROFILE"),
+                        help=f"profile this run ({', '.join(MODES)}; comma separated)")
+
+
+def from_args(args):
+    if getattr(args, "profile", None):
+        start(args.profile)
+
+
+# ===== MAIN =====
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a script under the stage profiler")
+    parser.add_argument("--mode", default="sample", help=f"{', '.join(MODES)}; comma separated")
+    parser.add_argument("script")
+    parser.add_argument("args", nargs=argparse.REMAINDER)
+    args = parser.parse_args()
+
+    script = os.path.abspath(args.script)
+    sys.argv = [script] + args.args
+    sys.path.insert(0, os.path.dirname(script))
+    start(args.mode, _job(script))
+    try:
+        runpy.run_path(script, run_name="__main__")
+    finally:
+        stop()
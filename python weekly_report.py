@@ -5,6 +5,7 @@ import matplotlib.pyplot as plt
 from influxdb_client import InfluxDBClient
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image
 from reportlab.lib.styles import getSampleStyleSheet
+from downsample import downsample, points_for_width
 
 # 🔧 InfluxDB setup
 INFLUX_URL = os.getenv("INFLUX_URL")
@@ -39,20 +40,20 @@ from(bucket: "{INFLUX_BUCKET}")
 client = InfluxDBClient(url=INFLUX_URL, token=INFLUX_TOKEN, org=INFLUX_ORG)
 tables = client.query_api().query(query)
 
-# convert to Python dicts
-data = {"_time": [], "LAeq": [], "LAmax": [], "LAmin": []}
+# convert to Python dicts: field -> (times, values)
+data = {"LAeq": ([], []), "LAmax": ([], []), "LAmin": ([], [])}
 for table in tables:
     for record in table.records:
         if record["_field"] in data:
-            data["_time"].append(record["_time"])
-            data[record["_field"]].append(record["_value"])
+            data[record["_field"]][0].append(record["_time"])
+            data[record["_field"]][1].append(record["_value"])
 
 # --- Make chart ---
 plt.figure(figsize=(10, 4))
-if data["_time"]:
-    plt.plot(data["_time"], data["LAeq"], label="LAeq")
-    plt.plot(data["_time"], data["LAmax"], label="LAmax")
-    plt.plot(data["_time"], data["LAmin"], label="LAmin")
+if any(times for times, _ in data.values()):
+    for field, (times, values) in data.items():
+        if times:
+            plt.plot(*downsample(times, values, points_for_width(10)), label=field)
     plt.legend()
     plt.title(f"Noise levels sensor {SENSOR_ID}")
     plt.xlabel("Time")
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""Persistent cache for Flux query results.
+
+Wraps query_api.query_data_frame. The cache key is the SHA-1 of the
+normalized query text (comments dropped, whitespace collapsed, range()
+bounds rewritten as canonical UTC timestamps), so the same bucket, range
+and filters hit the same entry however the script formatted them.
+
+    closed   range stop <= start of the last complete ingest day: kept
+             for CLOSED_TTL, or until ingest rewrites a day in its range
+    open     anything newer, or relative ranges (-7d, now()): kept for TTL
+
+Closed ranges still change when bulk_import, the sharded backfill or a
+replay rewrites history, so every ingested day is noted in ingest_log
+(noise_ingest calls note_ingest) and a closed entry created before a write
+to a day of its range is dropped. The ingest and report workflows share
+that log through the Actions cache; CLOSED_TTL bounds staleness from
+writers that do not. Empty results are never cached.
+
+Results are stored as compressed columnar files under CACHE_DIR
+(parquet when pyarrow/fastparquet is installed, gzip pickle otherwise)
+next to a small JSON entry. When the total size exceeds MAX_BYTES the
+least recently used entries are evicted.
+
+Usage:
+    from query_cache import cached_query_data_frame
+    df = cached_query_data_frame(client.query_api(), query)
+
+    python query_cache.py stats | clear
+
+QUERY_CACHE_DIR=off disables caching.
+"""
+import os
+import re
+import glob
+import json
+import time
+import atexit
+import hashlib
+import argparse
+import datetime
+import pandas as pd
+import ingest_log
+import pipeline_metrics as metrics
+
+# ===== SETTINGS =====
+CACHE_DIR = os.getenv("QUERY_CACHE_DIR", os.path.join(".cache", "flux"))
+OPEN_TTL_SECONDS = int(os.getenv("QUERY_CACHE_TTL", 15 * 60))
+CLOSED_TTL_SECONDS = int(os.getenv("QUERY_CACHE_CLOSED_TTL", 7 * 24 * 3600))
+MAX_BYTES = int(os.getenv("QUERY_CACHE_MAX_MB", 512)) * 1024 * 1024
+SETTLE_DAYS = 1          # yesterday is the last day the daily backfill completes
+
+_COMMENT = re.compile(r"//[^\n]*")
+_RANGE = re.compile(r"range\(\s*start:\s*([^,\)]+?)\s*(?:,\s*stop:\s*([^\)]+?)\s*)?\)")
+
+
+# ===== FUNCTIONS =====
+def _parquet_engine():
+    for module in ("pyarrow", "fastparquet"):
+        try:
+            __import__(module)
+            return module
+        except ImportError:
+            continue
+    return None
+
+
+def _canonical_time(value):
+    """Absolute Flux time literal -> canonical UTC string; relative ones unchanged."""
+    value = value.strip().strip('"')
+    try:
+        ts = pd.Timestamp(value)
+    except ValueError:
+        return value, None
+    ts = ts.tz_localize("UTC") if ts.tzinfo is None else ts.tz_convert("UTC")
+    return ts.strftime("%Y-%m-%dT%H:%M:%SZ"), ts
+
+
+def normalize(query):
+    """(normalized text, start timestamp or None, stop timestamp or None) for a Flux query."""
+    text = " ".join(_COMMENT.sub("", query).split())
+    start_ts = stop_ts = None
+
+    def canonical_range(match):
+        nonlocal start_ts, stop_ts
+        start, start_ts = _canonical_time(match.group(1))
+        if match.group(2) is None:
+            return f"range(start: {start})"
+        stop, stop_ts = _canonical_time(match.group(2))
+        return f"range(start: {start}, stop: {stop})"
+
+    return _RANGE.sub(canonical_range, text), start_ts, stop_ts
+
+
+def closed_before(now=None):
+    """Ranges that stop at or before this UTC time are immutable."""
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    midnight = pd.Timestamp(now).tz_convert("UTC").normalize()
+    return midnight - pd.Timedelta(days=SETTLE_DAYS)
+
+
+class QueryCache:
+    def __init__(self, path=CACHE_DIR, ttl=OPEN_TTL_SECONDS, max_bytes=MAX_BYTES,
+                 closed_ttl=CLOSED_TTL_SECONDS):
+        self.path = path
+        self.ttl = ttl
+        self.closed_ttl = closed_ttl
+        self._writes, self._writes_read = None, 0.0
+        self.max_bytes = max_bytes
+        self.engine = _parquet_engine()
+        self.stats = {"hits": 0, "misses": 0, "expired": 0, "evicted": 0}
+
+    def _entry_path(self, key):
+        return os.path.join(self.path, f"{key}.json")
+
+    def _part_path(self, key, i):
+        ext = "parquet" if self.engine else "pkl.gz"
+        return os.path.join(self.path, f"{key}.{i}.{ext}")
+
+    def key(self, query):
+        text, start, stop = normalize(query)
+        closed = stop is not None and stop <= closed_before()
+        days = [start.strftime("%Y-%m-%d"), stop.strftime("%Y-%m-%d")] if closed and start is not None else None
+        return hashlib.sha1(text.encode()).hexdigest(), text, closed, days
+
+    def _stale(self, entry):
+        age = time.time() - entry["created"]
+        if not entry["closed"]:
+            return age > self.ttl
+        if age > self.closed_ttl:
+            return True
+        days = entry.get("days")
+        if not days:
+            return False
+        if self._writes is None or time.time() - self._writes_read > 60:
+            self._writes, self._writes_read = ingest_log.writes(), time.time()
+        return any(days[0] <= day <= days[1] and stamp > entry["created"]
+                   for day, stamp in self._writes.items())
+
+    def get(self, key):
+        entry_path = self._entry_path(key)
+        if not os.path.exists(entry_path):
+            return None
+        with open(entry_path) as f:
+            entry = json.load(f)
+        if self._stale(entry):
+            self.stats["expired"] += 1
+            return None
+        try:
+            parts = [self._read(p) for p in entry["parts"]]
+        except (OSError, ValueError):
+            return None
+        os.utime(entry_path)                       # mtime = last use, for LRU eviction
+        return parts if entry["list"] else parts[0]
+
+    def _read(self, path):
+        if path.endswith(".parquet"):
+            return pd.read_parquet(path, engine=self.engine)
+        return pd.read_pickle(path, compression="gzip")
+
+    def _write(self, df, path):
+        if self.engine:
+            df.to_parquet(path, engine=self.engine, compression="gzip")
+        else:
+            df.to_pickle(path, compression="gzip")
+
+    def put(self, key, text, closed, result, days=None):
+        frames = result if isinstance(result, list) else [result]
+        if all(df.empty for df in frames):
+            return False                         # maybe not ingested yet: ask again next time
+        os.makedirs(self.path, exist_ok=True)
+        parts = []
+        for i, df in enumerate(frames):
+            path = self._part_path(key, i)
+            self._write(df, path)
+            parts.append(path)
+        entry = {
+            "query": text,
+            "closed": closed,
+            "days": days,
+            "created": time.time(),
+            "list": isinstance(result, list),
+            "parts": parts,
+            "bytes": sum(os.path.getsize(p) for p in parts),
+        }
+        tmp = self._entry_path(key) + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(entry, f)
+        os.replace(tmp, self._entry_path(key))
+        self.evict()
+        return True
+
+    def entries(self):
+        """[(last used, bytes, entry path, entry)] for every cached result."""
+        found = []
+        for entry_path in glob.glob(os.path.join(self.path, "*.json")):
+            try:
+                with open(entry_path) as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                continue
+            found.append((os.path.getmtime(entry_path), entry["bytes"], entry_path, entry))
+        return found
+
+    def _remove(self, entry_path, entry):
+        for part in entry["parts"]:
+            if os.path.exists(part):
+                os.remove(part)
+        os.remove(entry_path)
+
+    def evict(self):
+        """Drop least recently used entries until the cache fits in max_bytes."""
+        entries = sorted(self.entries(), key=lambda e: e[0])
+        total = sum(e[1] for e in entries)
+        for _, size, entry_path, entry in entries:
+            if total <= self.max_bytes:
+                break
+            self._remove(entry_path, entry)
+            total -= size
+            self.stats["evicted"] += 1
+
+    def clear(self):
+        for _, _, entry_path, entry in self.entries():
+            self._remove(entry_path, entry)
+
+    def query_data_frame(self, query_api, query):
+        key, text, closed, days = self.key(query)
+        result = self.get(key)
+        if result is not None:
+            self.stats["hits"] += 1
+            metrics.inc("flux_cache_total", result="hit")
+            return result
+        self.stats["misses"] += 1
+        metrics.inc("flux_cache_total", result="miss")
+        result = query_api.query_data_frame(query)
+        self.put(key, text, closed, result, days)
+        return result
+
+    def report(self):
+        s = self.stats
+        if s["hits"] or s["misses"]:
+            print(f"🗃️ Flux cache: {s['hits']} hits, {s['misses']} misses, "
+                  f"{s['expired']} expired, {s['evicted']} evicted", flush=True)
+
+
+_cache = None
+
+
+def default_cache():
+    global _cache
+    if _cache is None and CACHE_DIR != "off":
+        _cache = QueryCache()
+        atexit.register(_cache.report)
+    return _cache
+
+
+def cached_query_data_frame(query_api, query):
+    """Drop-in for query_api.query_data_frame(query) backed by the default cache."""
+    cache = default_cache()
+    if cache is None:
+        return query_api.query_data_frame(query)
+    return cache.query_data_frame(query_api, query)
+
+
+# ===== MAIN =====
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Flux query result cache")
+    parser.add_argument("command", choices=["stats", "clear"])
+    args = parser.parse_args()
+
+    cache = QueryCache()
+    if args.command == "clear":
+        cache.clear()
+        print(f"🧹 Cleared {cache.path}/")
+    else:
+        entries = cache.entries()
+        closed = sum(1 for e in entries if e[3]["closed"])
+        size = sum(e[1] for e in entries)
+        print(f"📊 {len(entries)} entries ({closed} closed, {len(entries) - closed} open), "
+              f"{size / 1024 / 1024:.1f} MB of {cache.max_bytes / 1024 / 1024:.0f} MB in {cache.path}/")
@@ -0,0 +1,143 @@
+"""Central sensor list plus per-sensor liveness state.
+
+Every ingest and report script takes its sensors from here instead of a
+hard-coded list. State is kept in a small JSON file:
+
+    {"94695": {"last_data_day": "2025-10-12", "misses": 0,
+               "typical_rows": 1438.2, "last_probe_day": "2025-10-12"}, ...}
+
+A sensor that has missed DEAD_AFTER days in a row is considered dead and
+is only probed with exponential backoff (1, 2, 4 ... MAX_PROBE_INTERVAL
+days) instead of every run, so the daily work scales with live sensors.
+
+Several jobs probe overlapping days (daily backfill, last week, the 30-day
+replay), so outcomes only count for days newer than what is already
+known: a miss counts once per day after `last_probe_day`, and only data
+newer than `last_data_day` resets the misses. Re-probing an old day
+neither kills a live sensor nor revives a dead one.
+"""
+import os
+import json
+import datetime
+
+# ===== SETTINGS =====
+# Every laerm_sensor we have ever followed in Rotterdam centrum
+SENSOR_IDS = [
+    93868, 94284, 94447, 94448, 94449, 94686, 94687, 94688, 94689,
+    94692, 94693, 94695, 94696, 94701, 94735, 95432, 95482, 95483,
+    95484, 95485, 95486, 95487, 95488, 95489, 95490, 95491, 95492,
+    95493, 95494, 95495, 89747
+]
+
+# Sensors known to be live when no state file exists yet
+DEFAULT_LIVE = [
+    89747, 94284, 94735, 94449, 94687, 94448, 94693, 94701,
+    95492, 95490, 95484, 94695
+]
+
+STATE_PATH = os.getenv("SENSOR_STATE_PATH", "sensor_state.json")
+DEAD_AFTER = 3             # consecutive empty days before a sensor is "dead"
+MAX_PROBE_INTERVAL = 32    # days between probes of a long-dead sensor
+ROWS_SMOOTHING = 0.2       # EWMA weight of the newest day in typical_rows
+
+
+# ===== FUNCTIONS =====
+def _as_date(day):
+    if isinstance(day, str):
+        return datetime.date.fromisoformat(day)
+    return day
+
+
+def _initial_entry(sensor_id):
+    return {
+        "last_data_day": None,
+        "misses": 0 if sensor_id in DEFAULT_LIVE else DEAD_AFTER,
+        "typical_rows": None,
+        "last_probe_day": None,
+    }
+
+
+def load_state(path=STATE_PATH):
+    state = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            state = json.load(f)
+    for sensor_id in SENSOR_IDS:
+        state.setdefault(str(sensor_id), _initial_entry(sensor_id))
+    return state
+
+
+def save_state(state, path=STATE_PATH):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def is_live(entry):
+    return entry["misses"] < DEAD_AFTER
+
+
+def probe_interval(entry):
+    """Days to wait between probes; 1 for live sensors."""
+    if is_live(entry):
+        return 1
+    return min(2 ** (entry["misses"] - DEAD_AFTER), MAX_PROBE_INTERVAL)
+
+
+def is_due(entry, day):
+    if is_live(entry) or entry["last_probe_day"] is None:
+        return True
+    day = _as_date(day)
+    last_probe = _as_date(entry["last_probe_day"])
+    if day <= last_probe:
+        # Already probed up to here: only the days it still had data are worth fetching
+        return entry["last_data_day"] is not None and day <= _as_date(entry["last_data_day"])
+    return (day - last_probe).days >= probe_interval(entry)
+
+
+def sensors_due(state, day):
+    """Sensors worth fetching for `day`: all live ones plus dead ones due for a probe."""
+    return [int(s) for s, entry in state.items() if is_due(entry, day)]
+
+
+def live_sensors(state):
+    return [int(s) for s, entry in state.items() if is_live(entry)]
+
+
+def record(state, sensor_id, day, rows):
+    """Record the outcome of fetching one sensor-day (`rows` = CSV rows found)."""
+    entry = state.setdefault(str(sensor_id), _initial_entry(int(sensor_id)))
+    day_str = _as_date(day).isoformat()
+    newest_probe = entry["last_probe_day"]
+    if newest_probe is None or day_str > newest_probe:
+        entry["last_probe_day"] = day_str
+    if rows > 0:
+        if entry["last_data_day"] is None or day_str > entry["last_data_day"]:
+            entry["last_data_day"] = day_str
+            entry["misses"] = 0
+            if entry["typical_rows"] is None:
+                entry["typical_rows"] = float(rows)
+            else:
+                entry["typical_rows"] = round(
+                    (1 - ROWS_SMOOTHING) * entry["typical_rows"] + ROWS_SMOOTHING * rows, 1
+                )
+    elif newest_probe is None or day_str > newest_probe:
+        entry["misses"] += 1
+
+
+def summary(state):
+    live = live_sensors(state)
+    return f"{len(live)} live / {len(state) - len(live)} dead sensors"
+
+
+# ===== MAIN =====
+if __name__ == "__main__":
+    state = load_state()
+    today = datetime.date.today()
+    print(f"📡 Sensor registry ({STATE_PATH}): {summary(state)}")
+    for sensor_id, entry in sorted(state.items()):
+        status = "✅ live" if is_live(entry) else f"💤 dead, probe every {probe_interval(entry)}d"
+        due = "due" if is_due(entry, today) else "skip"
+        print(f"  {sensor_id}: {status:<28} last data {entry['last_data_day']}, "
+              f"misses {entry['misses']}, ~{entry['typical_rows']} rows/day [{due}]")
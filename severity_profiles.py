@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""Weekday x hour severity profiles for every sensor and trimester in one run.
+
+Replaces the one-sensor, one-period-per-run workflow that produced the
+reports/sensor_<id>_<year>_T<n>_SEVERITY_24x7.png files:
+
+  1. one Flux query returns hourly LAmax/LAmin means for all sensors for
+     the whole year,
+  2. a single vectorized pass accumulates a
+     (sensor x trimester x weekday x hour) cube of Combined Severity
+     (LAmax + LAmin) / 2,
+  3. every (sensor, trimester) panel is rendered in a process pool.
+
+Usage:
+    python severity_profiles.py 2025 [--sensors 94695,89747] [--workers 4]
+"""
+import os
+import shutil
+import argparse
+import numpy as np
+import pandas as pd
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+from concurrent.futures import ProcessPoolExecutor
+from matplotlib.colors import LinearSegmentedColormap, Normalize
+import sensor_registry
+import pipeline_metrics as metrics
+import profiling
+
+# ===== SETTINGS =====
+REPORTS_DIR = "reports"
+TIMEZONE = "Europe/Amsterdam"
+
+INFLUX_URL = os.getenv("INFLUX_URL")
+INFLUX_TOKEN = os.getenv("INFLUX_TOKEN")
+INFLUX_ORG = os.getenv("INFLUX_ORG")
+INFLUX_BUCKET = os.getenv("INFLUX_BUCKET", "noise_data")
+
+# Combined limits in dB(A)
+DAY_LIMIT = 60.0       # 07-19
+EVENING_LIMIT = 55.0   # 19-23
+NIGHT_LIMIT = 50.0     # 23-07
+
+# Colour = dB above the limit: 0 green, 5 yellow, 10 red, 15+ dark red
+EXCESS_MAX = 15.0
+SEVERITY_CMAP = LinearSegmentedColormap.from_list(
+    "severity_gradient",
+    [(0.0, "#2ecc71"), (5 / 15, "#f1c40f"), (10 / 15, "#e74c3c"), (1.0, "#8b0000")]
+)
+
+WEEKDAYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+TRIMESTERS = 4
+
+
+# ===== FUNCTIONS =====
+def hour_limits():
+    limits = np.full(24, NIGHT_LIMIT)
+    limits[7:19] = DAY_LIMIT
+    limits[19:23] = EVENING_LIMIT
+    return limits
+
+
+def fetch_hourly_range(start_iso, stop_iso, fields=("LAmax", "LAmin")):
+    """Hourly means of `fields` for every sensor in [start, stop) (one query)."""
+    from influxdb_client import InfluxDBClient
+    from query_cache import cached_query_data_frame
+
+    field_filter = " or ".join(f'r._field == "{f}"' for f in fields)
+    columns = ", ".join(f'"{c}"' for c in ("_time", "sensor_id") + tuple(fields))
+    query = f'''
+from(bucket: "{INFLUX_BUCKET}")
+  |> range(start: {start_iso}, stop: {stop_iso})
+  |> filter(fn: (r) => r._measurement == "noise" and ({field_filter}))
+  |> aggregateWindow(every: 1h, fn: mean, createEmpty: false, timeSrc: "_start")
+  |> pivot(rowKey: ["_time"], columnKey: ["_field"], valueColumn: "_value")
+  |> keep(columns: [{columns}])
+'''
+    with InfluxDBClient(url=INFLUX_URL, token=INFLUX_TOKEN, org=INFLUX_ORG) as client, \
+            metrics.timer("query", source="influx"):
+        tables = cached_query_data_frame(client.query_api(), query)
+    if isinstance(tables, list):
+        tables = pd.concat(tables) if tables else pd.DataFrame()
+    if tables.empty:
+        return tables
+    return tables.rename(columns={"_time": "timestamp"})
+
+
+def fetch_hourly(year):
+    """Hourly LAmax/LAmin means for every sensor in `year`."""
+    return fetch_hourly_range(f"{year}-01-01T00:00:00Z", f"{year + 1}-01-01T00:00:00Z")
+
+
+def accumulate(df, sensor_ids):
+    """One pass over hourly rows -> mean severity cube (sensor, trimester, weekday, hour)."""
+    shape = (len(sensor_ids), TRIMESTERS, 7, 24)
+    sums = np.zeros(shape)
+    counts = np.zeros(shape)
+
+    index = {str(s): i for i, s in enumerate(sensor_ids)}
+    sensor_idx = df["sensor_id"].astype(str).map(index)
+    local = pd.to_datetime(df["timestamp"], utc=True).dt.tz_convert(TIMEZONE)
+    severity = (df["LAmax"].to_numpy(dtype=float) + df["LAmin"].to_numpy(dtype=float)) / 2
+
+    ok = sensor_idx.notna().to_numpy() & ~np.isnan(severity)
+    coords = (
+        sensor_idx.to_numpy()[ok].astype(int),
+        ((local.dt.month.to_numpy() - 1) // 3)[ok],
+        local.dt.weekday.to_numpy()[ok],
+        local.dt.hour.to_numpy()[ok],
+    )
+    np.add.at(sums, coords, severity[ok])
+    np.add.at(counts, coords, 1)
+    with np.errstate(invalid="ignore"):
+        return sums / counts
+
+
+def render_profile(sensor_id, year, trimester, profile, out_path, nested_path=None):
+    """Render one 24x7 panel (`profile` is weekday x hour)."""
+    grid = profile.T                                  # rows = hour, cols = weekday
+    excess = grid - hour_limits()[:, None]
+    norm = Normalize(vmin=0, vmax=EXCESS_MAX, clip=True)
+    label = f"{year}_T{trimester}"
+
+    fig, ax = plt.subplots(figsize=(10, 8))
+    ax.imshow(np.ma.masked_invalid(excess), cmap=SEVERITY_CMAP, norm=norm, aspect="auto",
+              interpolation="nearest")
+    for h, d in zip(*np.nonzero(~np.isnan(grid))):
+        ax.text(d, h, f"{grid[h, d]:.1f}", ha="center", va="center", fontsize=8)
+    ax.set_xticks(range(7), WEEKDAYS)
+    ax.set_yticks(range(24), [f"{h:02d}" for h in range(24)])
+    ax.set_xlabel("Weekday (Mon → Sun)")
+    ax.set_ylabel("Hour of day (00–23)")
+    ax.set_title(f"Sensor {sensor_id} — {label} — Combined Severity (LAmax+LAmin)/2 — gradient vs threshold")
+    fig.text(
+        0.67, 0.5,
+        f"TZ: {TIMEZONE}\n\n"
+        "Combined Severity = (LAmax + LAmin) / 2\n"
+        "Color = how far above the limit (smooth gradient)\n\n"
+        "Combined limits (dB(A)):\n"
+        f"Day (07–19): {DAY_LIMIT:.1f}\nEvening (19–23): {EVENING_LIMIT:.1f}\nNight (23–07): {NIGHT_LIMIT:.1f}\n\n"
+        "Gradient anchors (relative to the limit):\n"
+        "At the limit → green\n~5 dB above → yellow\n~10 dB above → red\nMuch higher → dark red",
+        va="center", fontsize=9,
+    )
+    fig.subplots_adjust(left=0.06, right=0.65, top=0.95, bottom=0.08)
+    fig.savefig(out_path, dpi=200)
+    plt.close(fig)
+    if nested_path:
+        os.makedirs(os.path.dirname(nested_path), exist_ok=True)
+        shutil.copyfile(out_path, nested_path)
+    return out_path
+
+
+def render_all(cube, sensor_ids, year, workers=None, nested=True):
+    """Render every (sensor, trimester) panel that has data, in parallel."""
+    jobs = []
+    for i, sensor_id in enumerate(sensor_ids):
+        for t in range(TRIMESTERS):
+            profile = cube[i, t]
+            if np.isnan(profile).all():
+                continue
+            label = f"{year}_T{t + 1}"
+            out_path = os.path.join(REPORTS_DIR, f"sensor_{sensor_id}_{label}_SEVERITY_24x7.png")
+            nested_path = os.path.join(REPORTS_DIR, f"sensor_{sensor_id}", label,
+                                       "COMBINED_SEVERITY_GRADIENT_24x7.png") if nested else None
+            jobs.append((sensor_id, year, t + 1, profile, out_path, nested_path))
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(render_profile, *job) for job in jobs]
+        for future in futures:
+            print(f"✅ Saved {future.result()}", flush=True)
+    return len(jobs)
+
+
+# ===== MAIN =====
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="24x7 severity profiles for all sensors and trimesters")
+    parser.add_argument("year", type=int)
+    parser.add_argument("--sensors", help="comma separated ids (default: all registry sensors)")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--no-nested", action="store_true",
+                        help="skip reports/sensor_<id>/<year>_T<n>/ copies")
+    profiling.add_argument(parser)
+    args = parser.parse_args()
+    profiling.from_args(args)
+
+    sensor_ids = [int(s) for s in args.sensors.split(",")] if args.sensors else sensor_registry.SENSOR_IDS
+    os.makedirs(REPORTS_DIR, exist_ok=True)
+
+    print(f"🚀 Building {args.year} severity profiles for {len(sensor_ids)} sensors", flush=True)
+    df = fetch_hourly(args.year)
+    if df.empty:
+        print(f"⚠️ No data for {args.year}")
+    else:
+        with metrics.timer("aggregate"):
+            cube = accumulate(df, sensor_ids)
+        with metrics.timer("render"):
+            n = render_all(cube, sensor_ids, args.year, args.workers, nested=not args.no_nested)
+        print(f"🎉 {n} profiles rendered in {REPORTS_DIR}/")
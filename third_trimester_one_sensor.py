@@ -2,11 +2,11 @@
 import os
 import pandas as pd
 import matplotlib.pyplot as plt
-import seaborn as sns
 from datetime import datetime, timedelta
 from influxdb_client import InfluxDBClient
-from matplotlib.colors import LinearSegmentedColormap, PowerNorm
 from matplotlib.backends.backend_pdf import PdfPages
+from heatmap_render import plot_heatmap
+import pipeline_metrics as metrics
 
 # ===== SETTINGS =====
 REPORTS_DIR = "reports"
@@ -74,25 +74,15 @@ def build_heatmap(df, sensor_id, start_date, end_date):
 
     adjusted_pivot = pivot.add(adj_map, axis=1)
 
-    # Color map and normalization
-    cmap = LinearSegmentedColormap.from_list(
-        "noise_levels", ["gray", "green", "yellow", "red", "darkred", "black"]
-    )
-    norm = PowerNorm(gamma=2.5, vmin=0, vmax=80)
-
-    # Plot heatmap
-    plt.figure(figsize=(12, 6))
-    ax = sns.heatmap(
+    # Plot heatmap (one image; 92 x 24 cells are too many for per-cell numbers)
+    fig, ax = plot_heatmap(
+        pivot.T,
         adjusted_pivot.T,
-        annot=pivot.T,
-        fmt=".0f",
-        cmap=cmap,
-        norm=norm,
-        cbar_kws={'label': f'Avg {FIELD} dB(A)'},
-        linewidths=.5
+        figsize=(12, 6),
+        cbar_label=f'Avg {FIELD} dB(A)',
+        col_labels=[d.strftime("%a %d") for d in pivot.index]
     )
-    ax.set_yticklabels(hour_order)
-    ax.set_xticklabels([d.strftime("%a %d") for d in pivot.index], rotation=45)
+    ax.tick_params(axis="x", rotation=45)
     plt.ylabel("Hour of day (07 → 07)")
     plt.xlabel("Date")
     plt.title(f"Hourly Average Max Noise Heatmap ({FIELD})\nSensor {sensor_id} {start_date.date()} → {end_date.date()}")
@@ -107,6 +97,8 @@ def build_heatmap(df, sensor_id, start_date, end_date):
 
 # ===== MAIN =====
 if __name__ == "__main__":
-    df = fetch_sensor_data(SENSOR_ID, START_DATE, END_DATE)
+    with metrics.timer("query", sensor=SENSOR_ID):
+        df = fetch_sensor_data(SENSOR_ID, START_DATE, END_DATE)
     if df is not None:
-        build_heatmap(df, SENSOR_ID, START_DATE, END_DATE)
+        with metrics.timer("render", sensor=SENSOR_ID):
+            build_heatmap(df, SENSOR_ID, START_DATE, END_DATE)
@@ -1,10 +1,10 @@
 import os
 import pytz
-import pandas as pd
 from datetime import datetime, timedelta
-from influxdb_client import InfluxDBClient
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_pdf import PdfPages
+from downsample import downsample_frame, points_for_width
+from data_sources import default_router
 
 # -----------------------
 # Config
@@ -12,11 +12,6 @@ from matplotlib.backends.backend_pdf import PdfPages
 SENSOR_ID = "89747"
 TZ = pytz.timezone("Europe/Amsterdam")
 
-INFLUX_URL = os.getenv("INFLUX_URL")
-INFLUX_TOKEN = os.getenv("INFLUX_TOKEN")
-INFLUX_ORG = os.getenv("INFLUX_ORG")
-INFLUX_BUCKET = os.getenv("INFLUX_BUCKET")
-
 # -----------------------
 # Time range: Monday → Friday
 # -----------------------
@@ -30,26 +25,16 @@ end_time = friday.strftime("%Y-%m-%dT00:00:00Z")
 print(f"Generating report for {SENSOR_ID} from {start_time} to {end_time}")
 
 # -----------------------
-# Query InfluxDB
+# Read raw samples (Influx, or the archive when Influx is incomplete)
 # -----------------------
-query = f"""
-from(bucket: "{INFLUX_BUCKET}")
-  |> range(start: {start_time}, stop: {end_time})
-  |> filter(fn: (r) => r["_measurement"] == "noise")
-  |> filter(fn: (r) => r["sensor_id"] == "{SENSOR_ID}")
-  |> pivot(rowKey:["_time"], columnKey: ["_field"], valueColumn: "_value")
-  |> keep(columns: ["_time", "LAeq", "LAmax", "LAmin"])
-"""
-
-client = InfluxDBClient(url=INFLUX_URL, token=INFLUX_TOKEN, org=INFLUX_ORG)
-tables = client.query_api().query_data_frame(query=query)
+tables = default_router().read([SENSOR_ID], monday, friday, "raw")
 
 if tables.empty:
     print("No data found for this period.")
     exit(0)
 
-df = tables.copy()
-df["_time"] = pd.to_datetime(df["_time"]).dt.tz_convert(TZ)
+df = tables.drop(columns="sensor_id")
+df["_time"] = df.pop("timestamp").dt.tz_convert(TZ)
 df.set_index("_time", inplace=True)
 
 # -----------------------
@@ -59,11 +44,12 @@ os.makedirs("reports", exist_ok=True)
 pdf_path = f"reports/weekly_report_{SENSOR_ID}.pdf"
 
 with PdfPages(pdf_path) as pdf:
-    # --- Page 1: time series
+    # --- Page 1: time series, reduced to what 11 inches can show
     plt.figure(figsize=(11, 6))
-    plt.plot(df.index, df["LAeq"], label="LAeq")
-    plt.plot(df.index, df["LAmax"], label="LAmax", alpha=0.7)
-    plt.plot(df.index, df["LAmin"], label="LAmin", alpha=0.7)
+    series = downsample_frame(df, ["LAeq", "LAmax", "LAmin"], points_for_width(11))
+    plt.plot(*series["LAeq"], label="LAeq")
+    plt.plot(*series["LAmax"], label="LAmax", alpha=0.7)
+    plt.plot(*series["LAmin"], label="LAmin", alpha=0.7)
     plt.title(f"Noise levels for sensor {SENSOR_ID} (Mon–Fri)")
     plt.xlabel("Time")
     plt.ylabel("dB(A)")
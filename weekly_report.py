@@ -1,25 +1,37 @@
 #!/usr/bin/env python3
+"""Weekly LAmax heatmap per live sensor, built as a staged pipeline.
 
+    fetch (threads) -> aggregate (thread) -> render (process pool)
+
+Bounded queues between the stages give backpressure, so a slow render
+pool throttles the fetchers instead of piling up data. Each stage
+records its busy time; with enough sensors the wall time approaches the
+slowest stage instead of the sum of all of them.
+"""
 import os
-import io
-import requests
+import time
+import queue
+import threading
 import pandas as pd
+import matplotlib
+matplotlib.use("Agg")
 import matplotlib.pyplot as plt
-import seaborn as sns
 import numpy as np
 from datetime import datetime, timedelta
-from matplotlib.colors import LinearSegmentedColormap, PowerNorm
+from concurrent.futures import ProcessPoolExecutor
+import sensor_registry
+from heatmap_render import plot_heatmap
+from data_sources import default_router
+from data_quality import bad_days, exclude_bad_days
+import pipeline_metrics as metrics
 
 # ===== SETTINGS =====
-SENSOR_IDS = [
-    89747, 94284, 94735, 94449, 94687, 94448, 94693, 94284, 94701,
-    95492, 95490, 95484, 94695
-]
-
 REPORTS_DIR = "reports"
-ARCHIVE_URL = "https://archive.sensor.community"
 DAY_THRESHOLD = 65
 NIGHT_THRESHOLD = 50
+FETCH_WORKERS = 4        # concurrent source reads (network bound)
+RENDER_WORKERS = None    # render processes (default: CPU count)
+QUEUE_SIZE = 4           # max items waiting between two stages
 # ====================
 
 os.makedirs(REPORTS_DIR, exist_ok=True)
@@ -32,44 +44,8 @@ def get_last_full_week():
     return last_monday, last_sunday
 
 
-def fetch_csv(date, sensor_id):
-    date_str = date.strftime("%Y-%m-%d")
-    url = f"{ARCHIVE_URL}/{date_str}/{date_str}_laerm_sensor_{sensor_id}.csv"
-    try:
-        r = requests.get(url, timeout=20)
-        if r.status_code != 200:
-            print(f"❌ No file for {date_str}")
-            return None
-        df = pd.read_csv(io.StringIO(r.text), sep=";")
-        return df
-    except Exception as e:
-        print(f"⚠️ Error fetching {url}: {e}")
-        return None
-
-
-def normalize_dataframe(df):
-    rename_map = {
-        "noise_LAeq": "LAeq",
-        "noise_LA_max": "LAmax",
-        "noise_LA_min": "LAmin",
-        "timestamp": "timestamp"
-    }
-    df = df.rename(columns=rename_map)
-    needed = ["timestamp", "LAeq", "LAmax", "LAmin"]
-    if not all(col in df.columns for col in needed):
-        return None
-    df = df[needed].copy()
-    df["timestamp"] = pd.to_datetime(df["timestamp"], errors="coerce")
-    df = df.dropna()
-    return df
-
-
-def build_report(sensor_id, df, start_date, end_date):
-    sensor_dir = os.path.join(REPORTS_DIR, str(sensor_id))
-    os.makedirs(sensor_dir, exist_ok=True)
-
-    # ---- Only Chart 2: Heatmap with LAmax (day 07:00 → 07:00 next) ----
-
+def aggregate_week(df):
+    """Hourly LAmax pivot (rows = 07:00 → 07:00 day) plus the colour-adjusted copy."""
     df["hour"] = df["timestamp"].dt.hour
     df["date"] = df["timestamp"].dt.date
 
@@ -98,51 +74,151 @@ def build_report(sensor_id, df, start_date, end_date):
     adj_map.loc[19:22] = 5     # 19–22
     adj_map.loc[list(range(23, 24)) + list(range(0, 7))] = 10  # 23–06
     adjusted_pivot = pivot.add(adj_map, axis=1)
+    return pivot, adjusted_pivot
 
-    # Plot heatmap
-    cmap = LinearSegmentedColormap.from_list(
-        "noise_levels", ["gray", "green", "yellow", "red", "darkred", "black"]
-    )
-    norm = PowerNorm(gamma=2.5, vmin=0, vmax=80)
 
-    plt.figure(figsize=(12, 6))
-    ax = sns.heatmap(
+def render_heatmap(sensor_id, pivot, adjusted_pivot, start_date, end_date):
+    """Draw and save one sensor's heatmap (runs in a render process)."""
+    started = time.perf_counter()
+    sensor_dir = os.path.join(REPORTS_DIR, str(sensor_id))
+    os.makedirs(sensor_dir, exist_ok=True)
+
+    # Plot heatmap
+    fig, ax = plot_heatmap(
+        pivot.T,
         adjusted_pivot.T,
-        annot=pivot.T,
-        fmt=".0f",
-        cmap=cmap,
-        norm=norm,
-        cbar_kws={'label': 'Avg LAmax dB(A)'},
-        linewidths=.5
+        figsize=(12, 6),
+        cbar_label='Avg LAmax dB(A)',
+        col_labels=[f"{d.strftime('%a %d')}" for d in pivot.index]
     )
-    ax.set_yticklabels(hour_order)
-    ax.set_xticklabels([f"{d.strftime('%a %d')}" for d in pivot.index], rotation=45)
+    ax.tick_params(axis="x", rotation=45)
     plt.ylabel("Hour of day (07 → 07)")
     plt.title(f"Average LAmax Heatmap – Sensor {sensor_id} ({start_date} → {end_date})")
     plt.tight_layout()
     plt.savefig(os.path.join(sensor_dir, "la_max_heatmap.png"))
     plt.close()
-
-    print(f"✅ Heatmap saved: {sensor_dir}/la_max_heatmap.png")
+    return f"{sensor_dir}/la_max_heatmap.png", time.perf_counter() - started
+
+
+class StageTimes:
+    """Busy seconds and item counts per pipeline stage (thread safe)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.busy = {}
+        self.items = {}
+
+    def add(self, stage, seconds):
+        with self._lock:
+            self.busy[stage] = self.busy.get(stage, 0.0) + seconds
+            self.items[stage] = self.items.get(stage, 0) + 1
+
+    def report(self, wall):
+        print(f"⏱️ Wall time {wall:.1f}s", flush=True)
+        for stage in ("fetch", "aggregate", "render"):
+            if stage in self.busy:
+                print(f"   {stage:<9} {self.busy[stage]:6.1f}s busy over {self.items[stage]} items", flush=True)
+
+
+def fetch_stage(router, sensors, ready, start_date, end_date, times, bad=frozenset()):
+    """Read hourly means per sensor; blocks on `ready` when aggregation lags."""
+    while True:
+        sensor_id = sensors.get()
+        if sensor_id is None:
+            return
+        started = time.perf_counter()
+        try:
+            # Hourly means are all the heatmap needs; the router picks cube, Influx or archive
+            df = router.read([sensor_id], start_date, end_date + timedelta(days=1), "1h")
+            df = exclude_bad_days(df, bad)      # days data_quality flagged at ingest
+        except Exception as e:
+            print(f"❌ Fetching sensor {sensor_id} failed: {e}", flush=True)
+            continue
+        times.add("fetch", time.perf_counter() - started)
+        ready.put((sensor_id, df))
+
+
+def aggregate_stage(ready, pool, slots, futures, start_date, end_date, times):
+    """Pivot each sensor-week and hand it to the render pool (at most `slots` in flight).
+
+    Keeps draining `ready` until the None sentinel even when a sensor fails,
+    so the fetchers never block on a full queue.
+    """
+    while True:
+        item = ready.get()
+        if item is None:
+            return
+        sensor_id, df = item
+        print(f"📅 Generating heatmap for sensor {sensor_id}: {start_date} → {end_date}", flush=True)
+        df = df.dropna(subset=["LAmax"])
+        if df.empty:
+            print(f"⚠️ No valid data for sensor {sensor_id}", flush=True)
+            continue
+        try:
+            started = time.perf_counter()
+            pivot, adjusted_pivot = aggregate_week(df.copy())
+            seconds = time.perf_counter() - started
+            times.add("aggregate", seconds)
+            metrics.observe("stage_seconds", seconds, stage="aggregate", sensor=sensor_id)
+            slots.acquire()
+            try:
+                future = pool.submit(render_heatmap, sensor_id, pivot, adjusted_pivot, start_date, end_date)
+            except Exception:
+                slots.release()
+                raise
+            future.add_done_callback(lambda f: slots.release())
+            futures.append((sensor_id, future))
+        except Exception as e:
+            print(f"❌ Aggregating sensor {sensor_id} failed: {e}", flush=True)
+
+
+def run_pipeline(sensor_ids, start_date, end_date, router=None):
+    router = router or default_router()
+    bad = bad_days(start_date, end_date)
+    times = StageTimes()
+    sensors = queue.Queue()
+    ready = queue.Queue(maxsize=QUEUE_SIZE)
+    futures = []
+    started = time.perf_counter()
+
+    render_workers = RENDER_WORKERS or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=render_workers) as pool:
+        slots = threading.BoundedSemaphore(render_workers + QUEUE_SIZE)
+        aggregator = threading.Thread(target=aggregate_stage,
+                                      args=(ready, pool, slots, futures, start_date, end_date, times))
+        aggregator.start()
+        fetchers = [threading.Thread(target=fetch_stage,
+                                     args=(router, sensors, ready, start_date, end_date, times, bad))
+                    for _ in range(min(FETCH_WORKERS, max(len(sensor_ids), 1)))]
+        for sensor_id in sensor_ids:
+            sensors.put(sensor_id)
+        for fetcher in fetchers:
+            sensors.put(None)
+            fetcher.start()
+        for fetcher in fetchers:
+            fetcher.join()
+        ready.put(None)
+        aggregator.join()
+
+        rendered = 0
+        for sensor_id, future in futures:
+            try:
+                path, seconds = future.result()
+            except Exception as e:
+                print(f"❌ Rendering sensor {sensor_id} failed: {e}", flush=True)
+                continue
+            rendered += 1
+            times.add("render", seconds)
+            metrics.observe("stage_seconds", seconds, stage="render", sensor=sensor_id)
+            print(f"✅ Heatmap saved: {path}", flush=True)
+
+    times.report(time.perf_counter() - started)
+    return rendered
 
 
 if __name__ == "__main__":
     start_date, end_date = get_last_full_week()
-    for sensor_id in SENSOR_IDS:
-        print(f"📅 Generating heatmap for sensor {sensor_id}: {start_date} → {end_date}")
-        all_data = []
-        current = start_date
-        while current <= end_date:
-            df = fetch_csv(current, sensor_id)
-            if df is not None:
-                df = normalize_dataframe(df)
-                if df is not None:
-                    all_data.append(df)
-            current += timedelta(days=1)
-        if not all_data:
-            print(f"⚠️ No valid data for sensor {sensor_id}")
-            continue
-        full_df = pd.concat(all_data).sort_values("timestamp")
-        build_report(sensor_id, full_df, start_date, end_date)
+    sensor_ids = sensor_registry.live_sensors(sensor_registry.load_state())
+    run_pipeline(sensor_ids, start_date, end_date)
 
     print(f"✅ All heatmaps generated in {REPORTS_DIR}/")
@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+"""Lease-based (sensor, day) work queue for sharded ingestion.
+
+Tasks live in a SQLite table keyed on (sensor_id, day). Workers claim a
+batch under a lease, keep it alive with a heartbeat thread and mark each
+task done when its points are written. Leases of crashed workers expire
+and their tasks are handed to the next claimer.
+
+Exactly-once: a task only moves to `done` when the worker that holds its
+lease completes it, and `done` tasks are never re-enqueued. A worker
+that dies between writing and completing causes one re-run of that task,
+which rewrites the same (measurement, sensor_id, timestamp) points --
+Influx treats that as an overwrite -- and the ingest hooks are
+idempotent per sensor-day (per-day tables are replaced, the exceedance
+sink skips events it already holds), so the stored data is written once.
+
+Failures are retried with exponential backoff (RETRY_BACKOFF, or the
+server's Retry-After) up to MAX_ATTEMPTS, counting expired leases, so a
+task that keeps killing its worker ends up `failed` instead of looping.
+
+Usage:
+    python work_queue.py enqueue 2025-07-01 2025-09-30 [--sensors 94695,89747]
+    python work_queue.py work [--worker-id NAME] [--shard 0/4]
+    python work_queue.py status
+    python work_queue.py merge shard1.sqlite shard2.sqlite ...
+
+With --shard i/N a worker only claims sensors where sensor_id % N == i.
+Runners that cannot share one database file (the Actions matrix) each get
+a copy of the enqueued queue, work their shard and hand their copy back;
+`merge` folds the copies into one queue, re-queueing the leases of
+runners that died, and a final unsharded `work` picks those up. The
+merged queue is cached, so a re-run keeps done and failed tasks.
+"""
+import os
+import csv
+import io
+import time
+import socket
+import sqlite3
+import datetime
+import argparse
+import threading
+import requests
+import sensor_registry
+from noise_ingest import day_url, influx_client, ingest_rows, install_hooks
+
+# ===== SETTINGS =====
+QUEUE_PATH = os.getenv("WORK_QUEUE_PATH", "work_queue.sqlite")
+LEASE_SECONDS = 120
+CLAIM_BATCH = 10
+MAX_ATTEMPTS = 5
+RETRY_BACKOFF = 30       # seconds before the first retry, doubled per attempt
+MAX_BACKOFF = 15 * 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    sensor_id   INTEGER NOT NULL,
+    day         TEXT    NOT NULL,
+    status      TEXT    NOT NULL DEFAULT 'pending',  -- pending | leased | done | failed
+    worker      TEXT,
+    lease_until REAL,
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    points      INTEGER,
+    retry_at    REAL,                                 -- pending but backing off until then
+    updated     REAL,
+    PRIMARY KEY (sensor_id, day)
+);
+CREATE INDEX IF NOT EXISTS tasks_status ON tasks (status, lease_until);
+"""
+COLUMNS = "sensor_id, day, status, worker, lease_until, attempts, points, retry_at, updated"
+STATUS_RANK = "CASE {0}.status WHEN 'done' THEN 3 WHEN 'failed' THEN 2 WHEN 'leased' THEN 1 ELSE 0 END"
+
+
+class RetryLater(Exception):
+    """Transient failure (429/5xx); `retry_after` seconds if the server said so."""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+# ===== FUNCTIONS =====
+def connect(path=QUEUE_PATH):
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    if "retry_at" not in {row[1] for row in conn.execute("PRAGMA table_info(tasks)")}:
+        conn.execute("ALTER TABLE tasks ADD COLUMN retry_at REAL")     # queues from before backoff
+    return conn
+
+
+def enqueue(conn, sensor_ids, days):
+    """Add (sensor, day) tasks; existing tasks (including done ones) are kept."""
+    rows = [(int(s), str(d)) for d in days for s in sensor_ids]
+    before = conn.total_changes
+    conn.executemany("INSERT OR IGNORE INTO tasks (sensor_id, day) VALUES (?, ?)", rows)
+    return conn.total_changes - before
+
+
+def _shard_clause(shard):
+    if shard is None:
+        return "", ()
+    index, count = shard
+    return " AND sensor_id % ? = ?", (count, index)
+
+
+def claim(conn, worker, n=CLAIM_BATCH, lease_seconds=LEASE_SECONDS, shard=None):
+    """Lease up to `n` due tasks for `worker`, re-queueing expired leases first."""
+    now = time.time()
+    clause, params = _shard_clause(shard)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute(
+            "UPDATE tasks SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+            "worker = NULL, lease_until = NULL, updated = ? WHERE status = 'leased' AND lease_until < ?",
+            (MAX_ATTEMPTS, now, now)
+        )
+        tasks = conn.execute(
+            "SELECT sensor_id, day FROM tasks WHERE status = 'pending' "
+            "AND (retry_at IS NULL OR retry_at <= ?)" + clause +
+            " ORDER BY day, sensor_id LIMIT ?", (now,) + params + (n,)
+        ).fetchall()
+        conn.executemany(
+            "UPDATE tasks SET status = 'leased', worker = ?, lease_until = ?, retry_at = NULL, "
+            "attempts = attempts + 1, updated = ? WHERE sensor_id = ? AND day = ?",
+            [(worker, now + lease_seconds, now, s, d) for s, d in tasks]
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return tasks
+
+
+def heartbeat(conn, worker, lease_seconds=LEASE_SECONDS):
+    """Extend every lease held by `worker`. Returns the number of live leases."""
+    now = time.time()
+    cur = conn.execute(
+        "UPDATE tasks SET lease_until = ?, updated = ? WHERE worker = ? AND status = 'leased'",
+        (now + lease_seconds, now, worker)
+    )
+    return cur.rowcount
+
+
+def complete(conn, worker, sensor_id, day, points):
+    """Mark a task done; False if the lease was lost to another worker."""
+    cur = conn.execute(
+        "UPDATE tasks SET status = 'done', points = ?, lease_until = NULL, updated = ? "
+        "WHERE sensor_id = ? AND day = ? AND worker = ? AND status = 'leased'",
+        (points, time.time(), sensor_id, day, worker)
+    )
+    return cur.rowcount == 1
+
+
+def fail(conn, worker, sensor_id, day, retry_after=None):
+    """Release a task for a backed-off retry, or park it as failed after MAX_ATTEMPTS."""
+    now = time.time()
+    attempts = conn.execute("SELECT attempts FROM tasks WHERE sensor_id = ? AND day = ?",
+                            (sensor_id, day)).fetchone()
+    delay = retry_after if retry_after is not None else \
+        min(MAX_BACKOFF, RETRY_BACKOFF * 2 ** max((attempts[0] if attempts else 1) - 1, 0))
+    conn.execute(
+        "UPDATE tasks SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+        "worker = NULL, lease_until = NULL, retry_at = ?, updated = ? "
+        "WHERE sensor_id = ? AND day = ? AND worker = ? AND status = 'leased'",
+        (MAX_ATTEMPTS, now + delay, now, sensor_id, day, worker)
+    )
+
+
+def next_retry(conn, shard=None):
+    """Earliest retry_at among backed-off pending tasks (None if there are none)."""
+    clause, params = _shard_clause(shard)
+    return conn.execute("SELECT MIN(retry_at) FROM tasks WHERE status = 'pending' "
+                        "AND retry_at IS NOT NULL" + clause, params).fetchone()[0]
+
+
+def merge(conn, paths):
+    """Fold queue copies of other runners into this one; leftover leases go back to pending.
+
+    Per task the most advanced status wins (done > failed > leased > pending),
+    ties by the higher attempt count. Every runner of the copies has exited,
+    so their remaining leases are orphaned and re-queued (or failed after
+    MAX_ATTEMPTS) right away.
+    """
+    for path in paths:
+        conn.execute("ATTACH DATABASE ? AS src", (path,))
+        try:
+            conn.execute(
+                f"INSERT INTO tasks ({COLUMNS}) SELECT {COLUMNS} FROM src.tasks WHERE true "
+                f"ON CONFLICT (sensor_id, day) DO UPDATE SET "
+                f"status = excluded.status, worker = excluded.worker, lease_until = excluded.lease_until, "
+                f"attempts = excluded.attempts, points = excluded.points, retry_at = excluded.retry_at, "
+                f"updated = excluded.updated "
+                f"WHERE {STATUS_RANK.format('excluded')} > {STATUS_RANK.format('tasks')} "
+                f"OR ({STATUS_RANK.format('excluded')} = {STATUS_RANK.format('tasks')} "
+                f"AND excluded.attempts > tasks.attempts)"
+            )
+        finally:
+            conn.execute("DETACH DATABASE src")
+    cur = conn.execute(
+        "UPDATE tasks SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+        "worker = NULL, lease_until = NULL, retry_at = NULL, updated = ? WHERE status = 'leased'",
+        (MAX_ATTEMPTS, time.time())
+    )
+    return cur.rowcount
+
+
+def counts(conn):
+    return dict(conn.execute("SELECT status, COUNT(*) FROM tasks GROUP BY status").fetchall())
+
+
+def process_task(sensor_id, day, client):
+    """Fetch and write one sensor-day. Returns points written; raises to retry."""
+    url = day_url(sensor_id, day)
+    response = requests.get(url, timeout=30)
+    if response.status_code == 404 or (response.status_code == 200 and not response.text.strip()):
+        return 0
+    if response.status_code == 429 or response.status_code >= 500:
+        retry_after = response.headers.get("Retry-After", "")
+        raise RetryLater(f"status {response.status_code} for {url}",
+                         float(retry_after) if retry_after.isdigit() else None)
+    if response.status_code != 200:
+        raise RuntimeError(f"status {response.status_code} for {url}")
+    rows = list(csv.DictReader(io.StringIO(response.text), delimiter=";"))
+    return ingest_rows(sensor_id, day, rows, client)
+
+
+def _heartbeat_loop(path, worker, stop):
+    conn = connect(path)
+    while not stop.wait(LEASE_SECONDS / 3):
+        heartbeat(conn, worker)
+    conn.close()
+
+
+def run_worker(path, worker, shard=None):
+    conn = connect(path)
+    stop = threading.Event()
+    beat = threading.Thread(target=_heartbeat_loop, args=(path, worker, stop), daemon=True)
+    beat.start()
+    done = 0
+    try:
+        with influx_client() as client:
+            while True:
+                tasks = claim(conn, worker, shard=shard)
+                if not tasks:
+                    retry_at = next_retry(conn, shard)
+                    if retry_at is None:
+                        break
+                    time.sleep(max(0.0, retry_at - time.time()) + 0.1)   # only backed-off tasks left
+                    continue
+                for sensor_id, day in tasks:
+                    try:
+                        points = process_task(sensor_id, day, client)
+                    except Exception as e:
+                        print(f"❌ {sensor_id} on {day}: {e}", flush=True)
+                        fail(conn, worker, sensor_id, day, getattr(e, "retry_after", None))
+                        continue
+                    if complete(conn, worker, sensor_id, day, points):
+                        done += 1
+                        print(f"✅ Wrote {points} points for sensor {sensor_id} on {day}", flush=True)
+                    else:
+                        print(f"⚠️ Lease lost for {sensor_id} on {day}", flush=True)
+    finally:
+        stop.set()
+        beat.join()
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")     # one self-contained file to hand off
+        conn.close()
+    print(f"🎉 Worker {worker} finished: {done} tasks", flush=True)
+    return done
+
+
+def _date_range(start, end):
+    day = datetime.date.fromisoformat(start)
+    last = datetime.date.fromisoformat(end)
+    while day <= last:
+        yield day.isoformat()
+        day += datetime.timedelta(days=1)
+
+
+def _parse_shard(value):
+    index, count = (int(x) for x in value.split("/"))
+    return index, count
+
+
+# ===== MAIN =====
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="(sensor, day) ingest work queue")
+    parser.add_argument("--db", default=QUEUE_PATH)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_enqueue = sub.add_parser("enqueue", help="add tasks for a date range")
+    p_enqueue.add_argument("start")
+    p_enqueue.add_argument("end")
+    p_enqueue.add_argument("--sensors", help="comma separated ids (default: registry sensors due)")
+
+    p_work = sub.add_parser("work", help="claim and process tasks until the queue is empty")
+    p_work.add_argument("--worker-id", default=f"{socket.gethostname()}-{os.getpid()}")
+    p_work.add_argument("--shard", type=_parse_shard, help="i/N: only sensors with id %% N == i")
+
+    sub.add_parser("status", help="show task counts per status")
+    p_merge = sub.add_parser("merge", help="fold queue copies of other runners into --db")
+    p_merge.add_argument("paths", nargs="+")
+    args = parser.parse_args()
+
+    conn = connect(args.db)
+    if args.command == "enqueue":
+        state = sensor_registry.load_state()
+        added = 0
+        for day in _date_range(args.start, args.end):
+            sensors = [int(s) for s in args.sensors.split(",")] if args.sensors \
+                else sensor_registry.sensors_due(state, day)
+            added += enqueue(conn, sensors, [day])
+        print(f"📥 Enqueued {added} new tasks ({counts(conn)})", flush=True)
+    elif args.command == "work":
+        conn.close()
+        install_hooks()
+        run_worker(args.db, args.worker_id, args.shard)
+    elif args.command == "merge":
+        requeued = merge(conn, args.paths)
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        print(f"🔀 Merged {len(args.paths)} queues, {requeued} orphaned leases re-queued ({counts(conn)})",
+              flush=True)
+    else:
+        print(f"📊 {counts(conn)}", flush=True)